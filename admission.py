@@ -0,0 +1,169 @@
+import os
+import math
+import time
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+
+
+class AdmissionRejected(Exception):
+    """A request was shed; carries the HTTP status and Retry-After seconds"""
+
+    def __init__(self, status: int, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Refills `rate` tokens per second up to `capacity`"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Take one token; returns 0 on success or the seconds until one is available"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Token buckets per key (session id, client IP), capped to the most recently seen keys"""
+
+    def __init__(self, per_minute: float, burst: float, max_keys: int = 10000):
+        self.rate = per_minute / 60.0
+        self.burst = burst
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()
+
+    def take(self, key: str) -> float:
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(self.rate, self.burst)
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+        return bucket.take()
+
+
+class AdmissionController:
+    """Bounds concurrent LLM calls, queues a few more with a deadline, and sheds the rest"""
+
+    def __init__(self):
+        self.max_concurrent = int(os.getenv("ADMISSION_MAX_CONCURRENT", 8))
+        self.max_queue = int(os.getenv("ADMISSION_MAX_QUEUE", 32))
+        self.queue_timeout = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", 10))
+        burst = float(os.getenv("RATE_LIMIT_BURST", 5))
+        self.session_limiter = RateLimiter(float(os.getenv("RATE_LIMIT_SESSION_PER_MINUTE", 20)), burst)
+        self.ip_limiter = RateLimiter(float(os.getenv("RATE_LIMIT_IP_PER_MINUTE", 60)), burst * 2)
+
+        self._cond = threading.Condition()
+        self.in_flight = 0
+        self.waiting = 0
+        self.background_waiting = 0
+        self.service_times = deque(maxlen=100)
+        self.stats = {"admitted": 0, "queued": 0, "background": 0, "rejected_rate_limit_session": 0,
+                      "rejected_rate_limit_ip": 0, "rejected_queue_full": 0, "rejected_queue_timeout": 0}
+
+    def _reject(self, status: int, reason: str, retry_after: float):
+        self.stats[f"rejected_{reason}"] += 1
+        raise AdmissionRejected(status, reason, max(1, math.ceil(retry_after)))
+
+    def check_rate_limits(self, session_id: Optional[str], client_ip: Optional[str]):
+        """Raise AdmissionRejected (429) if this session or IP is over its rate"""
+        with self._cond:
+            if client_ip:
+                wait = self.ip_limiter.take(client_ip)
+                if wait:
+                    self._reject(429, "rate_limit_ip", wait)
+            if session_id:
+                wait = self.session_limiter.take(session_id)
+                if wait:
+                    self._reject(429, "rate_limit_session", wait)
+
+    def _expected_wait(self) -> float:
+        """How long until a slot frees up, from recent service times"""
+        average = sum(self.service_times) / len(self.service_times) if self.service_times else 2.0
+        return average * (self.waiting + 1) / self.max_concurrent
+
+    @contextmanager
+    def slot(self):
+        """Hold one of the concurrent LLM slots; waits in a bounded queue or raises AdmissionRejected (503)"""
+        with self._cond:
+            if self.in_flight >= self.max_concurrent or self.waiting:
+                if self.waiting >= self.max_queue:
+                    self._reject(503, "queue_full", self._expected_wait())
+
+                self.stats["queued"] += 1
+                self.waiting += 1
+                deadline = time.monotonic() + self.queue_timeout
+                try:
+                    while self.in_flight >= self.max_concurrent:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._reject(503, "queue_timeout", self._expected_wait())
+                        self._cond.wait(remaining)
+                finally:
+                    self.waiting -= 1
+
+            self.in_flight += 1
+            self.stats["admitted"] += 1
+
+        yield from self._hold()
+
+    @contextmanager
+    def background_slot(self):
+        """Hold a slot for background work (conversation summaries) at low priority
+
+        It only takes a slot that is free while no request is queued, and it
+        waits as long as that takes instead of being shed.
+        """
+        with self._cond:
+            self.background_waiting += 1
+            try:
+                while self.in_flight >= self.max_concurrent or self.waiting:
+                    self._cond.wait()
+            finally:
+                self.background_waiting -= 1
+            self.in_flight += 1
+            self.stats["background"] += 1
+
+        yield from self._hold()
+
+    def _hold(self):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.in_flight -= 1
+                self.service_times.append(time.monotonic() - start)
+                # A background waiter must not swallow the wakeup a queued request needs
+                if self.background_waiting:
+                    self._cond.notify_all()
+                else:
+                    self._cond.notify()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._cond:
+            stats = dict(self.stats)
+            stats.update({
+                "in_flight": self.in_flight,
+                "queue_depth": self.waiting,
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+            })
+        return stats
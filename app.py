@@ -1,36 +1,72 @@
-from flask import Flask, request, jsonify, session
+from flask import Flask, request, jsonify, session, Response, stream_with_context, g
 from flask_cors import CORS
 import os
 from dotenv import load_dotenv
 import uuid
-from datetime import datetime, timedelta
+import time
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
 
 # Import your existing chatbot classes
 import json
 from typing import List, Dict, Any
 import requests
+import numpy as np
 from sentence_transformers import SentenceTransformer
 import chromadb
 import openai
 import re
 from bs4 import BeautifulSoup
+from index_config import EMBEDDING_MODEL_NAME
+from vector_store import create_vector_store
+from chunking import chunk_documents, ParentDocumentStore
+from store_log import hold_server_lock
+from llm_client import ResilientLLMClient, LLMUnavailableError, extractive_answer
+from fact_store import FactStore
+from show_catalog import ShowCatalog
+from facet_stats import FacetCounts, scan_facets
+from knowledge_search import search_batch
+from prompts import build_messages
+from dedup import DEDUP_ENABLED, NearDuplicateIndex, dedupe_documents, describe_report
+from retrieval_session import SessionRetriever
+from conversation_compactor import ConversationCompactor
+from session_store import SessionStore
+from admission import AdmissionController, AdmissionRejected
+from ingest_jobs import IngestJobManager
+from request_profiler import RequestProfiler, propagate
 
 load_dotenv()
 
 class GratefulDeadChatbot:
     def __init__(self, openai_api_key: str):
         """Initialize the Grateful Dead RAG chatbot for API use"""
-        self.openai_client = openai.OpenAI(api_key=openai_api_key)
+        self.llm = ResilientLLMClient(openai_api_key)
+        self.openai_client = self.llm.client
         
         # Initialize embedding model
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+        self.embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
         
         # Initialize vector database
-        self.chroma_client = chromadb.PersistentClient(path="./dead_knowledge_db")
-        self.collection = self.chroma_client.get_or_create_collection(
-            name="grateful_dead_knowledge",
-            metadata={"description": "Grateful Dead knowledge base"}
-        )
+        # CLI writers refuse to run while this is held (see store_log.refuse_if_served)
+        self.server_lock = hold_server_lock()
+        self.collection = create_vector_store()
+        self.parent_store = ParentDocumentStore()
+        self.fact_store = FactStore()
+        if not self.fact_store.facts and self.collection.count():
+            self.fact_store.rebuild(self.collection)
+        self.show_catalog = ShowCatalog()
+        if not len(self.show_catalog) and self.collection.count():
+            self.show_catalog.rebuild(self.collection)
+        self.facets = FacetCounts()
+        if not self.facets.loaded and self.collection.count():
+            self.facets.replace(scan_facets(self.collection))
+        self.dedup_index = NearDuplicateIndex()
+        if not len(self.dedup_index) and self.parent_store.parents:
+            self.dedup_index.add([{'id': pid, **p} for pid, p in self.parent_store.parents.items()])
+        self.retriever = SessionRetriever(self)
+        
+        # Set by the API to bound concurrent LLM calls (see admission.py)
+        self.admission = None
         
         # Initialize session for web requests
         self.session = requests.Session()
@@ -40,118 +76,166 @@ class GratefulDeadChatbot:
     
     def add_knowledge_to_db(self, documents: List[Dict[str, Any]]):
         """Add documents to the vector database"""
-        texts = []
-        metadatas = []
-        ids = []
-        
-        for i, doc in enumerate(documents):
-            text = doc['content']
-            metadata = {k: v for k, v in doc.items() if k != 'content'}
-            
-            texts.append(text)
-            metadatas.append(metadata)
-            ids.append(f"doc_{i}_{hash(text) % 100000}")
-        
-        embeddings = self.embedding_model.encode(texts).tolist()
+        if DEDUP_ENABLED:
+            # Collapse reworded facts and alternate tapes of the same show before embedding
+            documents, report = dedupe_documents(documents, self.dedup_index)
+            print(f"Deduplicated: {describe_report(report)}")
         
+        # Embed overlapping sentence windows; keep the full text as the parent
+        parents, chunks = chunk_documents(documents)
+        embeddings = self.embedding_model.encode([chunk['content'] for chunk in chunks]).tolist()
+        self.write_chunks(parents, chunks, embeddings)
+    
+    def write_chunks(self, parents: List[Dict], chunks: List[Dict], embeddings: List[List[float]]):
+        """Write already-embedded chunks and their parent documents to the knowledge base"""
+        new_parents = [parent for parent in parents if self.parent_store.get(parent['id']) is None]
         self.collection.add(
-            documents=texts,
-            metadatas=metadatas,
+            documents=[chunk['content'] for chunk in chunks],
+            metadatas=[{k: v for k, v in chunk.items() if k not in ('content', 'id')} for chunk in chunks],
             embeddings=embeddings,
-            ids=ids
+            ids=[chunk['id'] for chunk in chunks]
         )
+        self.parent_store.add(parents)
+        self.fact_store.add_documents([parent['metadata'] for parent in new_parents])
+        self.show_catalog.add_documents([parent['metadata'] for parent in new_parents])
+        self.facets.add([parent['metadata'] for parent in new_parents])
+        self.dedup_index.add(new_parents)
+    
+    def delete_documents(self, parent_ids: List[str]) -> int:
+        """Remove source documents and all their chunks from the knowledge base"""
+        parents = {parent_id: self.parent_store.get(parent_id) for parent_id in parent_ids}
+        found = [parent_id for parent_id, parent in parents.items() if parent]
+        if not found:
+            return 0
+        chunks = self.collection.get(where={'parent_id': {'$in': found}}, include=['metadatas'])
+        if chunks['ids']:
+            self.collection.delete(ids=chunks['ids'])
+        self.parent_store.delete(found)
+        metadatas = [parents[parent_id]['metadata'] for parent_id in found]
+        self.fact_store.remove_documents(metadatas)
+        self.show_catalog.remove_documents(metadatas)
+        self.facets.remove(metadatas)
+        self.dedup_index.remove(found)
+        return len(found)
+    
+    def count_shows(self, start: str = None, end: str = None) -> int:
+        """Number of shows between two dates, inclusive (e.g. '1972-01-01', '1972-12-31')"""
+        return self.show_catalog.count_shows(start, end)
+    
+    def shows_between(self, start: str = None, end: str = None, limit: int = None) -> List[Dict]:
+        """Shows between two dates, oldest first"""
+        return self.show_catalog.shows_between(start, end, limit)
     
-    def search_knowledge(self, query: str, n_results: int = 5) -> List[Dict]:
-        """Search the knowledge base for relevant information"""
+    def shows_at_venue(self, venue: str, start: str = None, end: str = None) -> List[Dict]:
+        """Every show at venues matching `venue` (e.g. 'Winterland'), optionally within dates"""
+        return self.show_catalog.shows_at_venue(venue, start, end)
+    
+    def search_knowledge(self, query: str, n_results: int = 5, query_embedding=None) -> List[Dict]:
+        """Search the knowledge base for relevant information (pass query_embedding to skip encoding)"""
+        query_embeddings = None if query_embedding is None else [query_embedding]
+        return self.search_knowledge_batch([query], n_results, query_embeddings)[0]
+    
+    def search_knowledge_batch(self, queries: List[str], n_results: int = 5, query_embeddings=None) -> List[List[Dict]]:
+        """Search for many queries with one encoding pass and one multi-query lookup"""
         try:
-            query_embedding = self.embedding_model.encode([query]).tolist()
-            
-            results = self.collection.query(
-                query_embeddings=query_embedding,
-                n_results=n_results
-            )
-            
-            relevant_docs = []
-            for i in range(len(results['documents'][0])):
-                relevant_docs.append({
-                    'content': results['documents'][0][i],
-                    'metadata': results['metadatas'][0][i],
-                    'distance': results['distances'][0][i]
-                })
-            
-            return relevant_docs
+            return search_batch(self.collection, self.parent_store, self.embedding_model, queries, n_results,
+                                query_embeddings)
         except Exception as e:
             print(f"Error searching knowledge base: {e}")
-            return []
+            return [[] for _ in queries]
     
-    def generate_response(self, user_query: str, context_docs: List[Dict], conversation_history: List[Dict] = None) -> str:
+    def add_catalog_context(self, user_input: str, docs: List[Dict]) -> List[Dict]:
+        """Counting/listing questions get exact aggregates from the show catalog"""
+        catalog_summary = self.show_catalog.describe_for_question(user_input)
+        if catalog_summary:
+            return [{'content': catalog_summary, 'metadata': {'source': 'show_catalog'}}] + docs
+        return docs
+    
+    def generate_response(self, user_query: str, context_docs: List[Dict], conversation_history: List[Dict] = None,
+                          conversation_summary: str = None) -> str:
         """Generate response using OpenAI with retrieved context AND conversation history"""
-        
-        # Build context from retrieved documents
-        context = "\n\n".join([doc['content'] for doc in context_docs])
-        
-        # Build conversation history
-        conversation_context = ""
-        if conversation_history:
-            # Include last 6 messages for context (3 exchanges)
-            recent_history = conversation_history[-6:]
-            conversation_context = "\n\nRecent conversation:\n"
-            for msg in recent_history:
-                role = "Human" if msg['role'] == 'user' else "Assistant"
-                conversation_context += f"{role}: {msg['content']}\n"
-        
-        system_prompt = """You are the ultimate Grateful Dead expert and enthusiast! You have deep knowledge about:
-        - All Grateful Dead songs, albums, and performances
-        - Band members past and present (Jerry Garcia, Bob Weir, Phil Lesh, etc.)
-        - Tour history, venues, and memorable shows
-        - The Dead community and culture
-        - Related bands and solo projects
-        
-        Use the provided context to answer questions accurately. Pay attention to the conversation history to provide relevant follow-up responses.
-        If someone asks a follow-up question, refer back to what you discussed earlier.
-        Keep the vibe conversational and friendly - like talking to a fellow Deadhead.
-        Use Grateful Dead terminology and references naturally when appropriate.
-        
-        Context information:
-        {context}
-        {conversation_context}
-        """
-        
         try:
-            # Build message history for OpenAI
-            messages = [
-                {"role": "system", "content": system_prompt.format(context=context, conversation_context=conversation_context)}
-            ]
-            
-            # Add recent conversation to OpenAI messages
-            if conversation_history:
-                # Add last 4 messages for better context
-                for msg in conversation_history[-4:]:
-                    messages.append({"role": msg['role'], "content": msg['content']})
+            # Static instructions first, then context, then history: keeps the prompt prefix cacheable
+            messages = build_messages(user_query, context_docs, conversation_history, conversation_summary)
             
-            # Add current question
-            messages.append({"role": "user", "content": user_query})
-            
-            response = self.openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=messages,
-                max_tokens=500,
-                temperature=0.7
-            )
+            slot = self.admission.slot() if self.admission else nullcontext()
+            with slot:
+                response = self.llm.complete(
+                    messages=messages,
+                    max_tokens=500,
+                    temperature=0.7
+                )
             
             return response.choices[0].message.content
             
+        except AdmissionRejected:
+            # Shed load - the endpoint turns this into a 429/503
+            raise
+        except LLMUnavailableError:
+            # Upstream is down or too slow - answer from the retrieved docs instead
+            return extractive_answer(user_query, context_docs)
         except Exception as e:
             return f"Sorry, I'm having trouble connecting right now. Error: {str(e)}"
     
-    def chat(self, user_input: str, conversation_history: List[Dict] = None) -> str:
-        """Main chat method with conversation memory"""
+    def chat(self, user_input: str, conversation_history: List[Dict] = None, retrieval_state: Dict = None,
+             conversation_summary: str = None) -> str:
+        """Main chat method with conversation memory (retrieval_state enables follow-up reuse)"""
         if not user_input.strip():
             return "What would you like to know about the Grateful Dead?"
         
-        relevant_docs = self.search_knowledge(user_input)
-        response = self.generate_response(user_input, relevant_docs, conversation_history)
+        # Pure lookups (release years, venues, archive ids) skip retrieval and the LLM
+        fast_answer = self.fact_store.answer(user_input)
+        if fast_answer:
+            return fast_answer
+        
+        if retrieval_state is not None:
+            relevant_docs = self.retriever.retrieve(user_input, retrieval_state)
+        else:
+            relevant_docs = self.search_knowledge(user_input)
+        relevant_docs = self.add_catalog_context(user_input, relevant_docs)
+        response = self.generate_response(user_input, relevant_docs, conversation_history, conversation_summary)
         return response
+    
+    def chat_batch(self, items: List[Dict], max_workers: int = 4):
+        """Answer many messages at once, yielding results in input order
+        
+        Each item is {'message', 'history'?, 'retrieval'?, 'summary'?}. Queries
+        that miss the fast path are embedded in one pass and searched with one
+        multi-query call; LLM calls then run on up to `max_workers` threads.
+        """
+        fast_answers = [self.fact_store.answer(item['message']) for item in items]
+        pending = [i for i, answer in enumerate(fast_answers) if not answer]
+        
+        context = {}
+        if pending:
+            queries = [items[i]['message'] for i in pending]
+            embeddings = np.asarray(self.embedding_model.encode(queries), dtype=np.float32)
+            for i, embedding, docs in zip(pending, embeddings, self.search_knowledge_batch(queries, 5, embeddings)):
+                state = items[i].get('retrieval')
+                if state is not None:
+                    # Later single /chat turns can reuse this retrieval for follow-ups
+                    state['embedding'] = embedding
+                    state['docs'] = docs
+                context[i] = self.add_catalog_context(items[i]['message'], docs)
+        
+        def answer(i):
+            start = time.perf_counter()
+            item = items[i]
+            try:
+                if fast_answers[i]:
+                    result = {'index': i, 'response': fast_answers[i], 'source': 'fast_path'}
+                else:
+                    response = self.generate_response(item['message'], context[i], item.get('history'), item.get('summary'))
+                    result = {'index': i, 'response': response, 'source': 'rag'}
+            except AdmissionRejected as e:
+                result = {'index': i, 'error': "Server is busy - please try again shortly",
+                          'reason': e.reason, 'retry_after': e.retry_after}
+            result['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 1)
+            return result
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # Pool threads are sampled too when this request is being profiled
+            yield from executor.map(propagate(answer), range(len(items)))
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -159,20 +243,19 @@ app.secret_key = os.getenv('FLASK_SECRET_KEY', 'dead-heads-unite-' + str(uuid.uu
 CORS(app, supports_credentials=True)
 
 # Store conversations in memory (in production, use Redis or a database)
-conversations = {}
+conversations = SessionStore()
 
-# Clean up old conversations periodically
-def cleanup_old_conversations():
-    """Remove conversations older than 2 hours"""
-    cutoff_time = datetime.now() - timedelta(hours=2)
-    to_remove = []
-    
-    for session_id, data in conversations.items():
-        if data['last_activity'] < cutoff_time:
-            to_remove.append(session_id)
+def get_conversation(session_id):
+    """Get or create the conversation state for a session"""
+    return conversations.get_or_create(session_id)
+
+def record_turn(session_id, user_message, bot_response):
+    """Append one exchange to a session's history and schedule compaction"""
+    # The ring buffer keeps the last SESSION_MAX_MESSAGES in case compaction falls behind
+    conversations.append_turn(session_id, user_message, bot_response)
     
-    for session_id in to_remove:
-        del conversations[session_id]
+    # Fold older turns into the running summary off the request path
+    compactor.maybe_schedule(session_id)
 
 # Initialize chatbot
 api_key = os.getenv("OPENAI_API_KEY")
@@ -208,6 +291,50 @@ try:
 except Exception as e:
     print(f"Warning: Could not initialize knowledge base: {e}")
 
+# Bound concurrent OpenAI calls and shed load with 429/503 instead of queueing forever
+admission = AdmissionController()
+chatbot.admission = admission
+
+# Summarize long conversations in the background so prompts stay small (in LLM slots no request is waiting for)
+compactor = ConversationCompactor(chatbot.llm, conversations, conversations.lock, admission)
+compactor.start()
+
+# Batch endpoint limits: messages per request, concurrent LLM calls per batch
+CHAT_BATCH_MAX_MESSAGES = int(os.getenv("CHAT_BATCH_MAX_MESSAGES", 500))
+CHAT_BATCH_CONCURRENCY = int(os.getenv("CHAT_BATCH_CONCURRENCY", 4))
+
+# Scraping and embedding run in background workers, never on a request thread
+ingest_jobs = IngestJobManager(chatbot)
+ingest_jobs.start()
+
+# Periodically pick up only the archive.org tapes added since the last refresh
+archive_refresh_minutes = float(os.getenv("ARCHIVE_REFRESH_INTERVAL_MINUTES", 0))
+if archive_refresh_minutes > 0:
+    ingest_jobs.schedule(["archive_incremental"], archive_refresh_minutes * 60)
+
+# Opt-in sampling profiler; the hooks are only installed when it can ever fire
+profiler = RequestProfiler()
+PROFILED_ENDPOINTS = {'chat', 'chat_batch'}
+
+if profiler.available:
+    @app.before_request
+    def start_profile():
+        if request.endpoint in PROFILED_ENDPOINTS and profiler.should_profile(request.headers):
+            g.profile = profiler.start(request.endpoint)
+
+    @app.after_request
+    def tag_profile(response):
+        if 'profile' in g:
+            response.headers['X-Profile-Id'] = g.profile['name']
+        return response
+
+    @app.teardown_request
+    def finish_profile(exc):
+        # Runs after a streamed response has been fully sent, so NDJSON batches are profiled end to end
+        profile = g.pop('profile', None)
+        if profile:
+            profiler.finish(profile, error=str(exc) if exc else None)
+
 print("Grateful Dead Chatbot API ready!")
 
 @app.route('/health', methods=['GET'])
@@ -217,7 +344,13 @@ def health_check():
         "status": "healthy",
         "message": "Grateful Dead Chatbot API is running",
         "knowledge_base_size": chatbot.collection.count(),
-        "active_conversations": len(conversations)
+        "active_conversations": len(conversations),
+        "sessions": conversations.get_stats(),
+        "llm": chatbot.llm.get_stats(),
+        "fast_path": chatbot.fact_store.get_stats(),
+        "retrieval_reuse": chatbot.retriever.get_stats(),
+        "compaction": compactor.get_stats(),
+        "admission": admission.get_stats()
     })
 
 @app.route('/chat', methods=['POST'])
@@ -240,45 +373,91 @@ def chat():
                 "session_id": session_id
             })
         
-        # Get or create conversation history
-        if session_id not in conversations:
-            conversations[session_id] = {
-                'history': [],
-                'last_activity': datetime.now()
-            }
-        
-        # Clean up old conversations occasionally
-        if len(conversations) > 100:
-            cleanup_old_conversations()
+        # Per-session and per-IP rate limits
+        admission.check_rate_limits(session_id, request.remote_addr)
         
-        # Get conversation history
-        conversation_history = conversations[session_id]['history']
+        # Get or create conversation history
+        conversation = get_conversation(session_id)
         
         # Generate response with conversation context
-        bot_response = chatbot.chat(user_message, conversation_history)
-        
-        # Update conversation history
-        conversations[session_id]['history'].extend([
-            {'role': 'user', 'content': user_message, 'timestamp': datetime.now().isoformat()},
-            {'role': 'assistant', 'content': bot_response, 'timestamp': datetime.now().isoformat()}
-        ])
-        conversations[session_id]['last_activity'] = datetime.now()
+        bot_response = chatbot.chat(
+            user_message,
+            list(conversation.history),
+            conversation.retrieval,
+            conversation.summary
+        )
         
-        # Keep only last 20 messages (10 exchanges) to prevent memory issues
-        if len(conversations[session_id]['history']) > 20:
-            conversations[session_id]['history'] = conversations[session_id]['history'][-20:]
+        record_turn(session_id, user_message, bot_response)
         
         return jsonify({
             "response": bot_response,
             "session_id": session_id,
-            "conversation_length": len(conversations[session_id]['history'])
+            "conversation_length": len(conversation.history)
         })
         
+    except AdmissionRejected as e:
+        response = jsonify({
+            "error": "Too many requests - please try again shortly" if e.status == 429 else "Server is busy - please try again shortly",
+            "reason": e.reason,
+            "retry_after": e.retry_after
+        })
+        response.status_code = e.status
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response
     except Exception as e:
         return jsonify({
             "error": f"Internal server error: {str(e)}"
         }), 500
 
+@app.route('/chat/batch', methods=['POST'])
+def chat_batch():
+    """Answer many messages in one request; add "stream": true for NDJSON, one result per line"""
+    data = request.get_json(silent=True) or {}
+    messages = data.get('messages')
+    if not isinstance(messages, list) or not messages:
+        return jsonify({"error": "Expected a non-empty 'messages' list"}), 400
+    if len(messages) > CHAT_BATCH_MAX_MESSAGES:
+        return jsonify({"error": f"At most {CHAT_BATCH_MAX_MESSAGES} messages per batch"}), 400
+    
+    items = []
+    for entry in messages:
+        entry = {'message': entry} if isinstance(entry, str) else entry
+        if not isinstance(entry, dict) or not isinstance(entry.get('message'), str) or not entry['message'].strip():
+            return jsonify({"error": "Each message must be a non-empty string or {\"message\", \"session_id\"?}"}), 400
+        item = {'message': entry['message'], 'session_id': entry.get('session_id')}
+        if item['session_id']:
+            # Messages of the same session within one batch are answered independently
+            conversation = get_conversation(item['session_id'])
+            item.update(history=list(conversation.history), retrieval=conversation.retrieval,
+                        summary=conversation.summary)
+        items.append(item)
+    
+    try:
+        # One batch costs the caller one request against its IP rate limit
+        admission.check_rate_limits(None, request.remote_addr)
+    except AdmissionRejected as e:
+        response = jsonify({"error": "Too many requests - please try again shortly",
+                            "reason": e.reason, "retry_after": e.retry_after})
+        response.status_code = e.status
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response
+    
+    def results():
+        for result in chatbot.chat_batch(items, CHAT_BATCH_CONCURRENCY):
+            item = items[result['index']]
+            if item['session_id']:
+                result['session_id'] = item['session_id']
+                if 'response' in result:
+                    record_turn(item['session_id'], item['message'], result['response'])
+            yield result
+    
+    if data.get('stream') or request.accept_mimetypes.best == 'application/x-ndjson':
+        lines = (json.dumps(result) + "\n" for result in results())
+        return Response(stream_with_context(lines), mimetype='application/x-ndjson')
+    
+    batch_results = list(results())
+    return jsonify({"results": batch_results, "count": len(batch_results)})
+
 @app.route('/conversation/clear', methods=['POST'])
 def clear_conversation():
     """Clear conversation history for a session"""
@@ -286,8 +465,7 @@ def clear_conversation():
         data = request.get_json()
         session_id = data.get('session_id')
         
-        if session_id and session_id in conversations:
-            del conversations[session_id]
+        if session_id and conversations.discard(session_id):
             return jsonify({"message": "Conversation cleared"})
         else:
             return jsonify({"message": "No conversation found"})
@@ -302,9 +480,13 @@ def knowledge_stats():
     """Get knowledge base statistics"""
     try:
         count = chatbot.collection.count()
+        facets = chatbot.facets.to_dict()
         return jsonify({
             "total_documents": count,
-            "categories": ["band_members", "songs", "shows", "albums", "culture"],
+            "source_documents": facets["documents"],
+            "facets": facets["facets"],
+            "shows": chatbot.show_catalog.get_stats(),
+            "index_memory": chatbot.collection.memory_report() if hasattr(chatbot.collection, 'memory_report') else None,
             "active_conversations": len(conversations)
         })
     except Exception as e:
@@ -312,6 +494,63 @@ def knowledge_stats():
             "error": f"Could not get stats: {str(e)}"
         }), 500
 
+@app.route('/knowledge/documents', methods=['DELETE'])
+def delete_documents():
+    """Remove source documents (by parent id) and their chunks from the knowledge base"""
+    data = request.get_json(silent=True) or {}
+    ids = data.get('ids')
+    if not isinstance(ids, list) or not ids:
+        return jsonify({"error": "Expected a non-empty 'ids' list"}), 400
+    
+    # Same lock as ingestion writes, so counts never see a half-applied batch
+    with ingest_jobs.write_lock:
+        deleted = chatbot.delete_documents(ids)
+    return jsonify({"deleted": deleted})
+
+@app.route('/knowledge/ingest', methods=['POST'])
+def start_ingest():
+    """Queue a background harvest of external sources into the knowledge base"""
+    data = request.get_json(silent=True) or {}
+    sources = data.get('sources', ['musicbrainz', 'archive', 'curated'])
+    
+    try:
+        job = ingest_jobs.submit(sources, data.get('batch_size'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    return jsonify(job), 202
+
+@app.route('/knowledge/jobs', methods=['GET'])
+def list_ingest_jobs():
+    """List ingestion jobs"""
+    return jsonify({"jobs": ingest_jobs.list_jobs()})
+
+@app.route('/knowledge/jobs/<job_id>', methods=['GET'])
+def get_ingest_job(job_id):
+    """Progress, throughput and errors for one ingestion job"""
+    job = ingest_jobs.get_job(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+@app.route('/admin/profiles', methods=['GET'])
+def list_profiles():
+    """List stored request profiles, newest first"""
+    if not profiler.is_admin(request.headers.get('X-Admin-Token')):
+        return jsonify({"error": "Admin token required"}), 403
+    return jsonify({"profiles": profiler.list_profiles()})
+
+@app.route('/admin/profiles/<name>', methods=['GET'])
+def get_profile(name):
+    """One profile in collapsed-stack format (feed it to flamegraph.pl or speedscope)"""
+    if not profiler.is_admin(request.headers.get('X-Admin-Token')):
+        return jsonify({"error": "Admin token required"}), 403
+    path = profiler.profile_path(name)
+    if not path:
+        return jsonify({"error": "Profile not found"}), 404
+    with open(path) as f:
+        return Response(f.read(), mimetype='text/plain')
+
 if __name__ == '__main__':
     print("\n🌹💀🌹 Starting Grateful Dead Chatbot API with Memory 🌹💀🌹")
     print("API will be available at: http://localhost:5000")
@@ -0,0 +1,268 @@
+import os
+import sys
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import List, Dict, Any, Iterator, Set, Tuple
+import numpy as np
+from dotenv import load_dotenv
+from knowledge_search import search_batch
+from llm_client import LLMUnavailableError
+from prompts import build_messages
+
+# Load environment variables
+load_dotenv()
+
+# Concurrent LLM calls (keep at or below LLM_POOL_SIZE)
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 8))
+# Questions embedded and searched per retrieval pass
+BATCH_RETRIEVAL_SIZE = int(os.getenv("BATCH_RETRIEVAL_SIZE", 32))
+
+
+def read_questions(path: str) -> Iterator[Dict[str, Any]]:
+    """Questions from a JSONL file ('-' for stdin)
+
+    Each line is {"id"?, "question"} ("message" also works) or a bare JSON
+    string. Lines without an id get "line-<n>", which is stable as long as
+    the input file doesn't change.
+    """
+    f = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    try:
+        for n, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                print(f"⚠️ Skipping line {n}: not valid JSON")
+                continue
+            entry = {'question': entry} if isinstance(entry, str) else entry
+            question = (entry.get('question') or entry.get('message')) if isinstance(entry, dict) else None
+            if not isinstance(question, str) or not question.strip():
+                print(f"⚠️ Skipping line {n}: expected a question string or {{\"id\", \"question\"}}")
+                continue
+            yield {'id': str(entry.get('id', f"line-{n}")), 'question': question.strip()}
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def answered_ids(output_path: str) -> Set[str]:
+    """Ids already answered in an earlier run (errors are retried)"""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                # A line cut short by an interrupted run
+                continue
+            if isinstance(result, dict) and 'answer' in result:
+                done.add(str(result.get('id')))
+    return done
+
+
+def _open_output(output_path: str, append: bool = True):
+    """Open the output for appending, first terminating a line cut short by a crash"""
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if not append:
+        return open(output_path, "w", encoding="utf-8")
+    needs_newline = False
+    if os.path.exists(output_path) and os.path.getsize(output_path):
+        with open(output_path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b"\n"
+    out = open(output_path, "a", encoding="utf-8")
+    if needs_newline:
+        out.write("\n")
+    return out
+
+
+def _batches(questions: Iterator[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    batch = []
+    for item in questions:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class BatchAnswerer:
+    """Answers a stream of questions for regression runs and content QA
+
+    Questions that miss the fact store's fast path are embedded and searched
+    `batch_size` at a time; their LLM calls run on up to `concurrency` threads
+    while the next batch is retrieved. Each result is written to the output
+    JSONL as soon as it is done, with timings and token usage.
+    """
+
+    def __init__(self, chatbot, concurrency: int = BATCH_CONCURRENCY, batch_size: int = BATCH_RETRIEVAL_SIZE):
+        self.chatbot = chatbot
+        self.concurrency = max(1, concurrency)
+        self.batch_size = max(1, batch_size)
+        self._local = threading.local()
+        self.latencies = []
+        self.stats = {"answered": 0, "fast_path": 0, "errors": 0, "skipped": 0,
+                      "prompt_tokens": 0, "cached_prompt_tokens": 0, "completion_tokens": 0}
+
+    def _record_usage(self, record: Dict[str, int]):
+        # Called on the thread that made the LLM call, i.e. the one answering the item
+        usage = getattr(self._local, "usage", None)
+        if usage is not None:
+            for key, value in record.items():
+                usage[key] = usage.get(key, 0) + value
+
+    def _answer(self, item: Dict[str, Any], context: List[Dict], retrieval_ms: float) -> Dict[str, Any]:
+        start = time.perf_counter()
+        self._local.usage = {}
+        result = {'id': item['id'], 'question': item['question']}
+        try:
+            # Straight to the LLM: the chatbot's extractive fallback would be recorded as a real answer
+            response = self.chatbot.llm.complete(
+                messages=build_messages(item['question'], context),
+                max_tokens=500,
+                temperature=0.7
+            )
+            result['answer'] = response.choices[0].message.content
+            result['source'] = 'rag'
+        except LLMUnavailableError as e:
+            result['error'] = f"LLM unavailable: {e}"
+        except Exception as e:
+            result['error'] = str(e)
+        llm_ms = (time.perf_counter() - start) * 1000
+        result['usage'] = self._local.usage or None
+        self._local.usage = None
+        result.update(retrieval_ms=round(retrieval_ms, 1), llm_ms=round(llm_ms, 1),
+                      elapsed_ms=round(retrieval_ms + llm_ms, 1))
+        return result
+
+    def _retrieve(self, batch: List[Dict[str, Any]]) -> Tuple[List[List[Dict]], float]:
+        """Context for each item and each item's share of the retrieval time; raises if the search fails"""
+        start = time.perf_counter()
+        queries = [item['question'] for item in batch]
+        docs = search_batch(self.chatbot.collection, self.chatbot.parent_store, self.chatbot.embedding_model, queries)
+        contexts = [self.chatbot.add_catalog_context(query, query_docs) for query, query_docs in zip(queries, docs)]
+        # Each item is charged its share of the batched pass
+        return contexts, (time.perf_counter() - start) * 1000 / len(batch)
+
+    def _emit(self, out, result: Dict[str, Any]):
+        out.write(json.dumps(result) + "\n")
+        out.flush()
+        if 'error' in result:
+            self.stats["errors"] += 1
+            return
+        self.stats["answered"] += 1
+        if result['source'] == 'fast_path':
+            self.stats["fast_path"] += 1
+        for key, value in (result.get('usage') or {}).items():
+            self.stats[key] += value
+        self.latencies.append(result['elapsed_ms'])
+
+    def run(self, input_path: str, output_path: str, resume: bool = True) -> Dict[str, Any]:
+        """Answer every question in `input_path` not already answered in `output_path`
+
+        With `resume=False` the output is overwritten and everything is answered again.
+        """
+        done = answered_ids(output_path) if resume else set()
+        if done:
+            print(f"↩️ Resuming: {len(done)} questions already answered in {output_path}")
+
+        def todo():
+            for item in read_questions(input_path):
+                if item['id'] in done:
+                    self.stats["skipped"] += 1
+                    continue
+                # Duplicate ids in the input are answered once
+                done.add(item['id'])
+                yield item
+
+        previous_hook = self.chatbot.llm.usage_hook
+
+        def usage_hook(record):
+            self._record_usage(record)
+            if previous_hook:
+                previous_hook(record)
+
+        self.chatbot.llm.usage_hook = usage_hook
+        out = _open_output(output_path, append=resume)
+        start = time.perf_counter()
+        pending = set()
+
+        def drain(limit):
+            # Write results as they finish until at most `limit` are outstanding
+            nonlocal pending
+            while len(pending) > limit:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    self._emit(out, future.result())
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="batch-answer") as executor:
+                for batch in _batches(todo(), self.batch_size):
+                    # Pure lookups skip retrieval and the LLM
+                    rag = []
+                    for item in batch:
+                        item_start = time.perf_counter()
+                        fast_answer = self.chatbot.fact_store.answer(item['question'])
+                        if fast_answer:
+                            elapsed_ms = round((time.perf_counter() - item_start) * 1000, 1)
+                            self._emit(out, {'id': item['id'], 'question': item['question'], 'answer': fast_answer,
+                                             'source': 'fast_path', 'usage': None, 'retrieval_ms': 0.0,
+                                             'llm_ms': 0.0, 'elapsed_ms': elapsed_ms})
+                        else:
+                            rag.append(item)
+                    if not rag:
+                        continue
+                    # Retrieve the next batch while the previous one's LLM calls are still running
+                    retrieval_start = time.perf_counter()
+                    try:
+                        contexts, retrieval_ms = self._retrieve(rag)
+                    except Exception as e:
+                        # Answering without context would record ungrounded answers; report them for the next run to retry
+                        retrieval_ms = round((time.perf_counter() - retrieval_start) * 1000 / len(rag), 1)
+                        for item in rag:
+                            self._emit(out, {'id': item['id'], 'question': item['question'],
+                                             'error': f"retrieval failed: {e}", 'usage': None,
+                                             'retrieval_ms': retrieval_ms, 'llm_ms': 0.0,
+                                             'elapsed_ms': retrieval_ms})
+                        continue
+                    for item, context in zip(rag, contexts):
+                        pending.add(executor.submit(self._answer, item, context, retrieval_ms))
+                    drain(self.concurrency)
+                drain(0)
+        finally:
+            self.chatbot.llm.usage_hook = previous_hook
+            out.close()
+
+        return self.summary(time.perf_counter() - start)
+
+    def summary(self, wall_seconds: float) -> Dict[str, Any]:
+        summary = dict(self.stats, wall_seconds=round(wall_seconds, 2),
+                       questions_per_second=round(self.stats["answered"] / wall_seconds, 2) if wall_seconds else 0.0)
+        if self.latencies:
+            latencies = np.asarray(self.latencies)
+            summary.update(p50_ms=float(np.percentile(latencies, 50)), p90_ms=float(np.percentile(latencies, 90)),
+                           p99_ms=float(np.percentile(latencies, 99)), max_ms=float(latencies.max()))
+        return summary
+
+
+def print_summary(summary: Dict[str, Any]):
+    print(f"\n✓ Answered {summary['answered']} questions ({summary['fast_path']} from the fact store) "
+          f"in {summary['wall_seconds']:.1f}s - {summary['questions_per_second']:.2f} questions/sec")
+    if summary['skipped']:
+        print(f"↩️ Skipped {summary['skipped']} already answered")
+    if summary['errors']:
+        print(f"❌ {summary['errors']} errors (re-run to retry them)")
+    if 'p50_ms' in summary:
+        print(f"⏱️ Latency p50 {summary['p50_ms']:.0f}ms, p90 {summary['p90_ms']:.0f}ms, "
+              f"p99 {summary['p99_ms']:.0f}ms, max {summary['max_ms']:.0f}ms")
+    print(f"🔢 Tokens: {summary['prompt_tokens']} prompt ({summary['cached_prompt_tokens']} cached), "
+          f"{summary['completion_tokens']} completion")
@@ -0,0 +1,250 @@
+import os
+import json
+import time
+import argparse
+import multiprocessing
+from collections import defaultdict
+from typing import List, Dict, Any, Callable, Iterable, Optional, Tuple
+import numpy as np
+from dotenv import load_dotenv
+from index_config import EMBEDDING_MODEL_NAME
+
+# Load environment variables
+load_dotenv()
+
+# Read once, when numpy / torch / tokenizers are first imported
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+_model = None
+
+
+def _init_worker(model_name: str, threads: int, pin_cores: bool):
+    """Pool initializer: optionally pin to one core, fix torch's thread count, load the model once"""
+    global _model
+    if pin_cores and hasattr(os, "sched_setaffinity"):
+        identity = multiprocessing.current_process()._identity
+        cores = sorted(os.sched_getaffinity(0))
+        if identity and cores:
+            start = ((identity[0] - 1) * threads) % len(cores)
+            os.sched_setaffinity(0, cores[start:start + threads] or cores[:threads])
+
+    import torch
+    torch.set_num_threads(threads)
+    from sentence_transformers import SentenceTransformer
+    _model = SentenceTransformer(model_name)
+
+
+def _embed_shard(shard):
+    index, texts, batch_size = shard
+    start = time.perf_counter()
+    embeddings = np.asarray(_model.encode(texts, batch_size=batch_size), dtype=np.float32)
+    return index, embeddings, os.getpid(), time.perf_counter() - start
+
+
+class BulkEmbedder:
+    """Shards texts across a pool of embedding processes and reassembles vectors in order
+
+    Drop-in for SentenceTransformer.encode in ingestion code. The pool is
+    started lazily and reused until `close()`.
+    """
+
+    def __init__(self, workers: Optional[int] = None, threads_per_worker: int = 1, shard_size: int = 256,
+                 model_name: str = EMBEDDING_MODEL_NAME, pin_cores: bool = True):
+        self.workers = workers or max(1, (os.cpu_count() or 1) // threads_per_worker)
+        self.threads_per_worker = threads_per_worker
+        self.shard_size = shard_size
+        self.model_name = model_name
+        self.pin_cores = pin_cores
+        self.worker_stats = defaultdict(lambda: {"texts": 0, "seconds": 0.0})
+        self._pool = None
+
+    def _get_pool(self):
+        if self._pool is None:
+            # spawn: a clean interpreter per worker, never a fork of a process with torch threads running.
+            # A spawned worker imports numpy (via this module) before the initializer runs, so the
+            # thread limits have to be in the environment it inherits
+            limits = {var: str(self.threads_per_worker) for var in THREAD_ENV_VARS}
+            limits["TOKENIZERS_PARALLELISM"] = "false"
+            saved = {var: os.environ.get(var) for var in limits}
+            os.environ.update(limits)
+            try:
+                context = multiprocessing.get_context("spawn")
+                self._pool = context.Pool(
+                    self.workers,
+                    initializer=_init_worker,
+                    initargs=(self.model_name, self.threads_per_worker, self.pin_cores)
+                )
+            finally:
+                for var, value in saved.items():
+                    if value is None:
+                        os.environ.pop(var, None)
+                    else:
+                        os.environ[var] = value
+        return self._pool
+
+    def encode_shards(self, texts: List[str], batch_size: int = 32) -> Iterable[np.ndarray]:
+        """Yield embeddings shard by shard, in input order"""
+        shards = [(i, texts[start:start + self.shard_size], batch_size)
+                  for i, start in enumerate(range(0, len(texts), self.shard_size))]
+        for index, embeddings, pid, seconds in self._get_pool().imap(_embed_shard, shards):
+            stats = self.worker_stats[pid]
+            stats["texts"] += len(embeddings)
+            stats["seconds"] += seconds
+            yield embeddings
+
+    def encode(self, texts: List[str], batch_size: int = 32, **kwargs) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.vstack(list(self.encode_shards(texts, batch_size)))
+
+    def report(self) -> Dict[str, Any]:
+        """Texts/sec per worker process and overall"""
+        workers = {
+            str(pid): {
+                "texts": s["texts"],
+                "texts_per_second": round(s["texts"] / s["seconds"], 1) if s["seconds"] else 0.0,
+            }
+            for pid, s in self.worker_stats.items()
+        }
+        return {"workers": workers, "total_texts": sum(s["texts"] for s in self.worker_stats.values())}
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+
+def bulk_ingest(documents: List[Dict[str, Any]], write_chunks: Callable, embedder: BulkEmbedder,
+                write_batch_size: int = 5000, dedup_index=None) -> Dict[str, Any]:
+    """Chunk, embed in parallel and write in large ordered batches
+
+    Documents are checked against `dedup_index` (the one `write_chunks`
+    records new parents in, so consecutive calls see each other's writes);
+    without one they are not deduplicated.
+    """
+    from chunking import chunk_documents
+    from dedup import DEDUP_ENABLED, dedupe_documents
+
+    dedup_report = {}
+    if DEDUP_ENABLED and dedup_index is not None:
+        documents, dedup_report = dedupe_documents(documents, dedup_index)
+
+    parents, chunks = chunk_documents(documents)
+    parents_by_id = {parent["id"]: parent for parent in parents}
+    texts = [chunk["content"] for chunk in chunks]
+
+    start = time.perf_counter()
+    written = 0
+    pending = []
+
+    def flush():
+        nonlocal written, pending
+        if not pending:
+            return
+        batch = chunks[written:written + sum(len(e) for e in pending)]
+        batch_parents = [parents_by_id.pop(c["parent_id"]) for c in batch if c["parent_id"] in parents_by_id]
+        write_chunks(batch_parents, batch, np.vstack(pending).tolist())
+        written += len(batch)
+        pending = []
+
+    for embeddings in embedder.encode_shards(texts):
+        pending.append(embeddings)
+        if sum(len(e) for e in pending) >= write_batch_size:
+            flush()
+    flush()
+
+    elapsed = time.perf_counter() - start
+    return {
+        "documents": len(parents),
+        "chunks": written,
+        "seconds": round(elapsed, 2),
+        "chunks_per_second": round(written / elapsed, 1) if elapsed else 0.0,
+        "dedup": dedup_report,
+        **embedder.report(),
+    }
+
+
+def load_documents(path: str) -> List[Dict[str, Any]]:
+    """Documents from a JSONL file, one {'content': ..., <metadata>} object per line"""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def open_local_writer() -> Tuple[Callable, Any]:
+    """write_chunks for CLI runs: the same writes the chatbot makes, against the stores on disk
+
+    Returns it with the dedup index it keeps current, to pass to `bulk_ingest`.
+    Exits if a server has the stores open.
+    """
+    from store_log import refuse_if_served
+    from vector_store import create_vector_store
+    from chunking import ParentDocumentStore
+    from fact_store import FactStore
+    from show_catalog import ShowCatalog
+    from facet_stats import FacetCounts
+    from dedup import NearDuplicateIndex
+
+    refuse_if_served()
+    collection = create_vector_store(read_only=False)
+    parent_store = ParentDocumentStore()
+    fact_store = FactStore()
+    show_catalog = ShowCatalog()
+    facets = FacetCounts()
+    dedup_index = NearDuplicateIndex()
+
+    def write_chunks(parents, chunks, embeddings):
+        new_parents = [parent for parent in parents if parent_store.get(parent["id"]) is None]
+        collection.add(
+            documents=[chunk["content"] for chunk in chunks],
+            metadatas=[{k: v for k, v in chunk.items() if k not in ("content", "id")} for chunk in chunks],
+            embeddings=embeddings,
+            ids=[chunk["id"] for chunk in chunks]
+        )
+        parent_store.add(parents)
+        fact_store.add_documents([parent["metadata"] for parent in new_parents])
+        show_catalog.add_documents([parent["metadata"] for parent in new_parents])
+        facets.add([parent["metadata"] for parent in new_parents])
+        dedup_index.add(new_parents)
+
+    return write_chunks, dedup_index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-ingest documents with a pool of embedding processes")
+    parser.add_argument("--input", help="JSONL file of documents")
+    parser.add_argument("--sources", nargs="+", help="Harvest these sources instead (see ingest_jobs.INGEST_SOURCES)")
+    parser.add_argument("--workers", type=int, default=None, help="Embedding processes (default: cores / threads)")
+    parser.add_argument("--threads-per-worker", type=int, default=1)
+    parser.add_argument("--shard-size", type=int, default=256)
+    parser.add_argument("--write-batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    if args.input:
+        documents = load_documents(args.input)
+    elif args.sources:
+        from ingest_jobs import harvest_source
+        documents = [doc for source in args.sources for doc in harvest_source(source)]
+    else:
+        parser.error("Give --input or --sources")
+
+    write_chunks, dedup_index = open_local_writer()
+    embedder = BulkEmbedder(args.workers, args.threads_per_worker, args.shard_size)
+    print(f"🧠 Embedding {len(documents)} documents with {embedder.workers} workers "
+          f"x {embedder.threads_per_worker} threads...")
+    try:
+        report = bulk_ingest(documents, write_chunks, embedder, args.write_batch_size, dedup_index)
+    finally:
+        embedder.close()
+
+    print(f"✓ Wrote {report['chunks']} chunks from {report['documents']} documents "
+          f"in {report['seconds']}s ({report['chunks_per_second']} chunks/sec)")
+    if report["dedup"]:
+        from dedup import describe_report
+        print(f"🧹 Deduplicated: {describe_report(report['dedup'])}")
+    for pid, stats in report["workers"].items():
+        print(f"  worker {pid}: {stats['texts']} texts, {stats['texts_per_second']} texts/sec")
+
+
+if __name__ == "__main__":
+    main()
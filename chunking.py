@@ -0,0 +1,205 @@
+import os
+import re
+import json
+import hashlib
+import threading
+from typing import List, Dict, Any, Tuple
+from dotenv import load_dotenv
+from index_config import KNOWLEDGE_DB_PATH
+from store_log import LoggedStore
+
+# Load environment variables
+load_dotenv()
+
+CHUNK_WINDOW_SENTENCES = int(os.getenv("CHUNK_WINDOW_SENTENCES", 3))
+CHUNK_OVERLAP_SENTENCES = int(os.getenv("CHUNK_OVERLAP_SENTENCES", 1))
+CONTEXT_CHAR_BUDGET = int(os.getenv("CONTEXT_CHAR_BUDGET", 4000))
+PARENT_STORE_FILE = "parent_documents.json"
+
+# Split after . ! ? (optionally followed by a closing quote/bracket) and whitespace,
+# but not after common abbreviations or single initials ("St. Louis", "J. Garcia")
+_SENTENCE_END = re.compile(r'(?<!\b[A-Z]\.)(?<!\bSt\.)(?<!\bMr\.)(?<!\bDr\.)(?<!\bvs\.)(?:(?<=[.!?])|(?<=[.!?]["\')\]]))\s+')
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split text into sentences"""
+    text = re.sub(r"\s+", " ", text or "").strip()
+    if not text:
+        return []
+    return [s.strip() for s in _SENTENCE_END.split(text) if s.strip()]
+
+
+def parent_id_for(text: str) -> str:
+    """Stable id for a source document, so re-ingesting the same text is a no-op"""
+    return "doc_" + hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def sentence_windows(sentences: List[str], window: int = CHUNK_WINDOW_SENTENCES,
+                     overlap: int = CHUNK_OVERLAP_SENTENCES) -> List[Tuple[int, int]]:
+    """(start, end) sentence ranges of overlapping windows covering every sentence"""
+    if len(sentences) <= window:
+        return [(0, len(sentences))]
+
+    step = max(window - overlap, 1)
+    windows = []
+    for start in range(0, len(sentences), step):
+        end = min(start + window, len(sentences))
+        windows.append((start, end))
+        if end == len(sentences):
+            break
+    return windows
+
+
+def chunk_documents(documents: List[Dict[str, Any]], window: int = CHUNK_WINDOW_SENTENCES,
+                    overlap: int = CHUNK_OVERLAP_SENTENCES) -> Tuple[List[Dict], List[Dict]]:
+    """Split documents into sentence-window chunks linked back to their parent
+
+    Returns (parents, chunks). Each parent is {'id', 'content', 'metadata'};
+    each chunk is a normal document dict whose metadata carries `parent_id`,
+    `chunk_index` and the sentence range it covers.
+    """
+    parents = []
+    chunks = []
+    seen = set()
+
+    for doc in documents:
+        text = doc["content"]
+        metadata = {k: v for k, v in doc.items() if k != "content"}
+        parent_id = parent_id_for(text)
+        if parent_id in seen:
+            continue
+        seen.add(parent_id)
+        parents.append({"id": parent_id, "content": text, "metadata": metadata})
+
+        sentences = split_sentences(text) or [text]
+        for index, (start, end) in enumerate(sentence_windows(sentences, window, overlap)):
+            chunk = dict(metadata)
+            chunk.update({
+                "content": " ".join(sentences[start:end]),
+                "id": f"{parent_id}#{index}",
+                "parent_id": parent_id,
+                "chunk_index": index,
+                "sentence_start": start,
+                "sentence_end": end,
+            })
+            chunks.append(chunk)
+
+    return parents, chunks
+
+
+class ParentDocumentStore(LoggedStore):
+    """Full source documents keyed by parent id, persisted next to the vector store
+
+    `parent_documents.json` is the compacted base; additions and deletions
+    are appended to its log (see store_log.LoggedStore).
+    """
+
+    label = "parent documents"
+
+    def __init__(self, db_path: str = KNOWLEDGE_DB_PATH):
+        self._lock = threading.Lock()
+        self._open(os.path.join(db_path, PARENT_STORE_FILE))
+
+    def _reset(self):
+        self.parents = {}
+
+    def _read_base(self, path: str):
+        with open(path) as f:
+            self.parents = json.load(f)
+
+    def _write_base(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.parents, f)
+
+    def _apply(self, record: Dict[str, Any]):
+        if "delete" in record:
+            for parent_id in record["delete"]:
+                self.parents.pop(parent_id, None)
+        else:
+            self.parents[record["id"]] = {"content": record["content"], "metadata": record["metadata"]}
+
+    def _size(self) -> int:
+        return len(self.parents)
+
+    def add(self, parents: List[Dict[str, Any]]):
+        with self._lock:
+            # Re-ingested parents that haven't changed aren't logged again
+            self._commit([
+                {"id": parent["id"], "content": parent["content"], "metadata": parent["metadata"]}
+                for parent in parents
+                if self.parents.get(parent["id"]) != {"content": parent["content"], "metadata": parent["metadata"]}
+            ])
+
+    def delete(self, parent_ids: List[str]):
+        if parent_ids:
+            with self._lock:
+                self._commit([{"delete": list(parent_ids)}])
+
+    def get(self, parent_id: str):
+        self.refresh()
+        return self.parents.get(parent_id)
+
+
+def _merge_ranges(ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def expand_to_parents(chunk_docs: List[Dict], parent_store: ParentDocumentStore,
+                      n_results: int = 5, budget: int = CONTEXT_CHAR_BUDGET) -> List[Dict]:
+    """Turn ranked chunk hits into ranked parent documents within a character budget
+
+    A parent that fits in the remaining budget is returned whole; otherwise only
+    its matched sentence windows are returned, merged in document order.
+    Chunks without a known parent (older collections) pass through unchanged.
+    """
+    grouped = {}
+    order = []
+    for doc in chunk_docs:
+        metadata = doc.get("metadata") or {}
+        key = metadata.get("parent_id")
+        if not key or parent_store.get(key) is None:
+            key = ("chunk", len(order))
+        if key not in grouped:
+            grouped[key] = {"distance": doc.get("distance"), "chunks": []}
+            order.append(key)
+        grouped[key]["chunks"].append(doc)
+
+    results = []
+    remaining = budget
+    for key in order[:n_results]:
+        if remaining <= 0:
+            break
+        group = grouped[key]
+        parent = parent_store.get(key) if isinstance(key, str) else None
+
+        if parent is None:
+            doc = group["chunks"][0]
+            content = doc["content"]
+            metadata = doc.get("metadata") or {}
+        elif len(parent["content"]) <= remaining:
+            content = parent["content"]
+            metadata = parent["metadata"]
+        else:
+            sentences = split_sentences(parent["content"])
+            ranges = _merge_ranges([
+                (c["metadata"].get("sentence_start", 0), c["metadata"].get("sentence_end", len(sentences)))
+                for c in group["chunks"]
+            ])
+            content = " ... ".join(" ".join(sentences[start:end]) for start, end in ranges)
+            metadata = parent["metadata"]
+
+        content = content[:remaining]
+        remaining -= len(content)
+        results.append({
+            "content": content,
+            "metadata": metadata,
+            "distance": group["distance"],
+        })
+
+    return results
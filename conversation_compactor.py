@@ -0,0 +1,125 @@
+import os
+import queue
+import threading
+from contextlib import nullcontext
+from typing import List, Dict, Any, Optional
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a Deadhead and a Grateful Dead expert bot.
+Fold the new messages into the existing summary. Keep names, songs, shows, dates and open questions;
+drop pleasantries. Write at most {max_words} words of plain prose."""
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English)"""
+    return len(text) // 4 + 1
+
+
+class ConversationCompactor:
+    """Folds older turns of long conversations into a running summary, off the request path
+
+    After each turn the request thread calls `maybe_schedule`, which only
+    estimates the session's size and, past the threshold, enqueues it. A single
+    background worker does the summarization and swaps the summary in.
+    """
+
+    def __init__(self, llm, sessions, lock: Optional[threading.Lock] = None, admission=None):
+        # sessions: a session_store.SessionStore; admission: an admission.AdmissionController, whose
+        # LLM slots summaries take only when no request is waiting for one
+        self.llm = llm
+        self.sessions = sessions
+        self.lock = lock or threading.Lock()
+        self.admission = admission
+        self.token_threshold = int(os.getenv("COMPACT_TOKEN_THRESHOLD", 1200))
+        self.keep_recent = int(os.getenv("COMPACT_KEEP_RECENT_MESSAGES", 4))
+        self.summary_words = int(os.getenv("COMPACT_SUMMARY_WORDS", 150))
+        self.queue = queue.Queue()
+        self.pending = set()
+        self.stats = {"scheduled": 0, "compacted": 0, "fallback_summaries": 0, "messages_folded": 0}
+        self._worker = None
+
+    def start(self):
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run, name="conversation-compactor", daemon=True)
+            self._worker.start()
+
+    def session_tokens(self, session) -> int:
+        text = (session.summary or "") + "".join(m.content for m in session.history)
+        return estimate_tokens(text)
+
+    def maybe_schedule(self, session_id: str):
+        """Queue a session for compaction if it has grown past the threshold (never blocks)"""
+        session = self.sessions.get(session_id)
+        if not session or len(session.history) <= self.keep_recent:
+            return
+        with self.lock:
+            # Other requests of the same session may be appending to its ring buffer
+            if self.session_tokens(session) < self.token_threshold:
+                return
+            if session_id in self.pending:
+                return
+            self.pending.add(session_id)
+            self.stats["scheduled"] += 1
+        self.queue.put(session_id)
+
+    def _run(self):
+        while True:
+            session_id = self.queue.get()
+            try:
+                self.compact(session_id)
+            except Exception as e:
+                print(f"Error compacting conversation {session_id}: {e}")
+            finally:
+                with self.lock:
+                    self.pending.discard(session_id)
+
+    def compact(self, session_id: str):
+        """Summarize everything but the most recent messages of one session"""
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if not session or len(session.history) <= self.keep_recent:
+                return
+            folded = list(session.history)[:-self.keep_recent]
+            previous_summary = session.summary or ""
+
+        summary = self.summarize(previous_summary, folded)
+
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if not session:
+                return
+            # New turns may have arrived meanwhile; drop only what we actually folded
+            folded_ids = {id(m) for m in folded}
+            self.sessions.rewrite(session, [m for m in session.history if id(m) not in folded_ids], summary)
+            self.stats["compacted"] += 1
+            self.stats["messages_folded"] += len(folded)
+
+    def summarize(self, previous_summary: str, messages: List[Dict]) -> str:
+        transcript = "\n".join(
+            f"{'Human' if m['role'] == 'user' else 'Assistant'}: {m['content']}" for m in messages
+        )
+        prompt = f"Existing summary:\n{previous_summary or '(none)'}\n\nNew messages:\n{transcript}"
+        try:
+            slot = self.admission.background_slot() if self.admission else nullcontext()
+            with slot:
+                response = self.llm.complete(
+                    messages=[
+                        {"role": "system", "content": SUMMARY_PROMPT.format(max_words=self.summary_words)},
+                        {"role": "user", "content": prompt}
+                    ],
+                    max_tokens=self.summary_words * 2,
+                    temperature=0.2
+                )
+            return response.choices[0].message.content.strip()
+        except Exception:
+            # Keep the size bounded even without the LLM: remember what the user asked about
+            with self.lock:
+                self.stats["fallback_summaries"] += 1
+            asked = "; ".join(m["content"][:80] for m in messages if m["role"] == "user")
+            summary = f"{previous_summary} Earlier the user asked about: {asked}.".strip()
+            return summary[-self.summary_words * 6:]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            stats = dict(self.stats)
+            stats["queue_depth"] = len(self.pending)
+        return stats
@@ -0,0 +1,394 @@
+import os
+import re
+import json
+import time
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from urllib.parse import urljoin, urldefrag, urlparse
+from urllib.robotparser import RobotFileParser
+import requests
+from bs4 import BeautifulSoup
+from dotenv import load_dotenv
+from index_config import KNOWLEDGE_DB_PATH
+from staging import STAGING_ENABLED, StagingWriter
+
+# Load environment variables
+load_dotenv()
+
+# lxml parses several times faster than the stdlib parser; use it when it is installed
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+FRONTIER_FILE = "crawl_frontier.json"
+CRAWL_USER_AGENT = os.getenv("CRAWL_USER_AGENT", "GratefulDeadChatbot-Crawler/1.0")
+CRAWL_WORKERS = int(os.getenv("CRAWL_WORKERS", 8))
+CRAWL_MAX_PAGES = int(os.getenv("CRAWL_MAX_PAGES", 500))
+CRAWL_TIMEOUT = float(os.getenv("CRAWL_TIMEOUT_SECONDS", 15))
+# Pages with less extracted text than this are navigation, not documents
+CRAWL_MIN_CHARS = int(os.getenv("CRAWL_MIN_CHARS", 200))
+# JSON list of site definitions replacing DEFAULT_SITES
+CRAWL_SITES_FILE = os.getenv("CRAWL_SITES_FILE")
+
+# Per-site politeness: `delay` seconds between request starts and at most
+# `concurrency` requests in flight per host (robots.txt Crawl-delay wins if longer).
+# `follow` limits which links are queued; pages matching `extract` become documents.
+DEFAULT_SITES = [
+    {
+        "name": "agdl",
+        "seeds": ["https://artsites.ucsc.edu/GDead/agdl/"],
+        "follow": r"^https://artsites\.ucsc\.edu/GDead/agdl/",
+        "extract": r"^https://artsites\.ucsc\.edu/GDead/agdl/[a-z0-9_]+\.html$",
+        "category": "songs",
+        "type": "lyrics_annotation",
+        "max_depth": 2,
+        "delay": 1.0,
+        "concurrency": 2,
+    },
+    {
+        "name": "deadnet_songs",
+        "seeds": ["https://www.dead.net/songs"],
+        "follow": r"^https://www\.dead\.net/(songs|song/)",
+        "extract": r"^https://www\.dead\.net/song/",
+        "category": "songs",
+        "type": "song_info",
+        "max_depth": 2,
+        "delay": 2.0,
+        "concurrency": 1,
+    },
+]
+
+# Boilerplate elements removed before text extraction
+STRIP_TAGS = ["script", "style", "noscript", "nav", "header", "footer", "aside", "form", "iframe", "svg"]
+
+
+def load_sites(path: Optional[str] = CRAWL_SITES_FILE) -> List[Dict[str, Any]]:
+    if not path:
+        return DEFAULT_SITES
+    with open(path) as f:
+        return json.load(f)
+
+
+def host_of(url: str) -> str:
+    return urlparse(url).netloc.lower()
+
+
+class CrawlFrontier:
+    """Queued URLs per host and every URL ever queued, persisted next to the vector store
+
+    URLs popped but not yet finished are written back as queued, so an
+    interrupted crawl resumes where it stopped without losing pages.
+    """
+
+    def __init__(self, db_path: Optional[str] = KNOWLEDGE_DB_PATH):
+        # db_path=None keeps the frontier in memory only
+        self.path = os.path.join(db_path, FRONTIER_FILE) if db_path else None
+        self._lock = threading.Lock()
+        self.queues = {}
+        self.seen = set()
+        self.in_flight = {}
+        self.fetched = 0
+
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path) as f:
+                    data = json.load(f)
+                self.seen = set(data["seen"])
+                self.fetched = data.get("fetched", 0)
+                for url, site, depth in data["queued"]:
+                    self.queues.setdefault(host_of(url), deque()).append((url, site, depth))
+            except Exception as e:
+                print(f"⚠️ Could not read crawl frontier: {e}")
+
+    def __len__(self) -> int:
+        return sum(len(q) for q in self.queues.values())
+
+    def add(self, url: str, site: str, depth: int, force: bool = False) -> bool:
+        """Queue a URL unless it was seen before (seeds are forced, to pick up new links)"""
+        with self._lock:
+            if url in self.seen and not force:
+                return False
+            self.seen.add(url)
+            self.queues.setdefault(host_of(url), deque()).append((url, site, depth))
+            return True
+
+    def hosts(self) -> List[str]:
+        return [host for host, q in self.queues.items() if q]
+
+    def pop(self, host: str) -> Tuple[str, str, int]:
+        with self._lock:
+            entry = self.queues[host].popleft()
+            self.in_flight[entry[0]] = entry
+            return entry
+
+    def done(self, url: str):
+        with self._lock:
+            self.in_flight.pop(url, None)
+            self.fetched += 1
+
+    def reset(self):
+        with self._lock:
+            self.queues, self.seen, self.in_flight, self.fetched = {}, set(), {}, 0
+            self._save()
+
+    def save(self):
+        with self._lock:
+            self._save()
+
+    def _save(self):
+        if not self.path:
+            return
+        queued = list(self.in_flight.values()) + [entry for q in self.queues.values() for entry in q]
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"queued": queued, "seen": sorted(self.seen), "fetched": self.fetched}, f)
+        os.replace(tmp_path, self.path)
+
+
+class HostPolicy:
+    """Politeness state for one host (only touched by the scheduling thread)"""
+
+    def __init__(self, delay: float, concurrency: int, robots: Optional[RobotFileParser]):
+        self.delay = delay
+        self.concurrency = max(1, concurrency)
+        self.robots = robots
+        self.active = 0
+        self.next_start = 0.0
+
+    def ready(self, now: float) -> bool:
+        return self.active < self.concurrency and now >= self.next_start
+
+    def acquire(self, now: float):
+        self.active += 1
+        self.next_start = now + self.delay
+
+    def release(self):
+        self.active -= 1
+
+
+def extract_page(html: str, url: str, site: Dict[str, Any], extract: bool) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+    """Cleaned document (or None) and the absolute links of one HTML page"""
+    soup = BeautifulSoup(html, HTML_PARSER)
+    links = []
+    for a in soup.find_all("a", href=True):
+        link, _ = urldefrag(urljoin(url, a["href"]))
+        if link.startswith(("http://", "https://")):
+            links.append(link)
+
+    if not extract:
+        return None, links
+
+    heading = soup.find("h1")
+    title = (heading.get_text(" ", strip=True) if heading else "") or (soup.title.get_text(strip=True) if soup.title else "")
+    for tag in soup(STRIP_TAGS):
+        tag.decompose()
+    body = soup.select_one(site["content_selector"]) if site.get("content_selector") else None
+    body = body or soup.find("article") or soup.find("main") or soup.body or soup
+    text = re.sub(r"\s+", " ", body.get_text(" ", strip=True)).strip()
+    if len(text) < CRAWL_MIN_CHARS:
+        return None, links
+
+    content = text if not title or text.startswith(title) else f"{title}. {text}"
+    return {
+        "content": content,
+        "category": site.get("category", "general"),
+        "type": site.get("type", "web_page"),
+        "title": title,
+        "url": url,
+        "site": site["name"],
+        "source": "crawl",
+        "fetched_at": int(time.time()),
+    }, links
+
+
+class Crawler:
+    """Concurrent, polite crawler that yields cleaned documents as pages are fetched
+
+    One scheduling loop owns the frontier and per-host limits and hands URLs to
+    a thread pool; fetching and parsing happen on the pool. robots.txt is read
+    once per host, with the same session, so local fixture sites work too.
+    """
+
+    def __init__(self, sites: Optional[List[Dict[str, Any]]] = None, frontier: Optional[CrawlFrontier] = None,
+                 workers: int = CRAWL_WORKERS, session: Optional[requests.Session] = None,
+                 user_agent: str = CRAWL_USER_AGENT, save_every: int = 25, stage: bool = STAGING_ENABLED):
+        self.sites = {site["name"]: site for site in (sites or load_sites())}
+        self.frontier = frontier if frontier is not None else CrawlFrontier()
+        self.workers = workers
+        self.user_agent = user_agent
+        self.save_every = save_every
+        self.stage = stage
+        self.session = session or requests.Session()
+        self.session.headers.update({"User-Agent": user_agent})
+        self.policies = {}
+        self.stats = {"fetched": 0, "documents": 0, "errors": 0, "robots_blocked": 0, "skipped": 0}
+        self._patterns = {
+            name: (re.compile(site.get("follow") or "^"), re.compile(site["extract"]) if site.get("extract") else None)
+            for name, site in self.sites.items()
+        }
+
+    def _policy(self, url: str, site: Dict[str, Any]) -> HostPolicy:
+        host = host_of(url)
+        if host not in self.policies:
+            robots = RobotFileParser()
+            robots_url = f"{urlparse(url).scheme}://{host}/robots.txt"
+            try:
+                response = self.session.get(robots_url, timeout=CRAWL_TIMEOUT)
+                if response.status_code in (401, 403):
+                    robots.disallow_all = True
+                elif response.ok:
+                    robots.parse(response.text.splitlines())
+                else:
+                    robots.allow_all = True
+            except requests.RequestException:
+                robots.allow_all = True
+            delay = max(float(site.get("delay", 1.0)), float(robots.crawl_delay(self.user_agent) or 0))
+            self.policies[host] = HostPolicy(delay, int(site.get("concurrency", 1)), robots)
+        return self.policies[host]
+
+    def allowed(self, url: str, site: Dict[str, Any]) -> bool:
+        return self._policy(url, site).robots.can_fetch(self.user_agent, url)
+
+    def _fetch(self, url: str, site_name: str):
+        site = self.sites[site_name]
+        response = self.session.get(url, timeout=CRAWL_TIMEOUT)
+        response.raise_for_status()
+        if "html" not in response.headers.get("Content-Type", "text/html"):
+            return None, []
+        extract_pattern = self._patterns[site_name][1]
+        extract = bool(extract_pattern and extract_pattern.search(response.url))
+        return extract_page(response.text, response.url, site, extract)
+
+    def _enqueue(self, url: str, site_name: str, depth: int, force: bool = False):
+        site = self.sites[site_name]
+        if depth > site.get("max_depth", 3) or not self._patterns[site_name][0].search(url):
+            return
+        if url in self.frontier.seen and not force:
+            return
+        if not self.allowed(url, site):
+            self.stats["robots_blocked"] += 1
+            return
+        self.frontier.add(url, site_name, depth, force=force)
+
+    def crawl(self, max_pages: int = CRAWL_MAX_PAGES) -> Iterator[Dict[str, Any]]:
+        """Fetch up to `max_pages` pages, yielding each extracted document as soon as it is parsed"""
+        for name, site in self.sites.items():
+            for seed in site["seeds"]:
+                self._enqueue(seed, name, 0, force=True)
+
+        in_flight = {}
+        started = 0
+        # Raw copies of extracted pages, so they can be re-embedded without re-crawling
+        staging = StagingWriter("crawl") if self.stage else None
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                while True:
+                    now = time.monotonic()
+                    for host in self.frontier.hosts():
+                        while started < max_pages and len(in_flight) < self.workers and self.frontier.queues[host]:
+                            url, site_name, depth = self.frontier.queues[host][0]
+                            if site_name not in self.sites:
+                                # Queued by an earlier run with a different site list
+                                self.frontier.pop(host)
+                                self.frontier.done(url)
+                                continue
+                            policy = self._policy(url, self.sites[site_name])
+                            if not policy.ready(now):
+                                break
+                            self.frontier.pop(host)
+                            policy.acquire(now)
+                            in_flight[pool.submit(self._fetch, url, site_name)] = (url, site_name, depth, policy)
+                            started += 1
+
+                    if not in_flight:
+                        if started >= max_pages or not len(self.frontier):
+                            break
+                        # Everything queued is waiting on a host's delay
+                        next_start = min((self.policies[h].next_start for h in self.frontier.hosts()
+                                          if h in self.policies), default=now)
+                        time.sleep(max(0.01, next_start - now))
+                        continue
+
+                    next_start = min((self.policies[h].next_start for h in self.frontier.hosts()
+                                      if h in self.policies and self.policies[h].active < self.policies[h].concurrency),
+                                     default=now + 1.0)
+                    done, _ = wait(list(in_flight), timeout=max(0.01, next_start - now), return_when=FIRST_COMPLETED)
+                    for future in done:
+                        url, site_name, depth, policy = in_flight.pop(future)
+                        policy.release()
+                        self.frontier.done(url)
+                        self.stats["fetched"] += 1
+                        try:
+                            doc, links = future.result()
+                        except Exception as e:
+                            self.stats["errors"] += 1
+                            print(f"❌ Error crawling {url}: {e}")
+                            continue
+                        for link in links:
+                            self._enqueue(link, site_name, depth + 1)
+                        if doc:
+                            self.stats["documents"] += 1
+                            if staging:
+                                staging.write([doc], site=site_name)
+                            yield doc
+                        else:
+                            self.stats["skipped"] += 1
+                        if self.stats["fetched"] % self.save_every == 0:
+                            self.frontier.save()
+        finally:
+            # Unfinished URLs are still in the frontier's in-flight set and are saved as queued
+            self.frontier.save()
+            if staging:
+                staging.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl song, lyrics and essay pages into the knowledge base")
+    parser.add_argument("--sites", default=CRAWL_SITES_FILE, help="JSON file of site definitions (default: built-in sites)")
+    parser.add_argument("--max-pages", type=int, default=CRAWL_MAX_PAGES)
+    parser.add_argument("--workers", type=int, default=CRAWL_WORKERS)
+    parser.add_argument("--output", help="Write documents to this JSONL file instead of ingesting them")
+    parser.add_argument("--batch-size", type=int, default=50, help="Documents per ingestion write")
+    parser.add_argument("--reset", action="store_true", help="Forget the frontier and crawl from the seeds again")
+    args = parser.parse_args()
+
+    frontier = CrawlFrontier()
+    if args.reset:
+        frontier.reset()
+    crawler = Crawler(load_sites(args.sites), frontier, workers=args.workers)
+
+    start = time.perf_counter()
+    if args.output:
+        with open(args.output, "a") as f:
+            for doc in crawler.crawl(args.max_pages):
+                f.write(json.dumps(doc) + "\n")
+    else:
+        from bulk_embed import BulkEmbedder, bulk_ingest, open_local_writer
+        embedder = BulkEmbedder(workers=1)
+        write_chunks, dedup_index = open_local_writer()
+        batch = []
+        try:
+            for doc in crawler.crawl(args.max_pages):
+                batch.append(doc)
+                if len(batch) >= args.batch_size:
+                    bulk_ingest(batch, write_chunks, embedder, dedup_index=dedup_index)
+                    batch = []
+            if batch:
+                bulk_ingest(batch, write_chunks, embedder, dedup_index=dedup_index)
+        finally:
+            embedder.close()
+
+    elapsed = time.perf_counter() - start
+    stats = crawler.stats
+    print(f"✓ Crawled {stats['fetched']} pages ({stats['fetched'] / elapsed:.1f}/s), {stats['documents']} documents, "
+          f"{stats['errors']} errors, {stats['robots_blocked']} blocked by robots.txt, {len(frontier)} still queued")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,7 @@ from bs4 import BeautifulSoup
 from typing import List, Dict, Any
 import re
 from datetime import datetime
+from staging import stage_fetched, retry_from_staging_hint
 
 class GratefulDeadDataScraper:
     """Scrape and fetch Grateful Dead data from various sources"""
@@ -42,7 +43,7 @@ class GratefulDeadDataScraper:
                     setlists.append(setlist_doc)
             
             print(f"✓ Fetched {len(setlists)} setlists from setlist.fm")
-            return setlists
+            return stage_fetched('setlistfm', setlists, url=url)
             
         except Exception as e:
             print(f"❌ Error fetching setlist.fm data: {e}")
@@ -65,9 +66,7 @@ class GratefulDeadDataScraper:
             
             content = f"Grateful Dead performed at {venue_name} in {city} on {date}. "
             if songs:
-                content += f"Setlist included: {', '.join(songs[:10])}"  # First 10 songs
-                if len(songs) > 10:
-                    content += f" and {len(songs) - 10} more songs."
+                content += f"Setlist included: {', '.join(songs)}."
             
             return {
                 'content': content,
@@ -106,18 +105,60 @@ class GratefulDeadDataScraper:
                     shows.append(show_doc)
             
             print(f"✓ Scraped {len(shows)} shows from archive.org")
-            return shows
+            return stage_fetched('archive', shows, url=url, query=params['q'])
             
         except Exception as e:
             print(f"❌ Error scraping archive.org: {e}")
             return []
     
+    def scrape_archive_since(self, since=None, field='addeddate', collection='GratefulDead', rows=500, max_pages=20):
+        """
+        Fetch archive.org items added (or published) after a watermark, oldest first.
+        Returns (show_docs, newest_watermark_seen).
+        """
+        url = "https://archive.org/advancedsearch.php"
+        query = f'collection:{collection} AND mediatype:etree'
+        if since:
+            # A raw timestamp's ':' breaks the Lucene range, so search from the mark's day;
+            # the items re-fetched from that day are dropped by the caller
+            query += f' AND {field}:[{since[:10]} TO null]'
+        
+        shows = []
+        newest = since
+        for page in range(1, max_pages + 1):
+            params = {
+                'q': query,
+                'fl[]': ['identifier', 'title', 'date', 'description', field],
+                'sort[]': f'{field} asc',
+                'rows': rows,
+                'page': page,
+                'output': 'json'
+            }
+            response = self.session.get(url, params=params)
+            response.raise_for_status()
+            docs = response.json().get('response', {}).get('docs', [])
+            
+            for doc in docs:
+                show_doc = self.parse_archive_show(doc)
+                if show_doc:
+                    shows.append(show_doc)
+                marker = doc.get(field)
+                if marker and (newest is None or marker > newest):
+                    newest = marker
+            
+            if len(docs) < rows:
+                break
+        
+        print(f"✓ Found {len(shows)} new or updated shows on archive.org since {since or 'the beginning'}")
+        return stage_fetched('archive', shows, url=url, query=query, watermark=newest), newest
+    
     def parse_archive_show(self, doc):
         """Parse archive.org show data"""
         try:
             title = doc.get('title', '')
             date = doc.get('date', '')
             description = doc.get('description', [''])[0] if doc.get('description') else ''
+            description = BeautifulSoup(description, 'html.parser').get_text(' ', strip=True)
             identifier = doc.get('identifier', '')
             
             # Extract venue info from title if possible
@@ -128,7 +169,7 @@ class GratefulDeadDataScraper:
             if venue != 'Unknown Venue':
                 content += f" at {venue}"
             if description:
-                content += f". {description[:200]}"  # First 200 chars of description
+                content += f". {description}"  # Full notes; long ones are chunked at ingestion
             
             return {
                 'content': content,
@@ -165,7 +206,7 @@ class GratefulDeadDataScraper:
             }
         ]
         
-        return song_info
+        return stage_fetched('curated', song_info)
     
     def get_musicbrainz_data(self):
         """Fetch structured data from MusicBrainz API (free, no key needed)"""
@@ -191,7 +232,7 @@ class GratefulDeadDataScraper:
                 albums.append(album_doc)
             
             print(f"✓ Fetched {len(albums)} albums from MusicBrainz")
-            return albums
+            return stage_fetched('musicbrainz', albums, url=releases_url)
             
         except Exception as e:
             print(f"❌ Error fetching MusicBrainz data: {e}")
@@ -234,7 +275,8 @@ def add_external_data_to_chatbot(chatbot, setlistfm_api_key=None):
     
     if external_docs:
         print(f"📚 Adding {len(external_docs)} documents from external sources...")
-        chatbot.add_knowledge_to_db(external_docs)
+        with retry_from_staging_hint():
+            chatbot.add_knowledge_to_db(external_docs)
         print("✅ External data added successfully!")
         
         print("\n🎵 Your chatbot now includes:")
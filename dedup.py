@@ -0,0 +1,356 @@
+import os
+import re
+import json
+import hashlib
+import argparse
+import threading
+from collections import Counter, defaultdict
+from typing import List, Dict, Any, Callable, Optional, Tuple
+import numpy as np
+from dotenv import load_dotenv
+from index_config import KNOWLEDGE_DB_PATH
+from fact_store import normalize_date, _normalize_name
+from store_log import LoggedStore, refuse_if_served
+
+# Load environment variables
+load_dotenv()
+
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "true").lower() in ("1", "true", "yes")
+# Estimated Jaccard similarity of word shingles at or above which two documents are the same
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", 0.7))
+DEDUP_INDEX_FILE = "minhash_index.npz"
+# Templated records: the wording is shared, so only their key fields say whether two are the same thing
+STRUCTURED_TYPES = {"album_info", "archive_show", "setlist_data"}
+
+NUM_PERMUTATIONS = 128
+# 32 bands x 4 rows: a pair at similarity s shares a band with probability 1-(1-s^4)^32,
+# 0.9998 at 0.7 and 0.87 at 0.5; candidates are then checked against the threshold
+BANDS = 32
+SHINGLE_WORDS = 2
+_PRIME = np.uint64(4294967311)  # smallest prime above 2**32
+_rng = np.random.RandomState(20250)
+_A = _rng.randint(1, 2 ** 31, NUM_PERMUTATIONS).astype(np.uint64)
+_B = _rng.randint(0, 2 ** 32, NUM_PERMUTATIONS, dtype=np.int64).astype(np.uint64)
+
+
+def shingles(text: str, size: int = SHINGLE_WORDS) -> List[str]:
+    words = re.findall(r"[a-z0-9']+", (text or "").lower())
+    if len(words) <= size:
+        return [" ".join(words)] if words else []
+    return [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+
+
+def minhash(text: str) -> np.ndarray:
+    """MinHash signature (NUM_PERMUTATIONS uint64 values) of a document's word shingles"""
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little")
+         for s in set(shingles(text))] or [0],
+        dtype=np.uint64
+    )
+    # (a*x + b) mod p for every permutation and shingle at once; a < 2**31 keeps this inside uint64
+    permuted = (np.outer(_A, hashes) + _B[:, None]) % _PRIME
+    return permuted.min(axis=1)
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of two signatures"""
+    return float(np.mean(a == b))
+
+
+class NearDuplicateIndex(LoggedStore):
+    """LSH over MinHash signatures: signatures split into bands, documents sharing any band are candidates
+
+    Signatures of everything already in the knowledge base are persisted next
+    to the store, so a new batch is also checked against earlier ingestions.
+    Each signature is stored with its document's record key (see
+    `_record_key`), so templated records are only compared with records of
+    the same album or date. `minhash_index.npz` is the compacted base;
+    signatures added and removed since are appended to its log (see
+    store_log.LoggedStore).
+    """
+
+    label = "near-duplicate index"
+
+    def __init__(self, db_path: Optional[str] = KNOWLEDGE_DB_PATH, threshold: float = DEDUP_THRESHOLD,
+                 persist: bool = True):
+        # db_path=None keeps the index in memory only; persist=False loads it but never writes it back
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._open(os.path.join(db_path, DEDUP_INDEX_FILE) if db_path else None, persist)
+
+    def _reset(self):
+        # Parallel by position; a removed document leaves None in `ids` until the next compaction
+        self.ids = []
+        self.signatures = []
+        self.keys = []
+        self.buckets = defaultdict(list)
+        self._positions = {}
+        self._key_counts = Counter()
+
+    def _read_base(self, path: str):
+        with np.load(path) as data:
+            ids = data["ids"].tolist()
+            if "keys" in data.files:
+                keys = data["keys"].tolist()
+            else:
+                print("⚠️ Near-duplicate index has no record keys; run `python dedup.py --rebuild-index` "
+                      "so albums, shows and setlists are matched across ingestions")
+                keys = [""] * len(ids)
+            for doc_id, signature, key in zip(ids, data["signatures"], keys):
+                self._insert(doc_id, signature, key)
+
+    def _write_base(self, path: str):
+        ids, signatures, keys = self._entries()
+        with open(path, "wb") as f:
+            np.savez(f, ids=np.array(ids, dtype=str), signatures=signatures, keys=np.array(keys, dtype=str))
+
+    def _apply(self, record: Dict[str, Any]):
+        for doc_id, signature, key in record.get("add", []):
+            self._insert(doc_id, np.asarray(signature, dtype=np.uint64), key)
+        for doc_id in record.get("remove", []):
+            position = self._positions.pop(doc_id, None)
+            if position is not None:
+                self.ids[position] = None
+                self._key_counts[self.keys[position]] -= 1
+
+    def _size(self) -> int:
+        return len(self._positions)
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    @staticmethod
+    def _band_keys(signature: np.ndarray) -> List[Tuple[int, bytes]]:
+        return [(band, rows.tobytes()) for band, rows in enumerate(np.split(signature, BANDS))]
+
+    def _insert(self, doc_id: str, signature: np.ndarray, key: str = ""):
+        if doc_id in self._positions:
+            return
+        position = len(self.ids)
+        self._positions[doc_id] = position
+        self.ids.append(doc_id)
+        self.signatures.append(signature)
+        self.keys.append(key)
+        self._key_counts[key] += 1
+        for band_key in self._band_keys(signature):
+            self.buckets[band_key].append(position)
+
+    def _entries(self) -> Tuple[List[str], np.ndarray, List[str]]:
+        positions = sorted(self._positions.values())
+        signatures = (np.vstack([self.signatures[p] for p in positions]) if positions
+                      else np.zeros((0, NUM_PERMUTATIONS), np.uint64))
+        return [self.ids[p] for p in positions], signatures, [self.keys[p] for p in positions]
+
+    def entries(self) -> Tuple[List[str], np.ndarray, List[str]]:
+        """Ids, signatures and record keys of every indexed document (e.g. for a snapshot)"""
+        self.refresh()
+        with self._lock:
+            return self._entries()
+
+    def find(self, signature: np.ndarray, threshold: Optional[float] = None, key: Optional[str] = None) -> Optional[str]:
+        """Id of the most similar indexed document at or above the threshold (with record key `key`, if given)"""
+        candidates = {position for band_key in self._band_keys(signature) for position in self.buckets.get(band_key, ())}
+        best, best_score = None, self.threshold if threshold is None else threshold
+        for position in candidates:
+            if self.ids[position] is None or (key is not None and self.keys[position] != key):
+                continue
+            score = similarity(signature, self.signatures[position])
+            if score >= best_score:
+                best, best_score = self.ids[position], score
+        return best
+
+    def has_key(self, key: str) -> bool:
+        """Whether a document with this record key is indexed"""
+        return self._key_counts[key] > 0
+
+    def add(self, parents: List[Dict[str, Any]]):
+        """Index newly written parent documents ({'id', 'content', 'metadata'?})"""
+        with self._lock:
+            new = [[parent["id"], minhash(parent["content"]).tolist(), _key_string(parent.get("metadata") or {})]
+                   for parent in parents if parent["id"] not in self._positions]
+            if new:
+                self._commit([{"add": new}])
+
+    def add_signatures(self, doc_ids: List[str], signatures: np.ndarray, keys: Optional[List[str]] = None):
+        """Index precomputed signatures (e.g. from a snapshot)"""
+        keys = keys or [""] * len(doc_ids)
+        with self._lock:
+            new = [[doc_id, np.asarray(signature, dtype=np.uint64).tolist(), key]
+                   for doc_id, signature, key in zip(doc_ids, signatures, keys) if doc_id not in self._positions]
+            if new:
+                self._commit([{"add": new}])
+
+    def remove(self, doc_ids: List[str]):
+        """Forget deleted documents, so their near-duplicates can be ingested again"""
+        with self._lock:
+            drop = [doc_id for doc_id in doc_ids if doc_id in self._positions]
+            if drop:
+                self._commit([{"remove": drop}])
+
+    def clear(self):
+        """Forget every signature (before re-indexing from the stored parent documents)"""
+        with self._lock:
+            self._reset()
+            self._rewrite()
+
+
+def _reference(doc: Dict[str, Any]) -> str:
+    """How a collapsed duplicate is remembered on its canonical document: its URL or archive id,
+    else its source plus title, else its source plus the id its text would have been stored under"""
+    if doc.get("url") or doc.get("archive_id"):
+        return str(doc.get("url") or doc.get("archive_id"))
+    from chunking import parent_id_for
+    origin = doc.get("source") or doc.get("type") or "unknown"
+    return f"{origin}:{doc.get('title') or doc.get('album') or parent_id_for(doc.get('content', ''))}"
+
+
+def _merge_into(canonical: Dict[str, Any], duplicate: Dict[str, Any]):
+    refs = [ref for ref in canonical.get("duplicate_sources", "").split("; ") if ref]
+    for ref in [_reference(duplicate)] + [r for r in duplicate.get("duplicate_sources", "").split("; ") if r]:
+        if ref not in refs and ref != _reference(canonical):
+            refs.append(ref)
+    # Chroma metadata must be scalar, so references are one joined string
+    canonical["duplicate_sources"] = "; ".join(refs)
+    canonical["duplicate_count"] = canonical.get("duplicate_count", 0) + 1 + duplicate.get("duplicate_count", 0)
+
+
+def _record_key(doc: Dict[str, Any]) -> Optional[Tuple[str, ...]]:
+    """What a structured record describes; near-identical text only merges records with the same key"""
+    kind = doc.get("type")
+    if kind not in STRUCTURED_TYPES:
+        return None
+    if kind == "album_info":
+        return kind, _normalize_name(str(doc.get("album") or "")), str(doc.get("year") or "")
+    return kind, normalize_date(str(doc.get("date") or "")) or ""
+
+
+def _key_string(doc: Dict[str, Any]) -> str:
+    """A document's record key as stored with its signature ("" for prose)"""
+    key = _record_key(doc)
+    return json.dumps(key) if key else ""
+
+
+def _show_key(doc: Dict[str, Any]) -> Optional[str]:
+    """Archive.org tapes (SBD, AUD, matrix...) of the same show share a date"""
+    if doc.get("type") != "archive_show":
+        return None
+    return normalize_date(str(doc.get("date") or ""))
+
+
+def _chunk_count(text: str) -> int:
+    from chunking import split_sentences, sentence_windows
+    return len(sentence_windows(split_sentences(text) or [text]))
+
+
+def dedupe_documents(documents: List[Dict[str, Any]], index: Optional[NearDuplicateIndex] = None,
+                     threshold: float = DEDUP_THRESHOLD) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """Collapse near-duplicates into one canonical document each
+
+    Within the batch, the longest document of each group is kept and the
+    others are recorded in its `duplicate_sources`/`duplicate_count`
+    metadata. Documents that near-duplicate something already in `index`
+    are dropped. Structured records (albums, shows, setlists) only merge
+    with records of the same album or date, in the batch and in `index`
+    alike, and a tape of a show already indexed is dropped. Returns
+    (documents, report).
+    """
+    batch_index = NearDuplicateIndex(db_path=None, threshold=threshold)
+    if index is not None:
+        index.refresh()
+    canonical = {}   # batch position -> merged document
+    by_show = {}
+    dropped_existing = []
+    dropped_batch = []
+
+    # Longest first, so the canonical copy is the most informative one
+    order = sorted(range(len(documents)), key=lambda i: len(documents[i].get("content", "")), reverse=True)
+    for i in order:
+        doc = documents[i]
+        show_key = _show_key(doc)
+        if show_key and show_key in by_show:
+            _merge_into(canonical[by_show[show_key]], doc)
+            dropped_batch.append(doc)
+            continue
+
+        key = _key_string(doc)
+        signature = minhash(doc["content"])
+        if index is not None and ((show_key and index.has_key(key)) or index.find(signature, threshold, key)):
+            dropped_existing.append(doc)
+            continue
+        match = batch_index.find(signature, key=key)
+        if match is not None:
+            _merge_into(canonical[int(match)], doc)
+            dropped_batch.append(doc)
+            continue
+
+        canonical[i] = dict(doc)
+        batch_index._insert(str(i), signature, key)
+        if show_key:
+            by_show[show_key] = i
+
+    kept = [canonical[i] for i in sorted(canonical)]
+    dropped = dropped_batch + dropped_existing
+    input_chars = sum(len(doc.get("content", "")) for doc in documents)
+    output_chars = sum(len(doc.get("content", "")) for doc in kept)
+    report = {
+        "input_documents": len(documents),
+        "output_documents": len(kept),
+        "collapsed_in_batch": len(dropped_batch),
+        "already_indexed": len(dropped_existing),
+        "input_chars": input_chars,
+        "output_chars": output_chars,
+        "corpus_reduction": round(1 - output_chars / input_chars, 4) if input_chars else 0.0,
+        "chunks_saved": sum(_chunk_count(doc.get("content", "")) for doc in dropped),
+    }
+    return kept, report
+
+
+def merge_reports(total: Dict[str, Any], report: Dict[str, Any]) -> Dict[str, Any]:
+    """Combine the reports of consecutive batches (for sources ingested as a stream)"""
+    if not total:
+        return dict(report)
+    merged = {key: total[key] + report[key] for key in report if key != "corpus_reduction"}
+    merged["corpus_reduction"] = (round(1 - merged["output_chars"] / merged["input_chars"], 4)
+                                  if merged["input_chars"] else 0.0)
+    return merged
+
+
+def describe_report(report: Dict[str, Any]) -> str:
+    return (f"{report['input_documents']} -> {report['output_documents']} documents "
+            f"({report['collapsed_in_batch']} near-duplicates collapsed, {report['already_indexed']} already indexed, "
+            f"{report['chunks_saved']} chunks and {report['corpus_reduction']:.0%} of the text saved)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report near-duplicates in a document file or the knowledge base")
+    parser.add_argument("--input", help="JSONL file of documents (default: the parent documents already stored)")
+    parser.add_argument("--threshold", type=float, default=DEDUP_THRESHOLD)
+    parser.add_argument("--rebuild-index", action="store_true",
+                        help="Rebuild the persisted signature index from the stored parent documents")
+    args = parser.parse_args()
+
+    from chunking import ParentDocumentStore
+    parent_store = ParentDocumentStore()
+
+    if args.rebuild_index:
+        refuse_if_served()
+        index = NearDuplicateIndex()
+        index.clear()
+        index.add([{"id": parent_id, **parent} for parent_id, parent in parent_store.parents.items()])
+        print(f"✓ Indexed {len(index)} parent documents")
+        return
+
+    if args.input:
+        with open(args.input) as f:
+            documents = [json.loads(line) for line in f if line.strip()]
+        index = NearDuplicateIndex(threshold=args.threshold)
+    else:
+        documents = [dict(parent["metadata"], content=parent["content"]) for parent in parent_store.parents.values()]
+        index = None
+
+    _, report = dedupe_documents(documents, index, args.threshold)
+    print(f"✓ {describe_report(report)}")
+
+
+if __name__ == "__main__":
+    main()
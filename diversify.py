@@ -0,0 +1,72 @@
+import os
+from typing import List, Dict, Any
+import numpy as np
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+MMR_ENABLED = os.getenv("MMR_ENABLED", "true").lower() in ("1", "true", "yes")
+# 1.0 = pure relevance (plain nearest neighbours), 0.0 = pure diversity
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", 0.7))
+# Candidates fetched per requested result before diversifying
+MMR_FETCH_MULTIPLIER = int(os.getenv("MMR_FETCH_MULTIPLIER", 4))
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def mmr_select(query_embedding, candidate_embeddings, k: int, lambda_mult: float = MMR_LAMBDA) -> List[int]:
+    """Indices of `k` candidates chosen by maximal marginal relevance, in selection order
+
+    Each step picks the candidate maximizing
+    lambda * sim(query, c) - (1 - lambda) * max sim(c, already selected).
+    All similarities come from two matrix products up front.
+    """
+    candidates = _normalize(np.asarray(candidate_embeddings, dtype=np.float32))
+    if not len(candidates):
+        return []
+    query = _normalize(np.asarray(query_embedding, dtype=np.float32).ravel())
+    relevance = candidates @ query
+    pairwise = candidates @ candidates.T
+
+    selected = []
+    redundancy = np.zeros(len(candidates), dtype=np.float32)
+    available = np.ones(len(candidates), dtype=bool)
+    for _ in range(min(k, len(candidates))):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, pairwise[best])
+    return selected
+
+
+def diversify_chunks(query_embedding, chunk_docs: List[Dict[str, Any]], embeddings, n_results: int,
+                     lambda_mult: float = MMR_LAMBDA) -> List[Dict[str, Any]]:
+    """Reorder ranked chunk hits so the first `n_results` parents are relevant but not redundant
+
+    Each parent document is represented by its best-ranked chunk. Chunks of
+    the selected parents are returned first (in MMR order, so
+    `expand_to_parents` still sees every matched window); the rest follow.
+    """
+    representatives = {}
+    for i, doc in enumerate(chunk_docs):
+        parent_id = (doc.get("metadata") or {}).get("parent_id") or ("chunk", i)
+        representatives.setdefault(parent_id, i)
+
+    keys = list(representatives)
+    picks = mmr_select(query_embedding, np.asarray(embeddings)[[representatives[key] for key in keys]],
+                       n_results, lambda_mult)
+    chosen = [keys[i] for i in picks]
+    rank = {key: position for position, key in enumerate(chosen)}
+
+    def parent_key(item):
+        i, doc = item
+        return (doc.get("metadata") or {}).get("parent_id") or ("chunk", i)
+
+    ordered = sorted(enumerate(chunk_docs), key=lambda item: rank.get(parent_key(item), len(rank)))
+    return [doc for _, doc in ordered]
@@ -0,0 +1,173 @@
+import os
+import json
+import argparse
+import threading
+from collections import Counter
+from typing import List, Dict, Any, Optional
+from index_config import KNOWLEDGE_DB_PATH
+from store_log import LoggedStore, refuse_if_served
+from fact_store import normalize_date
+
+FACET_FILE = "facets.json"
+FACETS = ["category", "type", "source", "year"]
+
+# Documents harvested before ingestion tagged them with a source
+SOURCE_BY_TYPE = {
+    "archive_show": "archive",
+    "setlist_data": "setlistfm",
+}
+
+
+def facet_values(metadata: Dict[str, Any]) -> Dict[str, str]:
+    """The facet value of each facet for one source document ("unknown" when missing)"""
+    year = metadata.get("year")
+    if not year:
+        date = normalize_date(str(metadata.get("date") or ""))
+        year = date[:4] if date else None
+    return {
+        "category": metadata.get("category") or "unknown",
+        "type": metadata.get("type") or "unknown",
+        "source": metadata.get("source") or SOURCE_BY_TYPE.get(metadata.get("type"), "unknown"),
+        "year": str(year) if year else "unknown",
+    }
+
+
+class FacetCounts(LoggedStore):
+    """Per-facet document counts, updated on every write and delete and persisted next to the store
+
+    Counts are of source documents (parents), not chunks, so a long essay split
+    into twenty windows still counts once. `facets.json` is the compacted
+    base; each write appends its documents' facet values and a sign to the
+    log (see store_log.LoggedStore).
+    """
+
+    label = "facet counts"
+
+    def __init__(self, db_path: Optional[str] = KNOWLEDGE_DB_PATH):
+        # db_path=None keeps the counts in memory only (used for full-scan checks)
+        self._lock = threading.Lock()
+        self._open(os.path.join(db_path, FACET_FILE) if db_path else None)
+
+    def _reset(self):
+        self.documents = 0
+        self.counts = {facet: Counter() for facet in FACETS}
+        # Whether counts were ever stored (otherwise they need a full scan)
+        self.loaded = False
+
+    def _read_base(self, path: str):
+        with open(path) as f:
+            data = json.load(f)
+        self.documents = data["documents"]
+        self.counts = {facet: Counter(data["facets"].get(facet, {})) for facet in FACETS}
+        self.loaded = True
+
+    def _write_base(self, path: str):
+        with open(path, "w") as f:
+            json.dump({"documents": self.documents, "facets": {k: dict(v) for k, v in self.counts.items()}}, f)
+
+    def _apply(self, record: Dict[str, Any]):
+        self._count(record["values"], record["sign"])
+        self.loaded = True
+
+    def _size(self) -> int:
+        return sum(len(values) for values in self.counts.values())
+
+    def _count(self, values: List[Dict[str, str]], sign: int):
+        for document in values:
+            self.documents += sign
+            for facet, value in document.items():
+                self.counts[facet][value] += sign
+                if self.counts[facet][value] <= 0:
+                    del self.counts[facet][value]
+
+    def add(self, metadatas: List[Dict[str, Any]]):
+        """Count newly written documents (callers pass only documents not already stored)"""
+        if not metadatas:
+            return
+        with self._lock:
+            self._commit([{"sign": 1, "values": [facet_values(metadata or {}) for metadata in metadatas]}])
+
+    def remove(self, metadatas: List[Dict[str, Any]]):
+        if not metadatas:
+            return
+        with self._lock:
+            self._commit([{"sign": -1, "values": [facet_values(metadata or {}) for metadata in metadatas]}])
+
+    def replace(self, other: "FacetCounts"):
+        with self._lock:
+            self.documents = other.documents
+            self.counts = {facet: Counter(other.counts[facet]) for facet in FACETS}
+            self.loaded = True
+            self._rewrite()
+
+    def to_dict(self) -> Dict[str, Any]:
+        self.refresh()
+        with self._lock:
+            return {
+                "documents": self.documents,
+                "facets": {facet: dict(self.counts[facet].most_common()) for facet in FACETS},
+            }
+
+
+def scan_facets(collection, batch_size: int = 5000) -> FacetCounts:
+    """Recompute facet counts from scratch by reading every chunk's metadata (not persisted)"""
+    counts = FacetCounts(db_path=None)
+
+    seen = set()
+    parents = []
+    for offset in range(0, collection.count(), batch_size):
+        batch = collection.get(limit=batch_size, offset=offset, include=["metadatas"])
+        for doc_id, metadata in zip(batch["ids"], batch["metadatas"]):
+            metadata = metadata or {}
+            # Every chunk carries its parent's metadata; count each parent once
+            parent_id = metadata.get("parent_id", doc_id)
+            if parent_id not in seen:
+                seen.add(parent_id)
+                parents.append(metadata)
+    counts._count([facet_values(metadata) for metadata in parents], 1)
+    return counts
+
+
+def diff_counts(stored: FacetCounts, actual: FacetCounts) -> List[str]:
+    """Human-readable differences between two sets of counts"""
+    problems = []
+    if stored.documents != actual.documents:
+        problems.append(f"documents: stored {stored.documents}, actual {actual.documents}")
+    for facet in FACETS:
+        for value in sorted(set(stored.counts[facet]) | set(actual.counts[facet])):
+            if stored.counts[facet][value] != actual.counts[facet][value]:
+                problems.append(f"{facet}={value}: stored {stored.counts[facet][value]}, "
+                                f"actual {actual.counts[facet][value]}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the incrementally maintained facet counts against a full scan")
+    parser.add_argument("--fix", action="store_true", help="Overwrite the stored counts with the recomputed ones")
+    args = parser.parse_args()
+
+    from vector_store import create_vector_store
+
+    collection = create_vector_store(read_only=True)
+    stored = FacetCounts()
+    print(f"🔍 Scanning {collection.count()} chunks...")
+    actual = scan_facets(collection)
+
+    problems = diff_counts(stored, actual)
+    if not problems:
+        print(f"✓ Facet counts are consistent ({actual.documents} documents)")
+        return
+
+    print(f"❌ {len(problems)} facet counts differ:")
+    for problem in problems[:50]:
+        print(f"  {problem}")
+    if args.fix:
+        refuse_if_served()
+        stored.replace(actual)
+        print("✓ Stored counts replaced with the full-scan counts")
+    else:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
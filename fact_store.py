@@ -0,0 +1,382 @@
+import os
+import re
+import json
+import threading
+from collections import Counter, defaultdict
+from typing import List, Dict, Any, Optional, Tuple
+from index_config import KNOWLEDGE_DB_PATH
+from store_log import LoggedStore
+
+FACT_STORE_FILE = "facts.json"
+
+MONTHS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "sept": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+
+RELEASE_QUESTION = re.compile(r"\b(what year|when|which year)\b.*\b(release[sd]?|come out|came out|drop(ped)?)\b")
+VENUE_QUESTION = re.compile(r"\b(where|what venue|which venue|venue)\b")
+ARCHIVE_QUESTION = re.compile(r"\b(archive(\.org)?( id| identifier)?|identifier|tape id)\b")
+WHEN_PLAYED_QUESTION = re.compile(r"\b(when|what dates?|which dates?|how many times)\b.*\b(play(ed)?|shows?|perform(ed)?)\b")
+# Pronouns mean the question leans on the conversation, which the fast path can't see
+CONTEXT_REFERENCE = re.compile(r"\b(that|this|those|it|they played there|same)\s+(show|album|night|gig|one|venue)\b")
+# What was played (rather than where or when) needs the setlist documents, not show facts
+SETLIST_QUESTION = re.compile(
+    r"\b(songs?|setlists?|set list|sets?|encores?|opene[dr]|closer|closed|tunes?|jams?|segues?|which (?!venue\b)\w+)\b"
+)
+PLAYED_OBJECT = re.compile(r"\b(?:play(?:ed)?|perform(?:ed)?)\s+([a-z0-9']+)")
+# Time qualifiers parse_question_range doesn't understand; answering without them would be wrong
+RELATIVE_TIME = re.compile(
+    r"\b(before|after|until|till|since|prior|earlier|later|first|last|early|late|mid|decade|"
+    r"\d0'?s|sixties|seventies|eighties|nineties)\b"
+)
+SEASONS = {
+    "winter": (101, 320), "spring": (321, 620), "summer": (621, 922), "fall": (923, 1220), "autumn": (923, 1220),
+}
+YEAR_RANGE = re.compile(r"\b(?:between|from)\s+'?(\d{2}|\d{4})\s+(?:and|to|-)\s+'?(\d{2}|\d{4})\b")
+SEASON_YEAR = re.compile(r"\b(winter|spring|summer|fall|autumn)\s+(?:of\s+)?'?(\d{2}|\d{4})\b")
+SINGLE_YEAR = re.compile(r"(?:\bin|\bduring|\bof|')\s*'?(\d{4}|\d{2})\b|\b(19[6-9]\d)\b")
+
+
+def normalize_date(value: str) -> Optional[str]:
+    """YYYY-MM-DD from archive.org ('1977-05-08T00:00:00Z') or setlist.fm ('08-05-1977') dates"""
+    if not value:
+        return None
+    match = re.match(r"(\d{4})-(\d{2})-(\d{2})", value)
+    if match:
+        return "-".join(match.groups())
+    match = re.match(r"(\d{2})-(\d{2})-(\d{4})", value)
+    if match:
+        day, month, year = match.groups()
+        return f"{year}-{month}-{day}"
+    return None
+
+
+def _full_year(year: str) -> int:
+    year = int(year)
+    return year + 1900 if year < 100 else year
+
+
+def parse_question_date(question: str) -> Optional[str]:
+    """Find one explicit date in a question, e.g. 1977-05-08, 5/8/77, May 8, 1977 or 8 May 1977"""
+    text = question.lower()
+
+    match = re.search(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b", text)
+    if match:
+        year, month, day = (int(g) for g in match.groups())
+        return f"{year:04d}-{month:02d}-{day:02d}"
+
+    match = re.search(r"\b(\d{1,2})/(\d{1,2})/(\d{2}|\d{4})\b", text)
+    if match:
+        month, day, year = match.groups()
+        return f"{_full_year(year):04d}-{int(month):02d}-{int(day):02d}"
+
+    month_names = "|".join(sorted(MONTHS, key=len, reverse=True))
+    match = re.search(rf"\b({month_names})[a-z]*\.?\s+(\d{{1,2}})(?:st|nd|rd|th)?,?\s+'?(\d{{2}}|\d{{4}})\b", text)
+    if match:
+        month, day, year = match.groups()
+        return f"{_full_year(year):04d}-{MONTHS[month]:02d}-{int(day):02d}"
+
+    match = re.search(rf"\b(\d{{1,2}})(?:st|nd|rd|th)?\s+({month_names})[a-z]*\.?,?\s+'?(\d{{2}}|\d{{4}})\b", text)
+    if match:
+        day, month, year = match.groups()
+        return f"{_full_year(year):04d}-{MONTHS[month]:02d}-{int(day):02d}"
+
+    return None
+
+
+def int_to_date(value: int) -> str:
+    value = int(value)
+    return f"{value // 10000:04d}-{value // 100 % 100:02d}-{value % 100:02d}"
+
+
+def parse_question_range(question: str) -> Optional[Tuple[int, int]]:
+    """Inclusive yyyymmdd bounds for 'between 1972 and 1974', "spring '77" or 'in 1972'"""
+    text = question.lower()
+
+    match = YEAR_RANGE.search(text)
+    if match:
+        first, last = sorted(_full_year(y) for y in match.groups())
+        return first * 10000 + 101, last * 10000 + 1231
+
+    match = SEASON_YEAR.search(text)
+    if match:
+        season, year = match.groups()
+        year = _full_year(year)
+        start, end = SEASONS[season]
+        if season == "winter":
+            # Winter straddles New Year's: Dec of the year before through March
+            return (year - 1) * 10000 + 1221, year * 10000 + end
+        return year * 10000 + start, year * 10000 + end
+
+    match = SINGLE_YEAR.search(text)
+    if match:
+        year = _full_year(match.group(1) or match.group(2))
+        if 1965 <= year <= 1995:
+            return year * 10000 + 101, year * 10000 + 1231
+
+    return None
+
+
+def _normalize_name(name: str) -> str:
+    return re.sub(r"[^a-z0-9 ]+", "", (name or "").lower()).strip()
+
+
+class _NameIndex:
+    """Normalized names keyed by their words, so finding one in a question costs a lookup per run of its words"""
+
+    def __init__(self):
+        self.names = {}
+        self.max_words = 0
+
+    def add(self, name: str):
+        words = tuple(name.split())
+        if words:
+            self.names.setdefault(words, name)
+            self.max_words = max(self.max_words, len(words))
+
+    def find(self, question: str) -> List[str]:
+        """Every indexed name that appears in the question as whole words"""
+        words = _normalize_name(question).split()
+        found = []
+        for start in range(len(words)):
+            for length in range(1, min(self.max_words, len(words) - start) + 1):
+                name = self.names.get(tuple(words[start:start + length]))
+                if name is not None:
+                    found.append(name)
+        return found
+
+
+class FactStore(LoggedStore):
+    """Structured album and show facts with hash indexes, for answering lookups without the LLM
+
+    `facts.json` is the compacted base; facts added and removed since are
+    appended to its log (see store_log.LoggedStore).
+    """
+
+    label = "fact store"
+
+    def __init__(self, db_path: str = KNOWLEDGE_DB_PATH):
+        self._lock = threading.Lock()
+        self.stats = {"questions": 0, "fast_path_hits": 0}
+        self._open(os.path.join(db_path, FACT_STORE_FILE))
+
+    def _reset(self):
+        self.facts = []
+        # Documents carrying each fact; a fact goes when the last of them is deleted
+        self._refs = Counter()
+        self._reset_indexes()
+
+    def _read_base(self, path: str):
+        with open(path) as f:
+            for fact in json.load(f):
+                # Files written before counts were kept have one document per fact
+                count = fact.pop("documents", 1)
+                self._index(fact, count)
+
+    def _write_base(self, path: str):
+        with open(path, "w") as f:
+            json.dump([dict(fact, documents=self._refs[self._key(fact)]) for fact in self.facts], f)
+
+    def _apply(self, record: Dict[str, Any]):
+        for fact in record.get("add", []):
+            self._index(fact)
+        if record.get("remove"):
+            self._unindex(record["remove"])
+
+    def _size(self) -> int:
+        return len(self.facts)
+
+    def _reset_indexes(self):
+        self.by_date = defaultdict(list)
+        self.by_album = {}
+        self.by_venue = defaultdict(list)
+        self.by_archive_id = {}
+        self.album_names = _NameIndex()
+        self.venue_names = _NameIndex()
+
+    @staticmethod
+    def extract_fact(metadata: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Pull a structured fact out of a document's metadata"""
+        if metadata.get("album") and metadata.get("year") and metadata.get("category") == "albums":
+            return {"kind": "album", "album": metadata["album"], "year": str(metadata["year"])}
+
+        date = normalize_date(metadata.get("date", ""))
+        if metadata.get("category") == "shows" and date:
+            venue = metadata.get("venue")
+            return {
+                "kind": "show",
+                "date": date,
+                "venue": venue if venue and venue != "Unknown Venue" else None,
+                "city": metadata.get("city") or None,
+                "archive_id": metadata.get("archive_id") or None,
+            }
+        return None
+
+    @staticmethod
+    def _key(fact: Dict[str, Any]) -> str:
+        return json.dumps(fact, sort_keys=True)
+
+    def _index(self, fact: Dict[str, Any], count: int = 1):
+        key = self._key(fact)
+        self._refs[key] += count
+        if self._refs[key] > count:
+            return
+        self.facts.append(fact)
+        self._index_lookups(fact)
+
+    def _index_lookups(self, fact: Dict[str, Any]):
+        if fact["kind"] == "album":
+            name = _normalize_name(fact["album"])
+            self.by_album.setdefault(name, fact)
+            self.album_names.add(name)
+        else:
+            self.by_date[fact["date"]].append(fact)
+            if fact.get("venue"):
+                name = _normalize_name(fact["venue"])
+                self.by_venue[name].append(fact)
+                self.venue_names.add(name)
+            if fact.get("archive_id"):
+                self.by_archive_id[fact["archive_id"]] = fact
+
+    def _unindex(self, facts: List[Dict[str, Any]]):
+        removed = False
+        for fact in facts:
+            key = self._key(fact)
+            if key not in self._refs:
+                continue
+            self._refs[key] -= 1
+            if self._refs[key] <= 0:
+                del self._refs[key]
+                removed = True
+        if removed:
+            self.facts = [fact for fact in self.facts if self._key(fact) in self._refs]
+            self._reset_indexes()
+            for fact in self.facts:
+                self._index_lookups(fact)
+
+    def add_documents(self, documents: List[Dict[str, Any]]):
+        """Index the facts carried by newly ingested documents (callers pass only documents not already stored)"""
+        facts = [fact for fact in map(self.extract_fact, documents) if fact]
+        if facts:
+            with self._lock:
+                self._commit([{"add": facts}])
+
+    def remove_documents(self, documents: List[Dict[str, Any]]):
+        """Forget the facts of deleted documents, unless another document still carries them"""
+        facts = [fact for fact in map(self.extract_fact, documents) if fact]
+        if facts:
+            with self._lock:
+                self._commit([{"remove": facts}])
+
+    def rebuild(self, collection, batch_size: int = 5000):
+        """Rebuild from the metadata already in a vector store"""
+        with self._lock:
+            self._reset()
+            seen = set()
+            for offset in range(0, collection.count(), batch_size):
+                batch = collection.get(limit=batch_size, offset=offset, include=["metadatas"])
+                for doc_id, metadata in zip(batch["ids"], batch["metadatas"]):
+                    metadata = metadata or {}
+                    # Every chunk carries its parent's metadata; count each parent once
+                    parent_id = metadata.get("parent_id", doc_id)
+                    if parent_id in seen:
+                        continue
+                    seen.add(parent_id)
+                    fact = self.extract_fact(metadata)
+                    if fact:
+                        self._index(fact)
+            self._rewrite()
+
+    @staticmethod
+    def _match_name(question: str, names: _NameIndex) -> Optional[str]:
+        """Longest indexed name that appears in the question, if exactly one is that long"""
+        matches = {name for name in names.find(question) if len(name) > 3}
+        if not matches:
+            return None
+        longest = max(len(name) for name in matches)
+        best = [name for name in matches if len(name) == longest]
+        return best[0] if len(best) == 1 else None
+
+    @staticmethod
+    def _describe_show(fact: Dict[str, Any]) -> str:
+        place = fact.get("venue") or "an unknown venue"
+        if fact.get("city"):
+            place += f" in {fact['city']}"
+        return place
+
+    @staticmethod
+    def _describe_range(start: int, end: int) -> str:
+        """'in 1977', 'from 1972 to 1974' or 'between 1977-03-21 and 1977-06-20' for yyyymmdd bounds"""
+        if start % 10000 == 101 and end % 10000 == 1231:
+            first, last = start // 10000, end // 10000
+            return f"in {first}" if first == last else f"from {first} to {last}"
+        return f"between {int_to_date(start)} and {int_to_date(end)}"
+
+    def _lookup(self, question: str) -> Optional[str]:
+        text = question.lower()
+        if CONTEXT_REFERENCE.search(text):
+            return None
+
+        if RELEASE_QUESTION.search(text):
+            album = self._match_name(question, self.album_names)
+            if album:
+                fact = self.by_album[album]
+                return f"{fact['album']} came out in {fact['year']}."
+
+        # Show facts know where and when, not what was played
+        if SETLIST_QUESTION.search(text):
+            return None
+
+        date = parse_question_date(question)
+        if date and date in self.by_date:
+            shows = self.by_date[date]
+            if ARCHIVE_QUESTION.search(text):
+                ids = sorted({s["archive_id"] for s in shows if s.get("archive_id")})
+                if ids:
+                    return f"The {date} show is on Archive.org as: {', '.join(ids)}."
+            elif VENUE_QUESTION.search(text):
+                places = sorted({self._describe_show(s) for s in shows if s.get("venue")})
+                if len(places) == 1:
+                    return f"On {date} the Dead played {places[0]}."
+
+        if WHEN_PLAYED_QUESTION.search(text) and not date and not RELATIVE_TIME.search(text):
+            venue = self._match_name(question, self.venue_names)
+            played = PLAYED_OBJECT.search(_normalize_name(question))
+            if played and venue and played.group(1) not in ("at", "in", "the", venue.split()[0]):
+                # "play Dark Star at Winterland" asks about a song
+                venue = None
+            if venue:
+                shows = self.by_venue[venue]
+                dates = sorted({s["date"] for s in shows})
+                name = shows[0]["venue"]
+                bounds = parse_question_range(question)
+                if bounds:
+                    start, end = (int_to_date(b) for b in bounds)
+                    dates = [d for d in dates if start <= d <= end]
+                    if not dates:
+                        # Missing shows may just be missing data; let retrieval have a go
+                        return None
+                    name += f" {self._describe_range(*bounds)}"
+                if len(dates) == 1:
+                    return f"I have one show at {name} on record: {dates[0]}."
+                return f"I have {len(dates)} shows at {name} on record: {', '.join(dates)}."
+
+        return None
+
+    def answer(self, question: str) -> Optional[str]:
+        """Answer a high-confidence lookup question, or None to fall back to RAG"""
+        self.refresh()
+        answer = self._lookup(question)
+        with self._lock:
+            self.stats["questions"] += 1
+            if answer:
+                self.stats["fast_path_hits"] += 1
+        return answer
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+        stats["hit_rate"] = round(stats["fast_path_hits"] / stats["questions"], 4) if stats["questions"] else 0.0
+        stats["facts"] = len(self.facts)
+        return stats
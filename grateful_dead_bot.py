@@ -1,6 +1,7 @@
 import os
 import json
 import pickle
+import argparse
 from typing import List, Dict, Any
 import requests
 from sentence_transformers import SentenceTransformer
@@ -12,6 +13,19 @@ import re
 from dotenv import load_dotenv
 from bs4 import BeautifulSoup
 import time
+from index_config import EMBEDDING_MODEL_NAME
+from vector_store import create_vector_store
+from chunking import chunk_documents, ParentDocumentStore
+from store_log import hold_server_lock
+from llm_client import ResilientLLMClient, LLMUnavailableError, extractive_answer
+from fact_store import FactStore
+from show_catalog import ShowCatalog
+from facet_stats import FacetCounts, scan_facets
+from knowledge_search import search_batch
+from prompts import build_messages
+from dedup import DEDUP_ENABLED, NearDuplicateIndex, dedupe_documents, describe_report
+from staging import stage_fetched, retry_from_staging_hint
+from batch_answer import BATCH_CONCURRENCY, BATCH_RETRIEVAL_SIZE, BatchAnswerer, print_summary
 
 # Load environment variables
 load_dotenv()
@@ -24,13 +38,14 @@ class GratefulDeadChatbot:
         if not openai_api_key:
             raise ValueError("OpenAI API key is required!")
         
-        self.openai_client = openai.OpenAI(api_key=openai_api_key)
+        self.llm = ResilientLLMClient(openai_api_key)
+        self.openai_client = self.llm.client
         print("✓ OpenAI client initialized")
         
         # Initialize embedding model
         print("📥 Loading embedding model (this may take a few minutes on first run)...")
         try:
-            self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+            self.embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
             print("✓ Embedding model loaded successfully")
         except Exception as e:
             print(f"❌ Error loading embedding model: {e}")
@@ -39,11 +54,22 @@ class GratefulDeadChatbot:
         # Initialize vector database
         print("🗄️ Initializing vector database...")
         try:
-            self.chroma_client = chromadb.PersistentClient(path="./dead_knowledge_db")
-            self.collection = self.chroma_client.get_or_create_collection(
-                name="grateful_dead_knowledge",
-                metadata={"description": "Grateful Dead knowledge base"}
-            )
+            # CLI writers refuse to run while this is held (see store_log.refuse_if_served)
+            self.server_lock = hold_server_lock()
+            self.collection = create_vector_store()
+            self.parent_store = ParentDocumentStore()
+            self.fact_store = FactStore()
+            if not self.fact_store.facts and self.collection.count():
+                self.fact_store.rebuild(self.collection)
+            self.show_catalog = ShowCatalog()
+            if not len(self.show_catalog) and self.collection.count():
+                self.show_catalog.rebuild(self.collection)
+            self.facets = FacetCounts()
+            if not self.facets.loaded and self.collection.count():
+                self.facets.replace(scan_facets(self.collection))
+            self.dedup_index = NearDuplicateIndex()
+            if not len(self.dedup_index) and self.parent_store.parents:
+                self.dedup_index.add([{'id': pid, **p} for pid, p in self.parent_store.parents.items()])
             print("✓ Vector database initialized")
         except Exception as e:
             print(f"❌ Error initializing database: {e}")
@@ -61,17 +87,21 @@ class GratefulDeadChatbot:
         """Add documents to the vector database"""
         print(f"📚 Adding {len(documents)} documents to knowledge base...")
         
+        if DEDUP_ENABLED:
+            # Collapse reworded facts and alternate tapes of the same show before embedding
+            documents, report = dedupe_documents(documents, self.dedup_index)
+            print(f"🧹 Deduplicated: {describe_report(report)}")
+        
         texts = []
         metadatas = []
         ids = []
         
-        for i, doc in enumerate(documents):
-            text = doc['content']
-            metadata = {k: v for k, v in doc.items() if k != 'content'}
-            
-            texts.append(text)
-            metadatas.append(metadata)
-            ids.append(f"doc_{i}_{hash(text) % 100000}")
+        # Embed overlapping sentence windows; keep the full text as the parent
+        parents, chunks = chunk_documents(documents)
+        for chunk in chunks:
+            texts.append(chunk['content'])
+            metadatas.append({k: v for k, v in chunk.items() if k not in ('content', 'id')})
+            ids.append(chunk['id'])
         
         try:
             # Generate embeddings
@@ -81,77 +111,70 @@ class GratefulDeadChatbot:
             
             # Add to ChromaDB
             print("💾 Adding to database...")
+            new_parents = [parent for parent in parents if self.parent_store.get(parent['id']) is None]
             self.collection.add(
                 documents=texts,
                 metadatas=metadatas,
                 embeddings=embeddings,
                 ids=ids
             )
+            self.parent_store.add(parents)
+            self.fact_store.add_documents([parent['metadata'] for parent in new_parents])
+            self.show_catalog.add_documents([parent['metadata'] for parent in new_parents])
+            self.facets.add([parent['metadata'] for parent in new_parents])
+            self.dedup_index.add(new_parents)
             print("✓ Documents added to knowledge base!")
             
         except Exception as e:
             print(f"❌ Error adding documents: {e}")
             raise
     
+    def count_shows(self, start: str = None, end: str = None) -> int:
+        """Number of shows between two dates, inclusive (e.g. '1972-01-01', '1972-12-31')"""
+        return self.show_catalog.count_shows(start, end)
+    
+    def shows_between(self, start: str = None, end: str = None, limit: int = None) -> List[Dict]:
+        """Shows between two dates, oldest first"""
+        return self.show_catalog.shows_between(start, end, limit)
+    
+    def shows_at_venue(self, venue: str, start: str = None, end: str = None) -> List[Dict]:
+        """Every show at venues matching `venue` (e.g. 'Winterland'), optionally within dates"""
+        return self.show_catalog.shows_at_venue(venue, start, end)
+    
     def search_knowledge(self, query: str, n_results: int = 5) -> List[Dict]:
         """Search the knowledge base for relevant information"""
+        return self.search_knowledge_batch([query], n_results)[0]
+    
+    def search_knowledge_batch(self, queries: List[str], n_results: int = 5) -> List[List[Dict]]:
+        """Search for many queries with one encoding pass and one multi-query lookup"""
         try:
-            query_embedding = self.embedding_model.encode([query]).tolist()
-            
-            results = self.collection.query(
-                query_embeddings=query_embedding,
-                n_results=n_results
-            )
-            
-            relevant_docs = []
-            for i in range(len(results['documents'][0])):
-                relevant_docs.append({
-                    'content': results['documents'][0][i],
-                    'metadata': results['metadatas'][0][i],
-                    'distance': results['distances'][0][i]
-                })
-            
-            return relevant_docs
+            return search_batch(self.collection, self.parent_store, self.embedding_model, queries, n_results)
         except Exception as e:
             print(f"❌ Error searching knowledge base: {e}")
-            return []
+            return [[] for _ in queries]
+    
+    def add_catalog_context(self, user_input: str, docs: List[Dict]) -> List[Dict]:
+        """Counting/listing questions get exact aggregates from the show catalog"""
+        catalog_summary = self.show_catalog.describe_for_question(user_input)
+        if catalog_summary:
+            return [{'content': catalog_summary, 'metadata': {'source': 'show_catalog'}}] + docs
+        return docs
     
     def generate_response(self, user_query: str, context_docs: List[Dict]) -> str:
         """Generate response using OpenAI with retrieved context"""
-        
-        # Build context from retrieved documents
-        context = "\n\n".join([doc['content'] for doc in context_docs])
-        
-        system_prompt = """You are the ultimate Grateful Dead expert and enthusiast! You have deep knowledge about:
-        - All Grateful Dead songs, albums, and performances
-        - Band members past and present (Jerry Garcia, Bob Weir, Phil Lesh, etc.)
-        - Tour history, venues, and memorable shows
-        - The Dead community and culture
-        - Related bands and solo projects
-        
-        Use the provided context to answer questions accurately. If you're not sure about something, say so.
-        Keep the vibe conversational and friendly - like talking to a fellow Deadhead.
-        Use Grateful Dead terminology and references naturally when appropriate.
-        
-        Context information:
-        {context}
-        """
-        
-        user_prompt = f"Question: {user_query}"
-        
         try:
-            response = self.openai_client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": system_prompt.format(context=context)},
-                    {"role": "user", "content": user_prompt}
-                ],
+            # Static instructions first, then context: keeps the prompt prefix cacheable
+            response = self.llm.complete(
+                messages=build_messages(user_query, context_docs),
                 max_tokens=500,
                 temperature=0.7
             )
             
             return response.choices[0].message.content
             
+        except LLMUnavailableError:
+            # Upstream is down or too slow - answer from the retrieved docs instead
+            return extractive_answer(user_query, context_docs)
         except Exception as e:
             return f"Sorry, I'm having trouble connecting to OpenAI right now. Error: {str(e)}"
     
@@ -160,8 +183,13 @@ class GratefulDeadChatbot:
         if not user_input.strip():
             return "What would you like to know about the Grateful Dead?"
         
+        # Pure lookups (release years, venues, archive ids) skip retrieval and the LLM
+        fast_answer = self.fact_store.answer(user_input)
+        if fast_answer:
+            return fast_answer
+        
         # Search for relevant context
-        relevant_docs = self.search_knowledge(user_input)
+        relevant_docs = self.add_catalog_context(user_input, self.search_knowledge(user_input))
         
         # Generate response
         response = self.generate_response(user_input, relevant_docs)
@@ -196,7 +224,7 @@ class GratefulDeadChatbot:
                 albums.append(album_doc)
             
             print(f"✓ Fetched {len(albums)} albums from MusicBrainz")
-            return albums
+            return stage_fetched('musicbrainz', albums, url=releases_url)
             
         except Exception as e:
             print(f"❌ Error fetching MusicBrainz data: {e}")
@@ -226,6 +254,7 @@ class GratefulDeadChatbot:
                 title = doc.get('title', '')
                 date = doc.get('date', '')
                 description = doc.get('description', [''])[0] if doc.get('description') else ''
+                description = BeautifulSoup(description, 'html.parser').get_text(' ', strip=True)
                 identifier = doc.get('identifier', '')
                 
                 # Extract venue info from title if possible
@@ -236,7 +265,7 @@ class GratefulDeadChatbot:
                 if venue != 'Unknown Venue':
                     content += f" at {venue}"
                 if description:
-                    content += f". {description[:150]}"  # First 150 chars
+                    content += f". {description}"  # Full notes; long ones are chunked at ingestion
                 content += f" Available on Archive.org as {identifier}"
                 
                 show_doc = {
@@ -250,7 +279,7 @@ class GratefulDeadChatbot:
                 shows.append(show_doc)
             
             print(f"✓ Scraped {len(shows)} shows from Archive.org")
-            return shows
+            return stage_fetched('archive', shows, url=url, query=params['q'])
             
         except Exception as e:
             print(f"❌ Error scraping Archive.org: {e}")
@@ -298,7 +327,8 @@ class GratefulDeadChatbot:
         
         if all_web_docs:
             print(f"📚 Adding {len(all_web_docs)} web documents to knowledge base...")
-            self.add_knowledge_to_db(all_web_docs)
+            with retry_from_staging_hint():
+                self.add_knowledge_to_db(all_web_docs)
             return len(all_web_docs)
         else:
             print("❌ No web data could be fetched")
@@ -345,6 +375,17 @@ def create_sample_knowledge_base():
     return sample_docs
 
 def main():
+    parser = argparse.ArgumentParser(description="Grateful Dead chatbot (interactive unless --batch is given)")
+    parser.add_argument("--batch", metavar="INPUT",
+                        help="Answer questions from a JSONL file ('-' for stdin) instead of chatting")
+    parser.add_argument("--output", default="answers.jsonl", help="JSONL file answers are appended to")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="Concurrent LLM calls")
+    parser.add_argument("--batch-size", type=int, default=BATCH_RETRIEVAL_SIZE,
+                        help="Questions embedded and searched per retrieval pass")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="Overwrite --output instead of skipping questions already answered in it")
+    args = parser.parse_args()
+    
     print("🌹💀🌹 Starting Grateful Dead Chatbot Setup 🌹💀🌹\n")
     
     # Check for API key
@@ -373,6 +414,12 @@ def main():
             sample_docs = create_sample_knowledge_base()
             chatbot.add_knowledge_to_db(sample_docs)
         
+        if args.batch:
+            print(f"\n📝 Answering questions from {'stdin' if args.batch == '-' else args.batch} -> {args.output}")
+            answerer = BatchAnswerer(chatbot, args.concurrency, args.batch_size)
+            print_summary(answerer.run(args.batch, args.output, resume=not args.no_resume))
+            return
+        
         # Ask user if they want to load web data
         print("\n🌐 Would you like to enhance with web data? (y/n)")
         load_web = input().strip().lower()
@@ -394,6 +441,8 @@ def main():
                 user_input = input("You: ").strip()
                 
                 if user_input.lower() in ['quit', 'exit', 'bye']:
+                    stats = chatbot.fact_store.get_stats()
+                    print(f"⚡ Answered {stats['fast_path_hits']}/{stats['questions']} questions from the fact store")
                     print("Thanks for chatting! Keep on truckin'! ⚡")
                     break
                 
@@ -0,0 +1,127 @@
+import os
+import json
+import time
+import argparse
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+from dotenv import load_dotenv
+from index_config import KNOWLEDGE_DB_PATH
+
+# Load environment variables
+load_dotenv()
+
+WATERMARK_FILE = "watermarks.json"
+ARCHIVE_COLLECTION = "GratefulDead"
+# addeddate catches new uploads; publicdate also catches items that were made public later
+WATERMARK_FIELDS = ["addeddate", "publicdate"]
+
+
+class WatermarkStore:
+    """High-water marks per archive.org collection and date field, persisted next to the vector store"""
+
+    def __init__(self, db_path: str = KNOWLEDGE_DB_PATH):
+        self.path = os.path.join(db_path, WATERMARK_FILE)
+        self._lock = threading.Lock()
+        self.marks = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path) as f:
+                    self.marks = json.load(f)
+            except Exception as e:
+                print(f"⚠️ Could not read watermarks: {e}")
+
+    @staticmethod
+    def key(collection: str, field: str) -> str:
+        return f"{collection}:{field}"
+
+    def get(self, collection: str, field: str) -> Optional[str]:
+        mark = self.marks.get(self.key(collection, field))
+        return mark["value"] if mark else None
+
+    def advance(self, collection: str, field: str, value: Optional[str]):
+        """Move a mark forward (never backwards) and persist it"""
+        if not value:
+            return
+        with self._lock:
+            key = self.key(collection, field)
+            current = self.marks.get(key, {}).get("value")
+            if current and current >= value:
+                return
+            self.marks[key] = {"value": value, "updated_at": time.time()}
+            self._save()
+
+    def reset(self, collection: str, field: str):
+        with self._lock:
+            self.marks.pop(self.key(collection, field), None)
+            self._save()
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.marks, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+def fetch_new_archive_shows(db_path: str = KNOWLEDGE_DB_PATH, field: str = "addeddate",
+                            collection: str = ARCHIVE_COLLECTION) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """Archive.org shows added since the stored watermark that aren't in the knowledge base yet
+
+    Returns the documents and the watermark to commit once they are written.
+    The range query starts at the day of the old mark, so items at (or just
+    before) it come back and are dropped here by their content-hash parent id.
+    """
+    from dead_data_scraper import GratefulDeadDataScraper
+    from chunking import ParentDocumentStore, parent_id_for
+
+    since = WatermarkStore(db_path).get(collection, field)
+    shows, newest = GratefulDeadDataScraper().scrape_archive_since(since, field, collection)
+
+    known = ParentDocumentStore(db_path).parents
+    new_shows = [show for show in shows if parent_id_for(show["content"]) not in known]
+    watermark = {"collection": collection, "field": field, "since": since, "value": newest}
+    return new_shows, watermark
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest only archive.org shows added since the last refresh")
+    parser.add_argument("--field", choices=WATERMARK_FIELDS, default="addeddate", help="Date field the watermark tracks")
+    parser.add_argument("--collection", default=ARCHIVE_COLLECTION)
+    parser.add_argument("--dry-run", action="store_true", help="Report new shows without ingesting or moving the watermark")
+    parser.add_argument("--reset", action="store_true", help="Forget the watermark first (next run is a full harvest)")
+    args = parser.parse_args()
+
+    watermarks = WatermarkStore()
+    if args.reset:
+        watermarks.reset(args.collection, args.field)
+
+    start = time.perf_counter()
+    shows, watermark = fetch_new_archive_shows(field=args.field, collection=args.collection)
+    print(f"✓ {len(shows)} shows not yet in the knowledge base "
+          f"({args.field} >= {watermark['since'] or 'the beginning'})")
+
+    if args.dry_run:
+        for show in shows[:20]:
+            print(f"  {show.get('date', '')} {show.get('venue', '')} ({show.get('archive_id', '')})")
+        return
+
+    if shows:
+        from bulk_embed import BulkEmbedder, bulk_ingest, open_local_writer
+
+        write_chunks, dedup_index = open_local_writer()
+        # A refresh is usually a handful of tapes; one embedding process is plenty
+        embedder = BulkEmbedder(workers=1)
+        try:
+            report = bulk_ingest(shows, write_chunks, embedder, dedup_index=dedup_index)
+        finally:
+            embedder.close()
+        print(f"✓ Wrote {report['chunks']} chunks from {report['documents']} shows")
+
+    # Only now that everything is written is it safe to move the mark
+    watermarks.advance(args.collection, args.field, watermark["value"])
+    print(f"✓ Watermark {args.collection}:{args.field} = {watermark['value']} "
+          f"({time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
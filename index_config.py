@@ -0,0 +1,311 @@
+import os
+import json
+import time
+import random
+import argparse
+from typing import List, Dict, Any, Optional
+from itertools import product
+import numpy as np
+import chromadb
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+KNOWLEDGE_DB_PATH = os.getenv("KNOWLEDGE_DB_PATH", "./dead_knowledge_db")
+COLLECTION_NAME = "grateful_dead_knowledge"
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+TUNED_CONFIG_FILE = "hnsw_config.json"
+
+# Chroma's own defaults, spelled out so they show up in one place
+DEFAULT_HNSW_CONFIG = {
+    "hnsw:space": "l2",
+    "hnsw:M": 16,
+    "hnsw:construction_ef": 100,
+    "hnsw:search_ef": 10,
+    "hnsw:batch_size": 100,
+    "hnsw:sync_threshold": 1000,
+}
+
+# Environment variable for each HNSW setting
+HNSW_ENV_VARS = {
+    "hnsw:space": "HNSW_SPACE",
+    "hnsw:M": "HNSW_M",
+    "hnsw:construction_ef": "HNSW_CONSTRUCTION_EF",
+    "hnsw:search_ef": "HNSW_SEARCH_EF",
+    "hnsw:batch_size": "HNSW_BATCH_SIZE",
+    "hnsw:sync_threshold": "HNSW_SYNC_THRESHOLD",
+}
+
+
+def load_tuned_config(db_path: str = KNOWLEDGE_DB_PATH) -> Dict[str, Any]:
+    """Load HNSW settings written by a previous `--apply` tuning run"""
+    path = os.path.join(db_path, TUNED_CONFIG_FILE)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"⚠️ Could not read tuned HNSW config: {e}")
+        return {}
+
+
+def get_hnsw_config(db_path: str = KNOWLEDGE_DB_PATH) -> Dict[str, Any]:
+    """HNSW settings: defaults, then tuned values, then environment overrides"""
+    config = dict(DEFAULT_HNSW_CONFIG)
+    config.update(load_tuned_config(db_path))
+
+    for key, env_var in HNSW_ENV_VARS.items():
+        value = os.getenv(env_var)
+        if value:
+            config[key] = value if key == "hnsw:space" else int(value)
+
+    return config
+
+
+def collection_metadata(hnsw_config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Metadata for creating the knowledge collection"""
+    metadata = {"description": "Grateful Dead knowledge base"}
+    metadata.update(hnsw_config or get_hnsw_config())
+    return metadata
+
+
+# TUNING
+
+def read_collection(collection, batch_size: int = 5000) -> Dict[str, Any]:
+    """Read every id, document, metadata and embedding out of a collection"""
+    ids, documents, metadatas, embeddings = [], [], [], []
+    total = collection.count()
+
+    for offset in range(0, total, batch_size):
+        batch = collection.get(
+            limit=batch_size,
+            offset=offset,
+            include=["documents", "metadatas", "embeddings"]
+        )
+        ids.extend(batch["ids"])
+        documents.extend(batch["documents"])
+        metadatas.extend(batch["metadatas"])
+        embeddings.extend(batch["embeddings"])
+
+    return {
+        "ids": ids,
+        "documents": documents,
+        "metadatas": metadatas,
+        "embeddings": np.asarray(embeddings, dtype=np.float32),
+    }
+
+
+def write_collection(collection, data: Dict[str, Any], batch_size: int = 5000):
+    """Add pre-embedded data to a collection in large batches"""
+    for start in range(0, len(data["ids"]), batch_size):
+        end = start + batch_size
+        collection.add(
+            ids=data["ids"][start:end],
+            documents=data["documents"][start:end] if data.get("documents") else None,
+            # Chroma rejects empty metadata dicts, so send None for those rows
+            metadatas=[m or None for m in data["metadatas"][start:end]] if data.get("metadatas") else None,
+            embeddings=data["embeddings"][start:end].tolist()
+        )
+
+
+def exact_neighbors(embeddings: np.ndarray, queries: np.ndarray, k: int, space: str) -> np.ndarray:
+    """Brute-force top-k ids (as row indexes) in the given distance space"""
+    if space == "l2":
+        # ||q - x||^2 up to the constant ||q||^2
+        scores = 2 * queries @ embeddings.T - (embeddings ** 2).sum(axis=1)
+    elif space == "cosine":
+        norms = np.linalg.norm(embeddings, axis=1)
+        norms[norms == 0] = 1.0
+        scores = queries @ (embeddings / norms[:, None]).T
+    else:  # ip
+        scores = queries @ embeddings.T
+
+    k = min(k, embeddings.shape[0])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return top
+
+
+def evaluate_config(data: Dict[str, Any], queries: np.ndarray, truth: np.ndarray,
+                    hnsw_config: Dict[str, Any], k: int) -> Dict[str, Any]:
+    """Build a throwaway index with the given settings and measure recall and latency"""
+    client = chromadb.EphemeralClient()
+    name = f"hnsw_tuning_{random.randrange(1_000_000)}"
+    collection = client.create_collection(name=name, metadata=collection_metadata(hnsw_config))
+
+    # Only the vectors matter for recall; ids are row indexes so results map back directly
+    build_start = time.perf_counter()
+    write_collection(collection, {
+        "ids": [str(i) for i in range(len(data["ids"]))],
+        "embeddings": data["embeddings"],
+    })
+    build_seconds = time.perf_counter() - build_start
+
+    latencies = []
+    hits = 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        results = collection.query(query_embeddings=[query.tolist()], n_results=k, include=[])
+        latencies.append((time.perf_counter() - start) * 1000)
+        found = {int(i) for i in results["ids"][0]}
+        hits += len(found & set(expected.tolist()))
+
+    client.delete_collection(name)
+
+    return {
+        "config": hnsw_config,
+        "recall": hits / truth.size if truth.size else 1.0,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "build_seconds": build_seconds,
+    }
+
+
+def tune_hnsw(data: Dict[str, Any], queries: np.ndarray, space: str, k: int = 5,
+              m_values: List[int] = None, construction_efs: List[int] = None,
+              search_efs: List[int] = None) -> List[Dict[str, Any]]:
+    """Grid-search HNSW settings against exact brute-force search"""
+    m_values = m_values or [8, 16, 32]
+    construction_efs = construction_efs or [64, 128, 200]
+    search_efs = search_efs or [10, 32, 64, 128]
+
+    truth = exact_neighbors(data["embeddings"], queries, k, space)
+    base = get_hnsw_config()
+
+    results = []
+    for m, construction_ef, search_ef in product(m_values, construction_efs, search_efs):
+        config = dict(base)
+        config.update({
+            "hnsw:space": space,
+            "hnsw:M": m,
+            "hnsw:construction_ef": construction_ef,
+            "hnsw:search_ef": search_ef,
+        })
+        result = evaluate_config(data, queries, truth, config, k)
+        print(f"  M={m:<3} construction_ef={construction_ef:<4} search_ef={search_ef:<4} "
+              f"recall@{k}={result['recall']:.3f} p50={result['p50_ms']:.2f}ms "
+              f"p95={result['p95_ms']:.2f}ms build={result['build_seconds']:.1f}s")
+        results.append(result)
+
+    return results
+
+
+def recommend_config(results: List[Dict[str, Any]], target_recall: float) -> Optional[Dict[str, Any]]:
+    """Fastest setting that meets the target recall"""
+    passing = [r for r in results if r["recall"] >= target_recall]
+    if not passing:
+        return None
+    return min(passing, key=lambda r: (r["p95_ms"], r["p50_ms"]))
+
+
+def _has_collection(client, name: str) -> bool:
+    try:
+        client.get_collection(name)
+        return True
+    except Exception:
+        return False
+
+
+def recover_interrupted_rebuild(client) -> bool:
+    """Put the previous collection back if a rebuild died between its two renames"""
+    previous_name = f"{COLLECTION_NAME}_previous"
+    if _has_collection(client, COLLECTION_NAME) or not _has_collection(client, previous_name):
+        return False
+    client.get_collection(previous_name).modify(name=COLLECTION_NAME)
+    print(f"↩️ Restored {COLLECTION_NAME} from an interrupted rebuild")
+    return True
+
+
+def rebuild_collection(client, data: Dict[str, Any], hnsw_config: Dict[str, Any],
+                       db_path: str = KNOWLEDGE_DB_PATH):
+    """Rebuild the knowledge collection with new HNSW settings
+
+    The new index is built under a staging name, then swapped in by renaming:
+    the old collection is kept as `<name>_previous` until the new one is live.
+    If the process dies between the renames, `recover_interrupted_rebuild`
+    (run at the start of every tuning run) restores the old one.
+    """
+    staging_name = f"{COLLECTION_NAME}_rebuild"
+    previous_name = f"{COLLECTION_NAME}_previous"
+    for name in (staging_name, previous_name):
+        if _has_collection(client, name):
+            client.delete_collection(name)
+
+    staging = client.create_collection(name=staging_name, metadata=collection_metadata(hnsw_config))
+    write_collection(staging, data)
+
+    live = client.get_collection(COLLECTION_NAME)
+    live.modify(name=previous_name)
+    try:
+        staging.modify(name=COLLECTION_NAME)
+    except Exception:
+        live.modify(name=COLLECTION_NAME)
+        raise
+    client.delete_collection(previous_name)
+
+    tuned = {k: v for k, v in hnsw_config.items() if k in DEFAULT_HNSW_CONFIG}
+    with open(os.path.join(db_path, TUNED_CONFIG_FILE), "w") as f:
+        json.dump(tuned, f, indent=2)
+
+
+def load_query_embeddings(data: Dict[str, Any], questions_file: Optional[str], n_queries: int) -> np.ndarray:
+    """Encode eval questions, or sample stored vectors when no file is given"""
+    if questions_file:
+        from sentence_transformers import SentenceTransformer
+        with open(questions_file) as f:
+            questions = [line.strip() for line in f if line.strip()]
+        model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+        return np.asarray(model.encode(questions), dtype=np.float32)
+
+    rows = random.Random(42).sample(range(len(data["ids"])), min(n_queries, len(data["ids"])))
+    return data["embeddings"][rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune HNSW settings for the Grateful Dead knowledge base")
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    parser.add_argument("-k", type=int, default=5, help="Neighbors per query (matches search_knowledge)")
+    parser.add_argument("--space", choices=["l2", "cosine", "ip"], default=None)
+    parser.add_argument("--queries", type=int, default=200, help="Stored vectors to sample as queries")
+    parser.add_argument("--questions-file", help="Eval questions, one per line (overrides --queries)")
+    parser.add_argument("--m", type=int, nargs="+", help="hnsw:M values to try")
+    parser.add_argument("--construction-ef", type=int, nargs="+", help="hnsw:construction_ef values to try")
+    parser.add_argument("--search-ef", type=int, nargs="+", help="hnsw:search_ef values to try")
+    parser.add_argument("--apply", action="store_true", help="Rebuild the collection with the recommended setting")
+    args = parser.parse_args()
+
+    client = chromadb.PersistentClient(path=KNOWLEDGE_DB_PATH)
+    recover_interrupted_rebuild(client)
+    collection = client.get_or_create_collection(name=COLLECTION_NAME, metadata=collection_metadata())
+
+    print(f"📊 Reading {collection.count()} documents from {KNOWLEDGE_DB_PATH}...")
+    data = read_collection(collection)
+    if not data["ids"]:
+        print("❌ Knowledge base is empty - nothing to tune")
+        return
+
+    space = args.space or get_hnsw_config()["hnsw:space"]
+    queries = load_query_embeddings(data, args.questions_file, args.queries)
+
+    print(f"🔧 Tuning over {len(data['ids'])} vectors with {len(queries)} queries ({space} space)...")
+    results = tune_hnsw(data, queries, space, args.k, args.m, args.construction_ef, args.search_ef)
+
+    best = recommend_config(results, args.target_recall)
+    if not best:
+        top = max(results, key=lambda r: r["recall"])
+        print(f"❌ No setting reached recall {args.target_recall}; best was {top['recall']:.3f}")
+        return
+
+    print(f"\n✓ Recommended (recall {best['recall']:.3f}, p95 {best['p95_ms']:.2f}ms):")
+    for key, env_var in HNSW_ENV_VARS.items():
+        print(f"  {env_var}={best['config'][key]}")
+
+    if args.apply:
+        print("\n🔨 Rebuilding collection with recommended settings...")
+        rebuild_collection(client, data, best["config"])
+        print("✓ Collection rebuilt")
+
+
+if __name__ == "__main__":
+    main()
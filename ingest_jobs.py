@@ -0,0 +1,415 @@
+import os
+import sys
+import json
+import time
+import uuid
+import queue
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+from typing import List, Dict, Any, Callable, Iterator, Optional
+import numpy as np
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+INGEST_SOURCES = ["musicbrainz", "archive", "archive_incremental", "curated", "setlistfm", "crawl"]
+# Sources ingested as they arrive, in groups of this many documents
+STREAMING_SOURCES = ["crawl"]
+STREAM_GROUP_DOCUMENTS = int(os.getenv("INGEST_STREAM_DOCUMENTS", 25))
+
+
+# WORKER SIDE (runs in its own process by default)
+
+def harvest_source(source: str, emit: Optional[Callable[[Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
+    """Fetch raw documents from one external source"""
+    from dead_data_scraper import GratefulDeadDataScraper
+    scraper = GratefulDeadDataScraper()
+
+    if source == "archive_incremental":
+        # Only tapes added since the last refresh; the mark moves once the job's writes are done
+        from incremental_refresh import fetch_new_archive_shows
+        docs, watermark = fetch_new_archive_shows(field=os.getenv("ARCHIVE_WATERMARK_FIELD", "addeddate"))
+        for doc in docs:
+            doc.setdefault("source", "archive")
+        if emit:
+            emit({"event": "watermark", **watermark})
+        return docs
+
+    if source == "musicbrainz":
+        docs = scraper.get_musicbrainz_data()
+    elif source == "archive":
+        docs = scraper.scrape_dead_net_archives()
+    elif source == "curated":
+        docs = scraper.scrape_dead_essays_lyrics()
+    elif source == "setlistfm":
+        docs = scraper.get_setlistfm_data(api_key=os.getenv("SETLISTFM_API_KEY"))
+    elif source == "crawl":
+        # All at once, for callers that don't stream (run_worker streams it)
+        docs = [doc for group in stream_source(source) for doc in group]
+    else:
+        raise ValueError(f"Unknown ingest source: {source}")
+
+    # Tag where each document came from, for the source facet in /knowledge/stats
+    for doc in docs:
+        doc.setdefault("source", source)
+    return docs
+
+
+def stream_source(source: str, group_size: int = STREAM_GROUP_DOCUMENTS) -> Iterator[List[Dict[str, Any]]]:
+    """Documents of a streaming source, in groups, as soon as they are fetched"""
+    if source != "crawl":
+        raise ValueError(f"Not a streaming source: {source}")
+    from crawler import Crawler
+
+    group = []
+    for doc in Crawler().crawl():
+        group.append(doc)
+        if len(group) >= group_size:
+            yield group
+            group = []
+    if group:
+        yield group
+
+
+def limit_cpu(threads: int, nice: int):
+    """Keep ingestion from competing with /chat for CPU (BLAS limits come from the parent's env)"""
+    if nice and hasattr(os, "nice"):
+        os.nice(nice)
+
+    import torch
+    torch.set_num_threads(threads)
+
+
+def run_worker(sources: List[str], batch_size: int, emit: Callable[[Dict[str, Any]], None], model=None):
+    """Harvest, dedupe, chunk and embed; emits 'harvested', 'watermark', 'deduplicated', 'batch', 'error' and 'done' events
+
+    Streaming sources (the crawler) are deduped, chunked and embedded group
+    by group while they are still being fetched.
+    """
+    from chunking import chunk_documents
+    from dedup import DEDUP_ENABLED, NearDuplicateIndex, dedupe_documents, merge_reports
+
+    documents = []
+    for source in sources:
+        if source in STREAMING_SOURCES:
+            continue
+        try:
+            docs = harvest_source(source, emit)
+            documents.extend(docs)
+            emit({"event": "harvested", "source": source, "count": len(docs)})
+        except Exception as e:
+            emit({"event": "error", "stage": "harvest", "source": source, "error": str(e)})
+
+    if model is None:
+        from sentence_transformers import SentenceTransformer
+        from index_config import EMBEDDING_MODEL_NAME
+        model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+
+    dedup_total = {}
+    # Loaded from disk once per job and kept current in memory as groups go by;
+    # the server persists the signatures of what it actually writes
+    dedup_index = NearDuplicateIndex(persist=False) if DEDUP_ENABLED else None
+
+    def ingest(documents):
+        nonlocal dedup_total
+        if dedup_index is not None:
+            documents, report = dedupe_documents(documents, dedup_index)
+            dedup_total = merge_reports(dedup_total, report)
+            emit({"event": "deduplicated", **dedup_total})
+
+        parents, chunks = chunk_documents(documents)
+        if dedup_index is not None:
+            # Later groups of this job are checked against this one too
+            dedup_index.add(parents)
+        parents_by_id = {parent["id"]: parent for parent in parents}
+        emit({"event": "chunked", "documents": len(parents), "chunks": len(chunks)})
+
+        for batch, embeddings in embedded_batches(chunks):
+            # Send each parent along with the first batch that contains one of its chunks
+            batch_parents = []
+            for chunk in batch:
+                parent = parents_by_id.pop(chunk["parent_id"], None)
+                if parent:
+                    batch_parents.append(parent)
+
+            emit({"event": "batch", "parents": batch_parents, "chunks": batch, "embeddings": embeddings})
+
+    def embedded_batches(chunks):
+        """(chunks, embeddings) in write batches of `batch_size`"""
+        if not hasattr(model, "encode_shards"):
+            for start in range(0, len(chunks), batch_size):
+                batch = chunks[start:start + batch_size]
+                try:
+                    embeddings = np.asarray(model.encode([c["content"] for c in batch], batch_size=batch_size),
+                                            dtype=np.float32)
+                except Exception as e:
+                    emit({"event": "error", "stage": "embed", "error": str(e)})
+                    continue
+                yield batch, embeddings
+            return
+
+        # A BulkEmbedder gets the whole list at once so every embedding process stays busy;
+        # the shards it returns in order are cut into write batches here
+        written, pending = 0, []
+        try:
+            for embeddings in model.encode_shards([c["content"] for c in chunks]):
+                pending.append(np.asarray(embeddings, dtype=np.float32))
+                while sum(len(e) for e in pending) >= batch_size:
+                    stacked = np.vstack(pending)
+                    yield chunks[written:written + batch_size], stacked[:batch_size]
+                    written += batch_size
+                    pending = [stacked[batch_size:]]
+        except Exception as e:
+            emit({"event": "error", "stage": "embed", "error": str(e)})
+            return
+        if written < len(chunks):
+            yield chunks[written:], np.vstack(pending)
+
+    if documents:
+        ingest(documents)
+
+    for source in sources:
+        if source not in STREAMING_SOURCES:
+            continue
+        try:
+            for group in stream_source(source):
+                emit({"event": "harvested", "source": source, "count": len(group)})
+                ingest(group)
+        except Exception as e:
+            emit({"event": "error", "stage": "harvest", "source": source, "error": str(e)})
+
+    emit({"event": "done"})
+
+
+def worker_main(args):
+    """Subprocess entry point: JSON-lines events on stdout, embeddings via .npy files"""
+    # Scrapers print progress; keep stdout for the protocol
+    protocol = os.fdopen(os.dup(sys.stdout.fileno()), "w", buffering=1)
+    sys.stdout = sys.stderr
+
+    limit_cpu(args.threads, args.nice)
+
+    counter = {"batches": 0}
+
+    def emit(event):
+        if event["event"] == "batch":
+            path = os.path.join(args.spool_dir, f"batch_{counter['batches']:06d}.npy")
+            np.save(path, event.pop("embeddings"))
+            event["embeddings_path"] = path
+            counter["batches"] += 1
+        protocol.write(json.dumps(event) + "\n")
+
+    # Big harvests can fan embedding out over several processes of their own
+    embedder = None
+    embed_workers = int(os.getenv("INGEST_EMBED_WORKERS", 1))
+    if embed_workers > 1:
+        from bulk_embed import BulkEmbedder
+        embedder = BulkEmbedder(embed_workers, args.threads)
+
+    try:
+        run_worker(args.sources, args.batch_size, emit, model=embedder)
+    except Exception as e:
+        emit({"event": "error", "stage": "worker", "error": str(e)})
+        emit({"event": "done"})
+    finally:
+        if embedder:
+            embedder.close()
+
+
+# SERVER SIDE
+
+class IngestJobManager:
+    """Queue of ingestion jobs run by a small pool of background workers
+
+    Workers scrape and embed (in a separate, niced, thread-limited process by
+    default); finished batches come back to this process, which is the only
+    one that writes to the knowledge base.
+    """
+
+    def __init__(self, chatbot):
+        self.chatbot = chatbot
+        self.mode = os.getenv("INGEST_WORKER_MODE", "process")
+        self.max_workers = int(os.getenv("INGEST_MAX_WORKERS", 1))
+        self.threads_per_worker = int(os.getenv("INGEST_THREADS_PER_WORKER", 1))
+        self.nice = int(os.getenv("INGEST_NICE", 10))
+        self.batch_size = int(os.getenv("INGEST_BATCH_SIZE", 64))
+        self.jobs = {}
+        self.queue = queue.Queue()
+        self._lock = threading.Lock()
+        # Writes (and deletes) are serialized so concurrent jobs never interleave partial batches
+        self.write_lock = threading.Lock()
+        self._workers = []
+
+    def start(self):
+        if self._workers:
+            return
+        for i in range(self.max_workers):
+            worker = threading.Thread(target=self._run, name=f"ingest-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, sources: List[str], batch_size: Optional[int] = None) -> Dict[str, Any]:
+        unknown = [s for s in sources if s not in INGEST_SOURCES]
+        if unknown:
+            raise ValueError(f"Unknown sources: {', '.join(unknown)} (choose from {', '.join(INGEST_SOURCES)})")
+
+        job = {
+            "id": uuid.uuid4().hex[:12],
+            "status": "queued",
+            "sources": sources,
+            "batch_size": batch_size or self.batch_size,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "documents_harvested": 0,
+            "documents_total": None,
+            "chunks_total": None,
+            "chunks_written": 0,
+            "errors": [],
+            "watermark": None,
+            "dedup": None,
+        }
+        with self._lock:
+            self.jobs[job["id"]] = job
+        self.queue.put(job["id"])
+        return self.get_job(job["id"])
+
+    def schedule(self, sources: List[str], interval_seconds: float):
+        """Submit the same job every interval, skipping a tick while the previous one is still pending"""
+        def loop():
+            last_job_id = None
+            while True:
+                last = self.get_job(last_job_id) if last_job_id else None
+                if not last or last["status"] in ("completed", "failed"):
+                    last_job_id = self.submit(sources)["id"]
+                time.sleep(interval_seconds)
+
+        threading.Thread(target=loop, name=f"ingest-schedule-{'-'.join(sources)}", daemon=True).start()
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            job = dict(job, errors=list(job["errors"]))
+
+        end = job["finished_at"] or time.time()
+        elapsed = end - job["started_at"] if job["started_at"] else 0.0
+        job["elapsed_seconds"] = round(elapsed, 2)
+        job["chunks_per_second"] = round(job["chunks_written"] / elapsed, 2) if elapsed else 0.0
+        if job["chunks_total"]:
+            job["progress"] = round(job["chunks_written"] / job["chunks_total"], 4)
+        else:
+            job["progress"] = 1.0 if job["status"] == "completed" else 0.0
+        return job
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            job_ids = list(self.jobs)
+        return [self.get_job(job_id) for job_id in job_ids]
+
+    def _update(self, job_id: str, **fields):
+        with self._lock:
+            self.jobs[job_id].update(fields)
+
+    def _handle(self, job_id: str, event: Dict[str, Any]):
+        kind = event["event"]
+        if kind == "harvested":
+            with self._lock:
+                self.jobs[job_id]["documents_harvested"] += event["count"]
+        elif kind == "chunked":
+            # Streaming sources report one group at a time
+            with self._lock:
+                job = self.jobs[job_id]
+                job["documents_total"] = (job["documents_total"] or 0) + event["documents"]
+                job["chunks_total"] = (job["chunks_total"] or 0) + event["chunks"]
+        elif kind == "batch":
+            embeddings = event.get("embeddings")
+            if embeddings is None:
+                embeddings = np.load(event["embeddings_path"])
+                os.remove(event["embeddings_path"])
+            with self.write_lock:
+                self.chatbot.write_chunks(event["parents"], event["chunks"], np.asarray(embeddings).tolist())
+            with self._lock:
+                self.jobs[job_id]["chunks_written"] += len(event["chunks"])
+        elif kind == "deduplicated":
+            self._update(job_id, dedup={k: v for k, v in event.items() if k != "event"})
+        elif kind == "watermark":
+            self._update(job_id, watermark={k: v for k, v in event.items() if k != "event"})
+        elif kind == "error":
+            with self._lock:
+                self.jobs[job_id]["errors"].append({k: v for k, v in event.items() if k != "event"})
+
+    def _run(self):
+        while True:
+            job_id = self.queue.get()
+            job = self.get_job(job_id)
+            self._update(job_id, status="running", started_at=time.time())
+            try:
+                if self.mode == "thread":
+                    run_worker(job["sources"], job["batch_size"], lambda e: self._handle(job_id, e),
+                               model=self.chatbot.embedding_model)
+                else:
+                    self._run_process(job_id, job)
+                job = self.get_job(job_id)
+                failed = bool(job["errors"]) and not job["chunks_written"]
+                if job["watermark"] and not job["errors"]:
+                    self._commit_watermark(job["watermark"])
+                self._update(job_id, status="failed" if failed else "completed", finished_at=time.time())
+            except Exception as e:
+                with self._lock:
+                    self.jobs[job_id]["errors"].append({"stage": "manager", "error": str(e)})
+                self._update(job_id, status="failed", finished_at=time.time())
+
+    def _commit_watermark(self, watermark: Dict[str, Any]):
+        """Advance an incremental-refresh mark, only after every batch of its job was written"""
+        from incremental_refresh import WatermarkStore
+        WatermarkStore().advance(watermark["collection"], watermark["field"], watermark["value"])
+
+    def _run_process(self, job_id: str, job: Dict[str, Any]):
+        spool_dir = tempfile.mkdtemp(prefix=f"ingest_{job_id}_")
+        command = [
+            sys.executable, os.path.abspath(__file__), "worker",
+            "--sources", *job["sources"],
+            "--batch-size", str(job["batch_size"]),
+            "--threads", str(self.threads_per_worker),
+            "--nice", str(self.nice),
+            "--spool-dir", spool_dir,
+        ]
+        # Thread limits must be in the environment before numpy/torch load in the child
+        env = dict(os.environ, TOKENIZERS_PARALLELISM="false")
+        for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+            env[var] = str(self.threads_per_worker)
+        try:
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True, env=env,
+                                       cwd=os.path.dirname(os.path.abspath(__file__)))
+            for line in process.stdout:
+                if line.strip():
+                    self._handle(job_id, json.loads(line))
+            if process.wait() != 0:
+                raise RuntimeError(f"Ingest worker exited with code {process.returncode}")
+        finally:
+            shutil.rmtree(spool_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Knowledge base ingestion worker")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    worker_parser = subparsers.add_parser("worker", help="Run one ingest job (used by IngestJobManager)")
+    worker_parser.add_argument("--sources", nargs="+", choices=INGEST_SOURCES, required=True)
+    worker_parser.add_argument("--batch-size", type=int, default=64)
+    worker_parser.add_argument("--threads", type=int, default=1)
+    worker_parser.add_argument("--nice", type=int, default=10)
+    worker_parser.add_argument("--spool-dir", required=True)
+    args = parser.parse_args()
+
+    if args.command == "worker":
+        worker_main(args)
+
+
+if __name__ == "__main__":
+    main()
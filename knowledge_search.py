@@ -0,0 +1,55 @@
+from typing import List, Dict
+import numpy as np
+from chunking import expand_to_parents
+from diversify import MMR_ENABLED, MMR_FETCH_MULTIPLIER, diversify_chunks
+from partitioned_store import partition_filter
+
+
+def search_batch(collection, parent_store, embedding_model, queries: List[str], n_results: int = 5,
+                 query_embeddings=None) -> List[List[Dict]]:
+    """Parent documents for many queries, from one encoding pass and one multi-query lookup
+
+    Shared by the CLI and API chatbots. Failures are raised, not swallowed:
+    interactive callers fall back to no context, batch runs report an error.
+    """
+    if query_embeddings is None:
+        query_embeddings = embedding_model.encode(queries)
+    query_embeddings = np.asarray(query_embeddings, dtype=np.float32)
+
+    # Over-fetch chunks, since several may belong to the same parent (and MMR needs a pool to choose from)
+    include = ['documents', 'metadatas', 'distances'] + (['embeddings'] if MMR_ENABLED else [])
+    n_fetch = n_results * (MMR_FETCH_MULTIPLIER if MMR_ENABLED else 3)
+
+    # On a partitioned store, queries routed to the same partitions share one fan-out
+    routes = {}
+    for q, query in enumerate(queries):
+        route = partition_filter(collection, query).get('preferred')
+        routes.setdefault(tuple(route or ()), []).append(q)
+
+    results = {key: [None] * len(queries) for key in ('documents', 'metadatas', 'distances', 'embeddings')}
+    for route, rows in routes.items():
+        kwargs = {'preferred': list(route)} if route else {}
+        part = collection.query(
+            query_embeddings=query_embeddings[rows].tolist(),
+            n_results=n_fetch,
+            include=include,
+            **kwargs
+        )
+        for i, q in enumerate(rows):
+            for key in results:
+                results[key][q] = part[key][i] if part.get(key) is not None else None
+
+    batch_docs = []
+    for q in range(len(queries)):
+        chunk_docs = []
+        for i in range(len(results['documents'][q])):
+            chunk_docs.append({
+                'content': results['documents'][q][i],
+                'metadata': results['metadatas'][q][i],
+                'distance': results['distances'][q][i]
+            })
+        if MMR_ENABLED and chunk_docs:
+            # Skip near-identical candidates in favour of ones that add something new
+            chunk_docs = diversify_chunks(query_embeddings[q], chunk_docs, results['embeddings'][q], n_results)
+        batch_docs.append(expand_to_parents(chunk_docs, parent_store, n_results))
+    return batch_docs
@@ -0,0 +1,267 @@
+import os
+import re
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import List, Dict, Any, Optional
+import httpx
+import openai
+from dotenv import load_dotenv
+from request_profiler import propagate
+
+# Load environment variables
+load_dotenv()
+
+# Errors worth retrying - everything else (bad request, auth) fails fast
+RETRYABLE_ERRORS = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+
+class LLMUnavailableError(Exception):
+    """The LLM could not answer before the deadline"""
+
+
+class CircuitOpenError(LLMUnavailableError):
+    """Calls are being short-circuited after repeated upstream failures"""
+
+
+class CircuitBreaker:
+    """Classic closed / open / half-open circuit breaker
+
+    Once `reset_timeout` has passed, half-open lets exactly one probe request
+    through; its result closes the breaker or opens it for another period.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        # Thread running the half-open probe, if any
+        self.probe_owner = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                return "half_open"
+            return "open"
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self.probe_owner == threading.get_ident():
+                return True
+            if self.probe_owner is not None or time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            # Half-open: this caller is the probe, everyone else keeps failing fast until it reports back
+            self.probe_owner = threading.get_ident()
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probe_owner = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.probe_owner is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.probe_owner = None
+
+    def release_probe(self):
+        """The probe ended without saying anything about upstream health; let the next request probe"""
+        with self._lock:
+            if self.probe_owner == threading.get_ident():
+                self.probe_owner = None
+
+
+class ResilientLLMClient:
+    """OpenAI chat completions with deadlines, jittered retries, hedging and a circuit breaker"""
+
+    def __init__(self, api_key: str, base_url: Optional[str] = None, model: str = "gpt-3.5-turbo"):
+        self.model = model
+        self.timeout = float(os.getenv("LLM_TIMEOUT_SECONDS", 20))
+        self.deadline = float(os.getenv("LLM_DEADLINE_SECONDS", 30))
+        self.max_retries = int(os.getenv("LLM_MAX_RETRIES", 2))
+        self.backoff_base = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", 0.5))
+        self.hedge = os.getenv("LLM_HEDGE", "false").lower() in ("1", "true", "yes")
+        self.hedge_min_delay = float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", 1.0))
+        pool_size = int(os.getenv("LLM_POOL_SIZE", 20))
+
+        # One pooled HTTP client for every request; the SDK's own retries are off
+        # because this class owns the retry policy
+        self.http_client = httpx.Client(
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            timeout=httpx.Timeout(self.timeout, connect=5.0),
+        )
+        self.client = openai.OpenAI(
+            api_key=api_key,
+            base_url=base_url or os.getenv("OPENAI_BASE_URL") or None,
+            http_client=self.http_client,
+            max_retries=0,
+        )
+        self.breaker = CircuitBreaker(
+            failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", 5)),
+            reset_timeout=float(os.getenv("LLM_BREAKER_RESET_SECONDS", 30)),
+        )
+        self.executor = ThreadPoolExecutor(max_workers=pool_size * 2, thread_name_prefix="llm")
+        self.latencies = deque(maxlen=200)
+        self.stats = {"requests": 0, "retries": 0, "hedges": 0, "hedge_wins": 0,
+                      "failures": 0, "short_circuited": 0,
+                      "prompt_tokens": 0, "cached_prompt_tokens": 0, "completion_tokens": 0}
+        # Optional callable(usage_dict) per completed call, e.g. to log or export prompt-cache hits
+        self.usage_hook = None
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key: str, amount: int = 1):
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def record_usage(self, response):
+        """Count prompt tokens served from the provider's prompt cache vs processed fresh"""
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        record = {
+            "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+            "cached_prompt_tokens": getattr(details, "cached_tokens", 0) or 0,
+            "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+        }
+        with self._stats_lock:
+            for key, value in record.items():
+                self.stats[key] += value
+        if self.usage_hook:
+            self.usage_hook(record)
+
+    def hedge_delay(self) -> float:
+        """Fire the hedged request once the first one is slower than our recent p95"""
+        if len(self.latencies) < 20:
+            return max(self.hedge_min_delay, self.timeout / 2)
+        ordered = sorted(self.latencies)
+        return max(self.hedge_min_delay, ordered[int(len(ordered) * 0.95) - 1])
+
+    def _call(self, messages: List[Dict], timeout: float, **kwargs):
+        start = time.monotonic()
+        response = self.client.chat.completions.create(
+            model=kwargs.pop("model", self.model),
+            messages=messages,
+            timeout=timeout,
+            **kwargs
+        )
+        self.latencies.append(time.monotonic() - start)
+        return response
+
+    def _attempt(self, messages: List[Dict], deadline_at: float, **kwargs):
+        """One attempt, optionally hedged with a second identical request"""
+        remaining = deadline_at - time.monotonic()
+        timeout = min(self.timeout, remaining)
+        if not self.hedge:
+            # The request timeout already stops at the deadline, so no thread hop is needed
+            return self._call(messages, timeout, **kwargs)
+
+        # propagate: a profiled request's samples include its calls on the pool threads
+        call = propagate(self._call)
+        first = self.executor.submit(call, messages, timeout, **kwargs)
+        done, _ = wait([first], timeout=min(self.hedge_delay(), remaining))
+        if done:
+            return first.result()
+
+        self._count("hedges")
+        remaining = deadline_at - time.monotonic()
+        second = self.executor.submit(call, messages, min(self.timeout, remaining), **kwargs)
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=max(deadline_at - time.monotonic(), 0),
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        self._count("hedge_wins")
+                    return future.result()
+                error = future.exception()
+        raise error or FutureTimeoutError("LLM request timed out")
+
+    def complete(self, messages: List[Dict], deadline: Optional[float] = None, **kwargs):
+        """Create a chat completion or raise LLMUnavailableError"""
+        if not self.breaker.allow_request():
+            self._count("short_circuited")
+            raise CircuitOpenError("LLM circuit breaker is open")
+
+        self._count("requests")
+        deadline_at = time.monotonic() + (deadline or self.deadline)
+        last_error = None
+
+        for attempt in range(self.max_retries + 1):
+            if time.monotonic() >= deadline_at:
+                break
+            try:
+                response = self._attempt(messages, deadline_at, **kwargs)
+                self.breaker.record_success()
+                self.record_usage(response)
+                return response
+            except RETRYABLE_ERRORS + (FutureTimeoutError, TimeoutError) as e:
+                last_error = e
+                self.breaker.record_failure()
+                if attempt == self.max_retries or not self.breaker.allow_request():
+                    break
+                # Full jitter: sleep somewhere in [0, base * 2^attempt], but never past the deadline
+                self._count("retries")
+                backoff = random.uniform(0, self.backoff_base * (2 ** attempt))
+                time.sleep(max(min(backoff, deadline_at - time.monotonic()), 0))
+            except Exception:
+                # Bad request, auth... - says nothing about whether upstream has recovered
+                self.breaker.release_probe()
+                raise
+
+        self.breaker.release_probe()
+        self._count("failures")
+        raise LLMUnavailableError(f"LLM unavailable: {last_error or 'deadline exceeded'}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats["breaker_state"] = self.breaker.state
+        stats["uncached_prompt_tokens"] = stats["prompt_tokens"] - stats["cached_prompt_tokens"]
+        stats["prompt_cache_hit_rate"] = (
+            round(stats["cached_prompt_tokens"] / stats["prompt_tokens"], 4) if stats["prompt_tokens"] else 0.0
+        )
+        stats["hedge_delay_seconds"] = round(self.hedge_delay(), 3)
+        return stats
+
+
+def extractive_answer(query: str, context_docs: List[Dict], max_sentences: int = 3) -> str:
+    """Answer straight from the retrieved docs when the LLM is unavailable"""
+    terms = {w for w in re.findall(r"[a-z0-9']+", query.lower()) if len(w) > 2}
+    scored = []
+    for rank, doc in enumerate(context_docs):
+        for sentence in re.split(r"(?<=[.!?])\s+", doc.get("content", "")):
+            words = set(re.findall(r"[a-z0-9']+", sentence.lower()))
+            overlap = len(terms & words)
+            if overlap:
+                # Prefer sentences from better-ranked docs when overlap ties
+                scored.append((overlap, -rank, sentence.strip()))
+
+    if not scored:
+        return ("Sorry, I'm having trouble connecting right now and couldn't find anything "
+                "on that in my notes. Try again in a minute!")
+
+    best = [s for _, _, s in sorted(scored, reverse=True)[:max_sentences]]
+    return "I can't reach my full brain right now, but here's what my notes say: " + " ".join(best)
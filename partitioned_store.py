@@ -0,0 +1,383 @@
+import os
+import re
+import json
+import math
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+from dotenv import load_dotenv
+from index_config import KNOWLEDGE_DB_PATH, get_hnsw_config, read_collection, write_collection
+
+# Load environment variables
+load_dotenv()
+
+PARTITION_FILE = "partitions.json"
+# Metadata field that decides a chunk's partition ("category" or "source")
+PARTITION_KEY = os.getenv("PARTITION_KEY", "category")
+# At most this share of the merged results may come from one partition (while others still have hits)
+PARTITION_MAX_SHARE = float(os.getenv("PARTITION_MAX_SHARE", 0.6))
+# Partitions up to this many chunks are served from an in-memory matrix
+PARTITION_HOT_MAX_ROWS = int(os.getenv("PARTITION_HOT_MAX_ROWS", 20000))
+PARTITION_SEARCH_THREADS = int(os.getenv("PARTITION_SEARCH_THREADS", 8))
+# Prefer partitions per question with the keyword classifier below (false: search all alike)
+PARTITION_ROUTING = os.getenv("PARTITION_ROUTING", "true").lower() in ("1", "true", "yes")
+# Partitions a question isn't routed to are still searched, and may fill this share of the results...
+PARTITION_UNROUTED_SHARE = float(os.getenv("PARTITION_UNROUTED_SHARE", 0.4))
+# ...or all of them when the best hit in the routed partitions is less similar than this
+PARTITION_ROUTE_MIN_SIMILARITY = float(os.getenv("PARTITION_ROUTE_MIN_SIMILARITY", 0.4))
+
+# Cheap keyword routing: a question matching a pattern prefers that partition.
+# Words that show up in questions about anything ("who", "sound", "most") are left out.
+PARTITION_ROUTES = {
+    "shows": r"\b(show|shows|concert|gig|played|setlist|venue|tour|tape|tapes|soundboard|sbd|aud|19[6-9]\d|'[6-9]\d)\b",
+    "albums": r"\b(album|albums|record|records|release|released|studio|lp|discography)\b",
+    "songs": r"\b(song|songs|lyric|lyrics|wrote|written|cover|covers|jam|jams)\b",
+    "band_members": r"\b(member|members|jerry|garcia|weir|phil|lesh|pigpen|mickey|hart|kreutzmann|keith|donna|"
+                    r"brent|mydland|hunter|barlow|drummer|guitarist|bassist|keyboard\w*|lyricist)\b",
+    "musical_style": r"\b(style|improvis\w*|influence\w*|genre|jazz|bluegrass|psychedelic)\b",
+    "statistics": r"\b(how many|number of|average|total|statistics?)\b",
+}
+_ROUTE_PATTERNS = {name: re.compile(pattern, re.IGNORECASE) for name, pattern in PARTITION_ROUTES.items()}
+
+
+def partition_name(value: Any) -> str:
+    """Filesystem- and Chroma-safe partition name for a metadata value"""
+    name = re.sub(r"[^a-z0-9_-]+", "_", str(value or "unknown").lower()).strip("_-")
+    return name[:30] or "unknown"
+
+
+def route_query(text: str, available: List[str]) -> Optional[List[str]]:
+    """Partitions a question is most likely about, or None if nothing stands out"""
+    matched = [name for name, pattern in _ROUTE_PATTERNS.items() if name in available and pattern.search(text or "")]
+    return matched or None
+
+
+def partition_filter(collection, text: str) -> Dict[str, Any]:
+    """Extra query() arguments preferring a question's partitions ({} for unpartitioned or unrouted questions)"""
+    if not getattr(collection, "partitioned", False) or not PARTITION_ROUTING:
+        return {}
+    route = route_query(text, list(collection.partitions))
+    return {"preferred": route} if route else {}
+
+
+def to_similarity(distances, space: str) -> np.ndarray:
+    """Backend distances as cosine similarity, so hits from different partitions compare (vectors are unit length)"""
+    distances = np.asarray(distances, dtype=np.float32)
+    if space == "l2":
+        # Squared L2 between unit vectors is 2 - 2 cos
+        return 1.0 - distances / 2.0
+    return 1.0 - distances
+
+
+def merge_hits(hits: List[Tuple[str, float, Dict[str, Any]]], n_results: int,
+               max_share: float = PARTITION_MAX_SHARE, unrouted: Optional[set] = None,
+               unrouted_quota: Optional[int] = None) -> List[Tuple[str, float, Dict[str, Any]]]:
+    """Top `n_results` of (partition, similarity, hit) by similarity, at most `max_share` of them from one partition
+
+    Partitions in `unrouted` may take at most `unrouted_quota` slots between
+    them. Slots a capped partition would have taken go to the next best hits
+    from the others; if the others run out, the capped partitions fill the rest.
+    """
+    ranked = sorted(hits, key=lambda hit: -hit[1])
+    quota = max(1, math.ceil(n_results * max_share))
+    taken, overflow, used = [], [], {}
+    unrouted_used = 0
+    for hit in ranked:
+        if len(taken) == n_results:
+            break
+        is_unrouted = unrouted is not None and hit[0] in unrouted
+        if used.get(hit[0], 0) < quota and not (is_unrouted and unrouted_used >= unrouted_quota):
+            taken.append(hit)
+            used[hit[0]] = used.get(hit[0], 0) + 1
+            unrouted_used += is_unrouted
+        else:
+            overflow.append(hit)
+    taken.extend(overflow[:n_results - len(taken)])
+    return sorted(taken, key=lambda hit: -hit[1])
+
+
+class PartitionedStore:
+    """One vector store per partition (by `category` by default) behind the collection API
+
+    Writes are routed by each chunk's partition key. Queries fan out in
+    parallel to the requested partitions (all by default), hits are merged
+    on cosine similarity with a per-partition quota, and partitions small
+    enough to stay hot are searched from an in-memory matrix instead of the
+    backend, so query cost follows the partitions touched.
+    """
+
+    partitioned = True
+
+    def __init__(self, backend: str = "chroma", db_path: str = KNOWLEDGE_DB_PATH, read_only: bool = False,
+                 key: str = PARTITION_KEY):
+        self.backend = backend
+        self.db_path = db_path
+        self.read_only = read_only
+        self.path = os.path.join(db_path, PARTITION_FILE)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=PARTITION_SEARCH_THREADS, thread_name_prefix="partition-search")
+        self.partitions = {}
+        # Per partition: in-memory matrix, row count, and a write counter that invalidates both
+        self._hot = {}
+        self._counts = {}
+        self._versions = {}
+        self.key = key
+        # Distances from Chroma follow the collection's HNSW space; the flat index returns cosine distances
+        self.space = get_hnsw_config(db_path)["hnsw:space"] if backend == "chroma" else "cosine"
+
+        if os.path.exists(self.path):
+            try:
+                with open(self.path) as f:
+                    manifest = json.load(f)
+                self.key = manifest["key"]
+                for name in manifest["partitions"]:
+                    self._open(name)
+            except Exception as e:
+                print(f"⚠️ Could not read partition manifest: {e}")
+
+    def _open(self, name: str):
+        from vector_store import open_backend
+        if name not in self.partitions:
+            self.partitions[name] = open_backend(self.backend, self.db_path, self.read_only, partition=name)
+        return self.partitions[name]
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"key": self.key, "partitions": sorted(self.partitions)}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def partition_of(self, metadata: Optional[Dict[str, Any]]) -> str:
+        return partition_name((metadata or {}).get(self.key))
+
+    # Collection API
+
+    def add(self, ids, embeddings, documents=None, metadatas=None):
+        if self.read_only:
+            raise PermissionError("Vector store was opened read-only")
+        documents = documents or [""] * len(ids)
+        metadatas = metadatas or [{}] * len(ids)
+
+        groups = {}
+        for i, metadata in enumerate(metadatas):
+            groups.setdefault(self.partition_of(metadata), []).append(i)
+
+        with self._lock:
+            created = [name for name in groups if name not in self.partitions]
+            for name in created:
+                self._open(name)
+            if created:
+                self._save()
+
+        for name, rows in groups.items():
+            self.partitions[name].add(
+                ids=[ids[i] for i in rows],
+                embeddings=[embeddings[i] for i in rows],
+                documents=[documents[i] for i in rows],
+                metadatas=[metadatas[i] for i in rows]
+            )
+            self._invalidate(name)
+
+    def delete(self, ids):
+        for name, store in list(self.partitions.items()):
+            store.delete(ids)
+            self._invalidate(name)
+
+    def count(self) -> int:
+        return sum(self._count(name) for name in list(self.partitions))
+
+    def counts(self) -> Dict[str, int]:
+        return {name: self._count(name) for name in sorted(self.partitions)}
+
+    def _invalidate(self, name: str):
+        with self._lock:
+            self._versions[name] = self._versions.get(name, 0) + 1
+            self._hot.pop(name, None)
+            self._counts.pop(name, None)
+
+    def _count(self, name: str) -> int:
+        """A partition's row count, cached until the next write to it"""
+        count = self._counts.get(name)
+        if count is None:
+            version = self._versions.get(name, 0)
+            count = self.partitions[name].count()
+            with self._lock:
+                # A write that landed meanwhile may not be counted; leave it for the next caller
+                if self._versions.get(name, 0) == version:
+                    self._counts[name] = count
+        return count
+
+    def _hot_matrix(self, name: str) -> Optional[Dict[str, Any]]:
+        """In-memory copy of a small partition (dropped on every write to it), or None if it is too big
+
+        Writes all go through this object while a server holds the store
+        (command-line writers refuse to run then, see store_log), so a query
+        costs no count() or reload per partition until something changes.
+        """
+        cached = self._hot.get(name)
+        if cached is not None:
+            return cached
+        version = self._versions.get(name, 0)
+        count = self._count(name)
+        if count == 0 or count > PARTITION_HOT_MAX_ROWS:
+            return None
+        data = self.partitions[name].get(include=["embeddings", "documents", "metadatas"])
+        vectors = np.asarray(data["embeddings"], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        cached = {"count": len(data["ids"]), "ids": data["ids"], "vectors": vectors / norms,
+                  "documents": data["documents"], "metadatas": data["metadatas"]}
+        with self._lock:
+            if self._versions.get(name, 0) == version:
+                self._hot[name] = cached
+        return cached
+
+    def _search(self, name: str, queries: np.ndarray, n_results: int, where: Optional[Dict],
+                include: List[str]) -> List[List[Tuple[str, float, Dict[str, Any]]]]:
+        """Hits per query from one partition, as (partition, cosine similarity, hit)"""
+        hot = self._hot_matrix(name) if not where else None
+        if hot is not None:
+            scores = queries @ hot["vectors"].T
+            k = min(n_results, hot["count"])
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k] if k < hot["count"] else \
+                np.tile(np.arange(hot["count"]), (len(queries), 1))
+            results = []
+            for q, rows in enumerate(top):
+                rows = rows[np.argsort(-scores[q, rows])]
+                results.append([(name, float(scores[q, r]), {
+                    "id": hot["ids"][r], "document": hot["documents"][r],
+                    "metadata": hot["metadatas"][r], "embedding": hot["vectors"][r]}) for r in rows])
+            return results
+
+        store_include = [field for field in include if field != "distances"] + ["distances"]
+        raw = self.partitions[name].query(query_embeddings=queries.tolist(), n_results=n_results,
+                                          where=where, include=store_include)
+        results = []
+        for q in range(len(queries)):
+            similarities = to_similarity(raw["distances"][q], self.space)
+            hits = []
+            for i, doc_id in enumerate(raw["ids"][q]):
+                hits.append((name, float(similarities[i]), {
+                    "id": doc_id,
+                    "document": raw["documents"][q][i] if raw.get("documents") else None,
+                    "metadata": raw["metadatas"][q][i] if raw.get("metadatas") else None,
+                    "embedding": raw["embeddings"][q][i] if raw.get("embeddings") is not None else None,
+                }))
+            results.append(hits)
+        return results
+
+    def query(self, query_embeddings, n_results: int = 5, where: Optional[Dict] = None,
+              include: Optional[List[str]] = None, partitions: Optional[List[str]] = None,
+              preferred: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Search `partitions` (default: all) in parallel and merge the hits of each query
+
+        With `preferred` (a question's route), the other partitions are
+        searched for a few hits each, which may fill PARTITION_UNROUTED_SHARE
+        of the results - or all of them when the best preferred hit is less
+        similar than PARTITION_ROUTE_MIN_SIMILARITY.
+        """
+        from vector_store import DEFAULT_INCLUDE
+        include = include or DEFAULT_INCLUDE
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        names = [name for name in (partitions or self.partitions) if name in self.partitions]
+        preferred = [name for name in (preferred or ()) if name in names]
+        unrouted = set(names) - set(preferred) if preferred else set()
+        unrouted_quota = max(1, math.ceil(n_results * PARTITION_UNROUTED_SHARE))
+
+        futures = [self._executor.submit(self._search, name, queries, unrouted_quota if name in unrouted else n_results,
+                                         where, include) for name in names]
+        per_partition = [future.result() for future in futures]
+
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": [], "embeddings": []}
+        for q in range(len(queries)):
+            hits = [hit for partition_hits in per_partition for hit in partition_hits[q]]
+            best_routed = max((similarity for name, similarity, _ in hits if name not in unrouted), default=-1.0)
+            if unrouted and best_routed >= PARTITION_ROUTE_MIN_SIMILARITY:
+                merged = merge_hits(hits, n_results, unrouted=unrouted, unrouted_quota=unrouted_quota)
+            else:
+                # No route, or the routed partitions have nothing close: every partition competes alike
+                merged = merge_hits(hits, n_results)
+            results["ids"].append([hit["id"] for _, _, hit in merged])
+            results["distances"].append([1.0 - similarity for _, similarity, _ in merged])
+            results["documents"].append([hit["document"] for _, _, hit in merged])
+            results["metadatas"].append([hit["metadata"] for _, _, hit in merged])
+            results["embeddings"].append(np.asarray([hit["embedding"] for _, _, hit in merged], dtype=np.float32)
+                                         if "embeddings" in include else None)
+        for field in ("documents", "metadatas", "distances", "embeddings"):
+            if field not in include:
+                results[field] = None
+        return results
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=None) -> Dict[str, Any]:
+        include = include or ["documents", "metadatas"]
+        results = {"ids": [], "documents": [], "metadatas": [], "embeddings": []}
+        skip = offset or 0
+        remaining = limit
+        for name in sorted(self.partitions):
+            if remaining is not None and remaining <= 0:
+                break
+            store = self.partitions[name]
+            if ids is None and where is None:
+                # Plain paging: skip whole partitions by their count
+                count = self._count(name)
+                if skip >= count:
+                    skip -= count
+                    continue
+                part = store.get(limit=remaining, offset=skip, include=include)
+                skip = 0
+            else:
+                part = store.get(ids=ids, where=where, include=include)
+                rows = len(part["ids"])
+                start = min(skip, rows)
+                skip -= start
+                end = rows if remaining is None else start + remaining
+                part = {field: (values[start:end] if values is not None else None) for field, values in part.items()
+                        if field in results}
+            results["ids"].extend(part["ids"])
+            for field in ("documents", "metadatas", "embeddings"):
+                if part.get(field) is not None:
+                    results[field].extend(list(part[field]))
+            if remaining is not None:
+                remaining -= len(part["ids"])
+        for field, included in (("documents", "documents"), ("metadatas", "metadatas"), ("embeddings", "embeddings")):
+            if included not in include:
+                results[field] = None
+        return results
+
+    def memory_report(self) -> Dict[str, Any]:
+        report = {"partitions": {}}
+        for name, store in sorted(self.partitions.items()):
+            hot = self._hot.get(name)
+            report["partitions"][name] = {
+                "count": self._count(name),
+                "hot_bytes": int(hot["vectors"].nbytes) if hot else 0,
+                **(store.memory_report() if hasattr(store, "memory_report") else {}),
+            }
+        return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split the knowledge base into per-category indexes, or show them")
+    parser.add_argument("--migrate", action="store_true", help="Copy the single collection into partitions")
+    parser.add_argument("--backend", choices=["chroma", "numpy"], default=os.getenv("VECTOR_STORE_BACKEND", "chroma"))
+    args = parser.parse_args()
+
+    from vector_store import open_backend
+
+    store = PartitionedStore(args.backend, read_only=not args.migrate)
+    if args.migrate:
+        source = open_backend(args.backend, read_only=True)
+        print(f"📦 Partitioning {source.count()} chunks by {store.key}...")
+        write_collection(store, read_collection(source))
+        print("✓ Done. Set VECTOR_STORE_PARTITIONED=true to search the partitions")
+
+    for name, count in store.counts().items():
+        print(f"  {name}: {count} chunks{' (hot)' if count <= PARTITION_HOT_MAX_ROWS else ''}")
+
+
+if __name__ == "__main__":
+    main()
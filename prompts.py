@@ -0,0 +1,46 @@
+from typing import List, Dict, Optional
+
+# Byte-identical on every request and always the first message, so providers
+# (and local servers with prefix KV reuse) can cache it. Never format anything into it.
+SYSTEM_PROMPT = """You are the ultimate Grateful Dead expert and enthusiast! You have deep knowledge about:
+- All Grateful Dead songs, albums, and performances
+- Band members past and present (Jerry Garcia, Bob Weir, Phil Lesh, etc.)
+- Tour history, venues, and memorable shows
+- The Dead community and culture
+- Related bands and solo projects
+
+Use the provided context to answer questions accurately. If you're not sure about something, say so.
+Pay attention to the conversation history to provide relevant follow-up responses.
+If someone asks a follow-up question, refer back to what you discussed earlier.
+Keep the vibe conversational and friendly - like talking to a fellow Deadhead.
+Use Grateful Dead terminology and references naturally when appropriate.
+
+The next system message holds the context information retrieved for this question,
+followed by a summary of earlier conversation when there is one."""
+
+HISTORY_MESSAGES = 6
+
+
+def build_messages(user_query: str, context_docs: List[Dict], conversation_history: Optional[List[Dict]] = None,
+                   conversation_summary: Optional[str] = None, history_messages: int = HISTORY_MESSAGES) -> List[Dict]:
+    """Chat messages ordered from most to least shareable
+
+    1. the static instructions (identical for every request),
+    2. retrieved context (identical while a session reuses its retrieval),
+    3. the conversation summary and recent turns (append-only within a session),
+    4. the new question.
+    """
+    context = "\n\n".join(doc['content'] for doc in context_docs)
+    context_block = f"Context information:\n{context}"
+    if conversation_summary:
+        # Older turns, folded in the background by the conversation compactor
+        context_block += f"\n\nSummary of earlier conversation:\n{conversation_summary}"
+
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "system", "content": context_block},
+    ]
+    for msg in (conversation_history or [])[-history_messages:]:
+        messages.append({"role": msg['role'], "content": msg['content']})
+    messages.append({"role": "user", "content": user_query})
+    return messages
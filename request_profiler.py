@@ -0,0 +1,197 @@
+import os
+import re
+import sys
+import json
+import hmac
+import time
+import uuid
+import random
+import functools
+import threading
+from collections import Counter
+from typing import List, Dict, Any, Callable, Optional
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+PROFILE_NAME = re.compile(r"^[0-9]{8}T[0-9]{6}_[a-z_]+_[0-9a-f]{8}$")
+
+# Thread ident -> the sampler profiling whatever that thread is doing right now
+_active_samplers = {}
+_active_lock = threading.Lock()
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class StackSampler:
+    """Samples a request thread's Python stack on a timer and counts collapsed stacks
+
+    Pool threads doing work for the request (wrapped with `propagate`) are
+    sampled too while that work runs. Runs in its own daemon thread and only
+    reads `sys._current_frames()`, so the profiled request pays nothing
+    beyond the GIL hand-offs.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.threads = set()
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def attach(self, thread_id: int):
+        with _active_lock:
+            self.threads.add(thread_id)
+            _active_samplers[thread_id] = self
+
+    def detach(self, thread_id: int):
+        with _active_lock:
+            self.threads.discard(thread_id)
+            if _active_samplers.get(thread_id) is self:
+                del _active_samplers[thread_id]
+
+    def start(self):
+        self.attach(self.thread_id)
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        for thread_id in list(self.threads):
+            self.detach(thread_id)
+        return self.stacks
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            with _active_lock:
+                threads = list(self.threads)
+            frames = sys._current_frames()
+            for thread_id in threads:
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                # Collapsed format is root first, leaf last
+                self.stacks[";".join(reversed(stack))] += 1
+                self.samples += 1
+
+
+def propagate(fn: Callable) -> Callable:
+    """Wrap work handed to a pool thread so the calling request's profile samples it too"""
+    sampler = _active_samplers.get(threading.get_ident())
+    if sampler is None:
+        return fn
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        thread_id = threading.get_ident()
+        if thread_id == sampler.thread_id:
+            return fn(*args, **kwargs)
+        sampler.attach(thread_id)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            sampler.detach(thread_id)
+
+    return wrapper
+
+
+class RequestProfiler:
+    """Opt-in sampling profiler for API requests
+
+    A request is profiled when PROFILE_ENABLED is on and it falls in the
+    PROFILE_SAMPLE_PERCENT sample, or when it carries `X-Profile: 1` together
+    with a valid `X-Admin-Token`. Profiles are written in collapsed-stack
+    format (`frame;frame;frame count`, readable by flamegraph.pl, speedscope
+    and inferno) to a directory that keeps only the newest PROFILE_KEEP.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("PROFILE_ENABLED", "false").lower() in ("1", "true", "yes")
+        self.sample_percent = float(os.getenv("PROFILE_SAMPLE_PERCENT", 1))
+        self.interval = float(os.getenv("PROFILE_INTERVAL_MS", 5)) / 1000.0
+        self.directory = os.getenv("PROFILE_DIR", "./profiles")
+        self.keep = int(os.getenv("PROFILE_KEEP", 50))
+        self.admin_token = os.getenv("ADMIN_TOKEN", "")
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        """Whether any request could ever be profiled (if not, the hooks aren't even installed)"""
+        return self.enabled or bool(self.admin_token)
+
+    def is_admin(self, token: Optional[str]) -> bool:
+        return bool(self.admin_token) and hmac.compare_digest(token or "", self.admin_token)
+
+    def should_profile(self, headers) -> bool:
+        if headers.get("X-Profile") == "1" and self.is_admin(headers.get("X-Admin-Token")):
+            return True
+        return self.enabled and random.uniform(0, 100) < self.sample_percent
+
+    def start(self, label: str) -> Dict[str, Any]:
+        sampler = StackSampler(threading.get_ident(), self.interval)
+        sampler.start()
+        name = f"{time.strftime('%Y%m%dT%H%M%S')}_{label}_{uuid.uuid4().hex[:8]}"
+        return {"name": name, "label": label, "sampler": sampler, "started": time.perf_counter()}
+
+    def finish(self, session: Dict[str, Any], **info) -> str:
+        """Stop sampling and write the profile; returns its name"""
+        stacks = session["sampler"].stop()
+        meta = {
+            "name": session["name"],
+            "endpoint": session["label"],
+            "duration_ms": round((time.perf_counter() - session["started"]) * 1000, 1),
+            "samples": session["sampler"].samples,
+            "interval_ms": self.interval * 1000,
+            "created_at": time.time(),
+            **info,
+        }
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, session["name"])
+        with open(f"{base}.folded", "w") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        with open(f"{base}.json", "w") as f:
+            json.dump(meta, f)
+        self._rotate()
+        return session["name"]
+
+    def _rotate(self):
+        with self._lock:
+            paths = [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith(".folded")]
+            paths.sort(key=os.path.getmtime)
+            for path in paths[:max(len(paths) - self.keep, 0)]:
+                for ext in (".folded", ".json"):
+                    try:
+                        os.remove(path[:-len(".folded")] + ext)
+                    except FileNotFoundError:
+                        pass
+
+    def list_profiles(self) -> List[Dict[str, Any]]:
+        if not os.path.isdir(self.directory):
+            return []
+        profiles = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                try:
+                    with open(os.path.join(self.directory, name)) as f:
+                        profiles.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        return sorted(profiles, key=lambda meta: meta.get("created_at", 0), reverse=True)
+
+    def profile_path(self, name: str) -> Optional[str]:
+        """Path of a stored profile, or None (names are validated, never joined blindly)"""
+        if not PROFILE_NAME.match(name):
+            return None
+        path = os.path.join(self.directory, f"{name}.folded")
+        return path if os.path.exists(path) else None
@@ -0,0 +1,112 @@
+import os
+import re
+import threading
+from typing import List, Dict, Any, Optional
+import numpy as np
+
+# Continuations with nothing in them to embed ("tell me more", "why?")
+CONTENT_FREE_FOLLOW_UP = re.compile(
+    r"^(and|but|so|ok(ay)?|really)?\W*(tell me more|more|what else|anything else|any others?|go on|why|how come|"
+    r"and then|then what)\W*$"
+)
+PRONOUNS = {"it", "that", "this", "they", "them", "he", "she", "his", "her", "those", "these", "there", "its"}
+# Capitalized only because they start the sentence
+SENTENCE_STARTERS = {
+    "and", "but", "also", "so", "then", "what", "how", "who", "whom", "whose", "why", "when", "where", "which",
+    "did", "does", "do", "was", "were", "is", "are", "tell", "any", "more", "the", "a", "an", "can", "could",
+    "would", "should", "ok", "okay", "really", "yes", "no", "i", "in", "on", "at", "of", "for", "with",
+}
+
+
+def names_something_new(message: str) -> bool:
+    """A name (song, venue, album, person) or a number (year, date) that the question brings in"""
+    if re.search(r"\d", message):
+        return True
+    capitalized = re.findall(r"\b[A-Z][A-Za-z']*", message.strip())
+    if capitalized and message.strip().startswith(capitalized[0]) and capitalized[0].lower() in SENTENCE_STARTERS:
+        capitalized = capitalized[1:]
+    return any(w.lower() not in PRONOUNS and w != "I" for w in capitalized)
+
+
+def looks_like_follow_up(message: str) -> bool:
+    """Cheap heuristic: short, names nothing new, and leans on a pronoun or is a bare continuation
+
+    Openers like "and", "so" or "what about" decide nothing on their own:
+    "What about Europe '72?" is a new question, and one without a new name
+    still goes through the embedding similarity check.
+    """
+    text = message.strip()
+    lowered = text.lower()
+    words = re.findall(r"[a-z']+", lowered)
+    if not words or len(words) > 10:
+        return False
+    if names_something_new(text):
+        return False
+    if CONTENT_FREE_FOLLOW_UP.match(lowered):
+        return True
+    return bool(PRONOUNS & set(words))
+
+
+class SessionRetriever:
+    """Reuse or extend a session's previous retrieval for follow-up questions
+
+    Per-session state is a plain dict kept with the conversation:
+    {'embedding': last embedded query, 'docs': docs sent with the last turn}.
+    """
+
+    def __init__(self, chatbot, n_results: int = 5):
+        self.chatbot = chatbot
+        self.n_results = n_results
+        # Cosine similarity to the previous query above which we reuse outright,
+        # and above which we keep the old docs but add a few new ones
+        self.reuse_threshold = float(os.getenv("RETRIEVAL_REUSE_THRESHOLD", 0.8))
+        self.extend_threshold = float(os.getenv("RETRIEVAL_EXTEND_THRESHOLD", 0.5))
+        self.extend_k = int(os.getenv("RETRIEVAL_EXTEND_K", 2))
+        self.stats = {"turns": 0, "heuristic_reuse": 0, "similarity_reuse": 0, "extended": 0, "fresh": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats["turns"] += 1
+            self.stats[key] += 1
+
+    def retrieve(self, message: str, state: Dict[str, Any]) -> List[Dict]:
+        """Docs for this turn; updates `state` in place"""
+        previous_docs = state.get("docs")
+
+        if previous_docs and looks_like_follow_up(message):
+            # No embed, no query - the previous context is the best we'll get for "who wrote it?"
+            self._count("heuristic_reuse")
+            return previous_docs
+
+        embedding = np.asarray(self.chatbot.embedding_model.encode([message])[0], dtype=np.float32)
+        previous = state.get("embedding")
+        similarity = -1.0
+        if previous_docs and previous is not None:
+            denominator = float(np.linalg.norm(embedding) * np.linalg.norm(previous)) or 1.0
+            similarity = float(embedding @ previous) / denominator
+
+        if similarity >= self.reuse_threshold:
+            self._count("similarity_reuse")
+            docs = previous_docs
+        elif similarity >= self.extend_threshold:
+            self._count("extended")
+            seen = {doc["content"] for doc in previous_docs}
+            new_docs = [doc for doc in self.chatbot.search_knowledge(message, self.extend_k, embedding)
+                        if doc["content"] not in seen]
+            docs = previous_docs[:self.n_results] + new_docs
+        else:
+            self._count("fresh")
+            docs = self.chatbot.search_knowledge(message, self.n_results, embedding)
+
+        state["embedding"] = embedding
+        state["docs"] = docs
+        return docs
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+        reused = stats["heuristic_reuse"] + stats["similarity_reuse"]
+        stats["reuse_rate"] = round(reused / stats["turns"], 4) if stats["turns"] else 0.0
+        stats["extend_rate"] = round(stats["extended"] / stats["turns"], 4) if stats["turns"] else 0.0
+        return stats
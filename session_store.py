@@ -0,0 +1,167 @@
+import os
+import time
+import threading
+from collections import OrderedDict, deque
+from typing import List, Dict, Any, Optional
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Messages kept per session (older ones fall off the ring buffer)
+SESSION_MAX_MESSAGES = int(os.getenv("SESSION_MAX_MESSAGES", 20))
+# Idle sessions expire after this long
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", 7200))
+# Total estimated memory for all sessions; least recently used sessions are evicted past it
+SESSION_MEMORY_BUDGET_MB = float(os.getenv("SESSION_MEMORY_BUDGET_MB", 64))
+
+# Fixed costs per record (object header, slots, deque slot, str header), measured with sys.getsizeof
+MESSAGE_OVERHEAD = 120
+SESSION_OVERHEAD = 600
+
+
+class Message:
+    """One conversation message; integer timestamp, no per-instance dict"""
+
+    __slots__ = ("role", "content", "timestamp")
+
+    def __init__(self, role: str, content: str, timestamp: int):
+        self.role = role
+        self.content = content
+        self.timestamp = timestamp
+
+    def __getitem__(self, key: str):
+        # Prompt building and summarization read messages like dicts
+        return getattr(self, key)
+
+
+class Session:
+    """One conversation: a fixed-size ring buffer of messages plus summary and retrieval state"""
+
+    __slots__ = ("history", "summary", "retrieval", "last_activity", "nbytes")
+
+    def __init__(self, max_messages: int, now: int):
+        self.history = deque(maxlen=max_messages)
+        self.summary = None
+        self.retrieval = {}
+        self.last_activity = now
+        self.nbytes = SESSION_OVERHEAD
+
+    def measure(self) -> int:
+        """Estimated bytes held by this session"""
+        size = SESSION_OVERHEAD + len(self.summary or "")
+        size += sum(len(m.content) + MESSAGE_OVERHEAD for m in self.history)
+        embedding = self.retrieval.get("embedding")
+        if embedding is not None:
+            size += getattr(embedding, "nbytes", 0)
+        size += sum(len(doc.get("content", "")) for doc in self.retrieval.get("docs") or [])
+        return size
+
+
+class SessionStore:
+    """All conversations in one LRU, bounded by idle time and a total memory budget
+
+    The LRU order is also the last-activity order, so expired sessions are
+    always at the front: every access evicts from there until it reaches a
+    live session, which keeps expiry O(1) amortized without periodic scans.
+    """
+
+    def __init__(self, max_messages: int = SESSION_MAX_MESSAGES, ttl_seconds: int = SESSION_TTL_SECONDS,
+                 budget_bytes: int = int(SESSION_MEMORY_BUDGET_MB * 1024 * 1024)):
+        self.max_messages = max_messages
+        self.ttl_seconds = ttl_seconds
+        self.budget_bytes = budget_bytes
+        # Shared with the conversation compactor, which rewrites histories in the background
+        self.lock = threading.RLock()
+        self._sessions = OrderedDict()
+        self.total_bytes = 0
+        self.stats = {"created": 0, "expired": 0, "evicted": 0}
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def get(self, session_id: str) -> Optional[Session]:
+        """A session without touching its LRU position (for background readers)"""
+        return self._sessions.get(session_id)
+
+    def get_or_create(self, session_id: str) -> Session:
+        now = int(time.time())
+        with self.lock:
+            session = self._sessions.get(session_id)
+            if session is not None and now - session.last_activity > self.ttl_seconds:
+                self._drop(session_id)
+                self.stats["expired"] += 1
+                session = None
+            if session is None:
+                session = Session(self.max_messages, now)
+                self._sessions[session_id] = session
+                self.total_bytes += session.nbytes
+                self.stats["created"] += 1
+            else:
+                self._sessions.move_to_end(session_id)
+            session.last_activity = now
+            self._evict(now, keep=session_id)
+            return session
+
+    def append_turn(self, session_id: str, user_message: str, bot_response: str) -> Session:
+        """Record one exchange; the ring buffer drops the oldest messages in place"""
+        now = int(time.time())
+        with self.lock:
+            session = self._sessions.get(session_id) or self.get_or_create(session_id)
+            session.history.append(Message("user", user_message, now))
+            session.history.append(Message("assistant", bot_response, now))
+            session.last_activity = now
+            self._sessions.move_to_end(session_id)
+            self._remeasure(session)
+            self._evict(now, keep=session_id)
+            return session
+
+    def rewrite(self, session: Session, history: List[Message], summary: Optional[str]):
+        """Swap in a compacted history and summary"""
+        with self.lock:
+            session.history = deque(history, maxlen=self.max_messages)
+            session.summary = summary
+            self._remeasure(session)
+
+    def discard(self, session_id: str) -> bool:
+        with self.lock:
+            if session_id not in self._sessions:
+                return False
+            self._drop(session_id)
+            return True
+
+    def _remeasure(self, session: Session):
+        nbytes = session.measure()
+        self.total_bytes += nbytes - session.nbytes
+        session.nbytes = nbytes
+
+    def _drop(self, session_id: str):
+        self.total_bytes -= self._sessions.pop(session_id).nbytes
+
+    def _evict(self, now: int, keep: Optional[str] = None):
+        while self._sessions:
+            oldest_id, oldest = next(iter(self._sessions.items()))
+            if oldest_id == keep:
+                break
+            if now - oldest.last_activity > self.ttl_seconds:
+                self.stats["expired"] += 1
+            elif self.total_bytes > self.budget_bytes:
+                self.stats["evicted"] += 1
+            else:
+                break
+            self._drop(oldest_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            messages = sum(len(session.history) for session in self._sessions.values())
+            return {
+                "sessions": len(self._sessions),
+                "messages": messages,
+                "estimated_bytes": self.total_bytes,
+                "budget_bytes": self.budget_bytes,
+                "budget_used": round(self.total_bytes / self.budget_bytes, 4) if self.budget_bytes else None,
+                **self.stats,
+            }
@@ -0,0 +1,337 @@
+import os
+import re
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+from index_config import KNOWLEDGE_DB_PATH
+from store_log import LoggedStore
+from fact_store import normalize_date, parse_question_range, int_to_date, _normalize_name, _full_year
+
+SHOW_CATALOG_FILE = "show_catalog.npz"
+SOURCES = ["archive_show", "setlist_data"]
+
+AGGREGATE_QUESTION = re.compile(
+    r"\b(how many|number of|count|every|all (the|of the)?\s*shows?|list (the|all)?\s*shows?|which shows|"
+    r"what shows|shows (in|at|during|from|between))\b"
+)
+
+
+def date_to_int(value: str) -> Optional[int]:
+    """yyyymmdd integer from any date format the scrapers produce"""
+    date = normalize_date(value)
+    return int(date.replace("-", "")) if date else None
+
+
+class ShowCatalog(LoggedStore):
+    """Compact columnar catalog of shows for range counts and venue lookups
+
+    One row per show date. Dates are yyyymmdd int32 kept
+    sorted, so a date range is two binary searches. Venues and cities are
+    interned to int32 ids; a second permutation sorted by (venue, date)
+    answers "every Winterland show" the same way.
+
+    `show_catalog.npz` is the compacted base; shows added and removed since
+    are appended to its log (see store_log.LoggedStore). Writes only update
+    the counts of existing rows and collect new dates on the side; the next
+    query merges them into the sorted columns in one pass.
+    """
+
+    label = "show catalog"
+
+    def __init__(self, db_path: str = KNOWLEDGE_DB_PATH):
+        self._lock = threading.Lock()
+        self._open(os.path.join(db_path, SHOW_CATALOG_FILE))
+
+    def _reset(self):
+        # Id 0 is "unknown" for both venues and cities
+        self.venues = [""]
+        self.cities = [""]
+        self._set_columns(*(np.zeros(0, dtype=dtype) for dtype in (np.int32, np.int32, np.int32, np.int8, np.int32)))
+
+    def _read_base(self, path: str):
+        with np.load(path) as data:
+            self.venues = data["venues"].tolist()
+            self.cities = data["cities"].tolist()
+            # Catalogs written before per-row document counts had one document per show
+            documents = data["documents"] if "documents" in data.files else np.ones(len(data["dates"]))
+            self._set_columns(data["dates"], data["venue_ids"], data["city_ids"], data["sources"], documents)
+
+    def _write_base(self, path: str):
+        self._merge()
+        with open(path, "wb") as f:
+            np.savez(f, dates=self.dates, venue_ids=self.venue_ids, city_ids=self.city_ids, sources=self.sources,
+                     documents=self.documents, venues=np.array(self.venues, dtype=str),
+                     cities=np.array(self.cities, dtype=str))
+
+    def _apply(self, record: Dict[str, Any]):
+        for show in record.get("add", []):
+            self._add_show(show)
+        for show in record.get("remove", []):
+            self._remove_show(show)
+
+    def _size(self) -> int:
+        return len(self.dates) + len(self._pending)
+
+    def _set_columns(self, dates, venue_ids, city_ids, sources, documents):
+        order = np.argsort(dates, kind="stable")
+        self.dates = np.ascontiguousarray(dates[order], dtype=np.int32)
+        self.venue_ids = np.ascontiguousarray(venue_ids[order], dtype=np.int32)
+        self.city_ids = np.ascontiguousarray(city_ids[order], dtype=np.int32)
+        self.sources = np.ascontiguousarray(sources[order], dtype=np.int8)
+        # Documents behind each row; the row goes when the last of them is deleted
+        self.documents = np.ascontiguousarray(documents[order], dtype=np.int32)
+        # Rows grouped by venue, dates ascending within each venue
+        self.venue_order = np.lexsort((self.dates, self.venue_ids))
+        self.venue_sorted = self.venue_ids[self.venue_order]
+
+        self._venue_index = {name: i for i, name in enumerate(self.venues)}
+        self._venue_names = {i: _normalize_name(name) for i, name in enumerate(self.venues) if name}
+        self._city_index = {name: i for i, name in enumerate(self.cities)}
+        # Dates written since the columns were sorted: date -> [venue_id, city_id, source, documents]
+        self._pending = {}
+        # Whether a written row lost its last document or gained a venue, so the columns need rebuilding
+        self._dirty = False
+
+    def _merge(self):
+        """Sort pending dates into the columns and drop rows without documents (caller holds `_lock`)"""
+        if not self._pending and not self._dirty:
+            return
+        new = np.array([[date, *row] for date, row in self._pending.items()], dtype=np.int32).reshape(-1, 5).T
+        keep = self.documents > 0
+        self._set_columns(
+            np.concatenate([self.dates[keep], new[0]]),
+            np.concatenate([self.venue_ids[keep], new[1]]),
+            np.concatenate([self.city_ids[keep], new[2]]),
+            np.concatenate([self.sources[keep], new[3].astype(np.int8)]),
+            np.concatenate([self.documents[keep], new[4]]),
+        )
+
+    def _current(self):
+        """Pick up other processes' writes and merge pending rows, before a query"""
+        self.refresh()
+        if self._pending or self._dirty:
+            with self._lock:
+                self._merge()
+
+    def __len__(self) -> int:
+        self._current()
+        return len(self.dates)
+
+    @staticmethod
+    def _intern(name: str, values: List[str], index: Dict[str, int]) -> int:
+        if name not in index:
+            index[name] = len(values)
+            values.append(name)
+        return index[name]
+
+    def _row_for(self, date: int) -> Optional[int]:
+        """Sorted row of a date that still has documents"""
+        row = int(np.searchsorted(self.dates, date))
+        return row if row < len(self.dates) and self.dates[row] == date and self.documents[row] > 0 else None
+
+    def _add_show(self, show: Dict[str, Any]):
+        venue_id = self._intern(show["venue"], self.venues, self._venue_index)
+        city_id = self._intern(show["city"], self.cities, self._city_index)
+        pending = self._pending.get(show["date"])
+        if pending is not None:
+            pending[0] = pending[0] or venue_id
+            pending[1] = pending[1] or city_id
+            pending[3] += 1
+            return
+        row = self._row_for(show["date"])
+        if row is None:
+            source = SOURCES.index(show["type"]) if show["type"] in SOURCES else -1
+            self._pending[show["date"]] = [venue_id, city_id, source, 1]
+            return
+        self.documents[row] += 1
+        if venue_id and not self.venue_ids[row]:
+            self.venue_ids[row] = venue_id
+            self._dirty = True
+        if city_id and not self.city_ids[row]:
+            self.city_ids[row] = city_id
+
+    def _remove_show(self, show: Dict[str, Any]):
+        pending = self._pending.get(show["date"])
+        if pending is not None:
+            pending[3] -= 1
+            if pending[3] <= 0:
+                del self._pending[show["date"]]
+            return
+        row = self._row_for(show["date"])
+        if row is not None:
+            self.documents[row] -= 1
+            self._dirty = self._dirty or not self.documents[row]
+
+    @staticmethod
+    def _shows(documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """The show records (date, venue, city, source type) among document metadata dicts"""
+        shows = []
+        for doc in documents:
+            date = date_to_int(doc.get("date", "")) if doc.get("category") == "shows" else None
+            if date is None:
+                continue
+            venue = doc.get("venue") if doc.get("venue") != "Unknown Venue" else ""
+            shows.append({"date": date, "venue": venue or "", "city": doc.get("city") or "",
+                          "type": doc.get("type") or ""})
+        return shows
+
+    def add_documents(self, documents: List[Dict[str, Any]]):
+        """Catalog the shows among newly ingested documents (metadata dicts)
+
+        One row per date: archive.org tapes and setlist.fm entries for the same
+        night merge, each filling in the venue or city the other lacks.
+        """
+        shows = self._shows(documents)
+        if shows:
+            with self._lock:
+                self._commit([{"add": shows}])
+
+    def remove_documents(self, documents: List[Dict[str, Any]]):
+        """Drop the shows of deleted documents (metadata dicts) once no other document covers that date
+
+        A row that survives keeps the venue and city it has.
+        """
+        shows = self._shows(documents)
+        if shows:
+            with self._lock:
+                self._commit([{"remove": shows}])
+
+    def rebuild(self, collection, batch_size: int = 5000):
+        """Rebuild from the metadata already in a vector store"""
+        with self._lock:
+            self._reset()
+            seen = set()
+            for offset in range(0, collection.count(), batch_size):
+                batch = collection.get(limit=batch_size, offset=offset, include=["metadatas"])
+                parents = []
+                for doc_id, metadata in zip(batch["ids"], batch["metadatas"]):
+                    metadata = metadata or {}
+                    # Every chunk carries its parent's metadata; count each parent once
+                    parent_id = metadata.get("parent_id", doc_id)
+                    if parent_id not in seen:
+                        seen.add(parent_id)
+                        parents.append(metadata)
+                for show in self._shows(parents):
+                    self._add_show(show)
+            self._rewrite()
+
+    # Queries
+
+    def _range(self, start: Optional[int], end: Optional[int]) -> slice:
+        lo = 0 if start is None else int(np.searchsorted(self.dates, start, side="left"))
+        hi = len(self.dates) if end is None else int(np.searchsorted(self.dates, end, side="right"))
+        return slice(lo, hi)
+
+    def _rows(self, rows) -> List[Dict[str, Any]]:
+        return [{
+            "date": int_to_date(self.dates[i]),
+            "venue": self.venues[self.venue_ids[i]] or None,
+            "city": self.cities[self.city_ids[i]] or None,
+        } for i in rows]
+
+    def match_venues(self, name: str) -> List[int]:
+        """Venue ids whose normalized name contains `name` ('winterland' -> 'Winterland Arena')"""
+        self._current()
+        needle = _normalize_name(name)
+        if not needle:
+            return []
+        return [i for i, venue in self._venue_names.items() if needle in venue]
+
+    def _venue_rows(self, venue_id: int, start: Optional[int], end: Optional[int]) -> np.ndarray:
+        lo = np.searchsorted(self.venue_sorted, venue_id, side="left")
+        hi = np.searchsorted(self.venue_sorted, venue_id, side="right")
+        rows = self.venue_order[lo:hi]
+        dates = self.dates[rows]
+        first = 0 if start is None else np.searchsorted(dates, start, side="left")
+        last = len(rows) if end is None else np.searchsorted(dates, end, side="right")
+        return rows[first:last]
+
+    def count_shows(self, start: Optional[str] = None, end: Optional[str] = None) -> int:
+        """Number of shows between two dates (inclusive, any format normalize_date accepts)"""
+        self._current()
+        window = self._range(date_to_int(start) if start else None, date_to_int(end) if end else None)
+        return window.stop - window.start
+
+    def shows_between(self, start: Optional[str] = None, end: Optional[str] = None,
+                      limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        self._current()
+        window = self._range(date_to_int(start) if start else None, date_to_int(end) if end else None)
+        stop = window.stop if limit is None else min(window.stop, window.start + limit)
+        return self._rows(range(window.start, stop))
+
+    def shows_at_venue(self, venue: str, start: Optional[str] = None, end: Optional[str] = None) -> List[Dict[str, Any]]:
+        start = date_to_int(start) if start else None
+        end = date_to_int(end) if end else None
+        rows = [self._venue_rows(venue_id, start, end) for venue_id in self.match_venues(venue)]
+        rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+        return self._rows(rows[np.argsort(self.dates[rows], kind="stable")])
+
+    def counts_by_year(self, start: Optional[str] = None, end: Optional[str] = None) -> Dict[int, int]:
+        self._current()
+        window = self._range(date_to_int(start) if start else None, date_to_int(end) if end else None)
+        years = self.dates[window] // 10000
+        values, counts = np.unique(years, return_counts=True)
+        return dict(zip(values.tolist(), counts.tolist()))
+
+    def top_venues(self, n: int = 10, start: Optional[str] = None, end: Optional[str] = None) -> List[Tuple[str, int]]:
+        self._current()
+        window = self._range(date_to_int(start) if start else None, date_to_int(end) if end else None)
+        counts = np.bincount(self.venue_ids[window], minlength=len(self.venues))
+        top = [i for i in np.argsort(counts)[::-1][:n + 1] if i and counts[i]][:n]
+        return [(self.venues[i], int(counts[i])) for i in top]
+
+    def _question_venue(self, question: str) -> Optional[str]:
+        """Longest known venue word sequence mentioned in the question"""
+        text = f" {_normalize_name(question)} "
+        best = None
+        for name in set(self._venue_names.values()):
+            for candidate in (name, name.split(" ")[0]):
+                if len(candidate) > 4 and f" {candidate} " in text and (best is None or len(candidate) > len(best)):
+                    best = candidate
+        return best
+
+    def describe_for_question(self, question: str, max_dates: int = 15) -> Optional[str]:
+        """Catalog aggregates relevant to a counting/listing question, as prompt context"""
+        if not len(self) or not AGGREGATE_QUESTION.search(question.lower()):
+            return None
+
+        bounds = parse_question_range(question)
+        start, end = bounds if bounds else (None, None)
+        venue = self._question_venue(question)
+        if bounds is None and venue is None:
+            return None
+
+        period = f"between {int_to_date(start)} and {int_to_date(end)}" if bounds else "in the catalog"
+        if venue:
+            start_s = int_to_date(start) if bounds else None
+            end_s = int_to_date(end) if bounds else None
+            shows = self.shows_at_venue(venue, start_s, end_s)
+            names = sorted({show["venue"] for show in shows if show["venue"]})
+            lines = [f"Show catalog: {len(shows)} shows at {', '.join(names) or venue} {period}."]
+            if shows:
+                dates = [show["date"] for show in shows]
+                more = f" (+{len(dates) - max_dates} more)" if len(dates) > max_dates else ""
+                lines.append(f"Dates: {', '.join(dates[:max_dates])}{more}.")
+            return " ".join(lines)
+
+        window = self._range(start, end)
+        lines = [f"Show catalog: {window.stop - window.start} shows {period}."]
+        by_year = self.counts_by_year(int_to_date(start), int_to_date(end))
+        if len(by_year) > 1:
+            lines.append("By year: " + ", ".join(f"{year}: {count}" for year, count in by_year.items()) + ".")
+        top = self.top_venues(5, int_to_date(start), int_to_date(end))
+        if top:
+            lines.append("Most played venues: " + ", ".join(f"{name} ({count})" for name, count in top) + ".")
+        return " ".join(lines)
+
+    def get_stats(self) -> Dict[str, Any]:
+        self._current()
+        return {
+            "shows": len(self),
+            "venues": len(self.venues) - 1,
+            "cities": len(self.cities) - 1,
+            "first_show": int_to_date(self.dates[0]) if len(self) else None,
+            "last_show": int_to_date(self.dates[-1]) if len(self) else None,
+            "bytes": int(sum(a.nbytes for a in (self.dates, self.venue_ids, self.city_ids, self.sources,
+                                                 self.documents, self.venue_order, self.venue_sorted))),
+        }
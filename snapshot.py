@@ -0,0 +1,244 @@
+import os
+import io
+import json
+import time
+import hashlib
+import argparse
+from typing import List, Dict, Any, Optional
+import numpy as np
+from dotenv import load_dotenv
+from index_config import EMBEDDING_MODEL_NAME, read_collection, write_collection
+from vector_store import create_vector_store, pack_strings, StringColumn
+from chunking import ParentDocumentStore
+from dedup import NUM_PERMUTATIONS, NearDuplicateIndex
+from store_log import refuse_if_served
+
+# Load environment variables
+load_dotenv()
+
+SNAPSHOT_FORMAT = "grateful-dead-kb-snapshot"
+SNAPSHOT_VERSION = 3
+FINGERPRINT_PROBE = "Jerry Garcia played Dark Star at Barton Hall"
+
+
+def model_fingerprint(model, name: str = EMBEDDING_MODEL_NAME) -> Dict[str, Any]:
+    """Identify an embedding model by name, dimension and a probe embedding"""
+    probe = np.asarray(model.encode([FINGERPRINT_PROBE]), dtype=np.float32)[0]
+    # Round so the same model on different hardware/BLAS still matches
+    probe_hash = hashlib.sha256(np.round(probe, 4).tobytes()).hexdigest()
+    return {
+        "name": name,
+        "dim": int(probe.shape[0]),
+        "probe_sha256": probe_hash,
+    }
+
+
+def _checksum(arrays: Dict[str, np.ndarray]) -> str:
+    """SHA-256 over every array in name order"""
+    digest = hashlib.sha256()
+    for name in sorted(arrays):
+        digest.update(name.encode("utf-8"))
+        digest.update(np.ascontiguousarray(arrays[name]).tobytes())
+    return digest.hexdigest()
+
+
+def export_snapshot(store, path: str, fingerprint: Dict[str, Any], dtype: str = "float32", batch_size: int = 5000,
+                    parent_store=None, dedup_index=None) -> Dict[str, Any]:
+    """Write every document, metadata and embedding in a store to one snapshot file
+
+    Chunks are only useful together with their parent documents (retrieval
+    expands hits to parents) and the near-duplicate signatures, so those go
+    into the same file when given.
+    """
+    data = read_collection(store, batch_size)
+    metadatas = [m or {} for m in data["metadatas"]]
+    keys = sorted({key for metadata in metadatas for key in metadata})
+
+    arrays = {"embeddings": np.ascontiguousarray(data["embeddings"], dtype=dtype)}
+
+    def add_column(name, values):
+        arrays[f"{name}.data"], arrays[f"{name}.offsets"] = pack_strings(values)
+
+    add_column("ids", data["ids"])
+    add_column("documents", [d or "" for d in data["documents"]])
+    for i, key in enumerate(keys):
+        add_column(f"meta.{i}", [json.dumps(m[key]) if key in m else "" for m in metadatas])
+
+    parents = dict(parent_store.parents) if parent_store is not None else {}
+    add_column("parents.ids", list(parents))
+    add_column("parents.content", [parent["content"] for parent in parents.values()])
+    add_column("parents.metadata", [json.dumps(parent["metadata"]) for parent in parents.values()])
+
+    if dedup_index is not None:
+        dedup_ids, signatures, dedup_keys = dedup_index.entries()
+    else:
+        dedup_ids, signatures, dedup_keys = [], np.zeros((0, NUM_PERMUTATIONS), np.uint64), []
+    add_column("dedup.ids", dedup_ids)
+    add_column("dedup.keys", dedup_keys)
+    arrays["dedup.signatures"] = signatures
+
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "version": SNAPSHOT_VERSION,
+        "created_at": time.time(),
+        "count": len(data["ids"]),
+        "dim": int(arrays["embeddings"].shape[1]) if data["ids"] else fingerprint.get("dim"),
+        "dtype": np.dtype(dtype).name,
+        "metadata_keys": keys,
+        "parents": len(parents),
+        "dedup_signatures": len(dedup_ids),
+        "model": fingerprint,
+        "checksum": _checksum(arrays),
+    }
+    arrays["manifest"] = np.frombuffer(json.dumps(manifest).encode("utf-8"), dtype=np.uint8)
+
+    # Write next to the target and rename, so a crash never leaves half a snapshot
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez_compressed(f, **arrays)
+    os.replace(tmp_path, path)
+    return manifest
+
+
+def read_snapshot(path: str) -> Dict[str, Any]:
+    """Load and verify a snapshot file"""
+    with open(path, "rb") as f:
+        archive = np.load(io.BytesIO(f.read()))
+        arrays = {name: archive[name] for name in archive.files}
+
+    manifest = json.loads(arrays.pop("manifest").tobytes().decode("utf-8"))
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"{path} is not a knowledge base snapshot")
+    if manifest.get("version", 0) > SNAPSHOT_VERSION:
+        raise ValueError(f"Snapshot version {manifest['version']} is newer than supported ({SNAPSHOT_VERSION})")
+    if _checksum(arrays) != manifest["checksum"]:
+        raise ValueError(f"Checksum mismatch - {path} is corrupt")
+
+    def column(name):
+        return StringColumn(arrays[f"{name}.data"], arrays[f"{name}.offsets"]).to_list()
+
+    ids = column("ids")
+    metadatas = [{} for _ in ids]
+    for i, key in enumerate(manifest["metadata_keys"]):
+        for row, raw in enumerate(column(f"meta.{i}")):
+            if raw:
+                metadatas[row][key] = json.loads(raw)
+
+    snapshot = {
+        "manifest": manifest,
+        "ids": ids,
+        "documents": column("documents"),
+        "metadatas": metadatas,
+        "embeddings": np.asarray(arrays["embeddings"], dtype=np.float32),
+        "parents": [],
+        "dedup_ids": [],
+        "dedup_signatures": np.zeros((0, NUM_PERMUTATIONS), np.uint64),
+        "dedup_keys": None,
+    }
+    # Version 1 snapshots only hold the vector collection
+    if "parents.ids.data" in arrays:
+        snapshot["parents"] = [
+            {"id": parent_id, "content": content, "metadata": json.loads(metadata)}
+            for parent_id, content, metadata in zip(column("parents.ids"), column("parents.content"),
+                                                    column("parents.metadata"))
+        ]
+        snapshot["dedup_ids"] = column("dedup.ids")
+        snapshot["dedup_signatures"] = arrays["dedup.signatures"]
+    # Version 2 snapshots have signatures without record keys
+    if "dedup.keys.data" in arrays:
+        snapshot["dedup_keys"] = column("dedup.keys")
+    return snapshot
+
+
+def check_fingerprint(manifest: Dict[str, Any], fingerprint: Dict[str, Any]) -> List[str]:
+    """Differences between the snapshot's model and the one we serve with"""
+    problems = []
+    snapshot_model = manifest.get("model", {})
+    for key in ("name", "dim", "probe_sha256"):
+        if key in fingerprint and snapshot_model.get(key) != fingerprint[key]:
+            problems.append(f"{key}: snapshot has {snapshot_model.get(key)!r}, expected {fingerprint[key]!r}")
+    return problems
+
+
+def import_snapshot(path: str, store, batch_size: Optional[int] = None, fingerprint: Optional[Dict[str, Any]] = None,
+                    parent_store=None, dedup_index=None) -> Dict[str, Any]:
+    """Bulk-load a snapshot into a store (and its parent documents and signatures) without re-embedding anything"""
+    snapshot = read_snapshot(path)
+    manifest = snapshot["manifest"]
+
+    if fingerprint:
+        problems = check_fingerprint(manifest, fingerprint)
+        if problems:
+            raise ValueError("Snapshot was built with a different embedding model: " + "; ".join(problems))
+
+    if batch_size is None:
+        # One batch becomes the flat index's compacted base directly, instead of a pile of segments
+        batch_size = max(len(snapshot["ids"]), 1) if getattr(store, "backend", None) == "numpy" else 5000
+
+    write_collection(store, snapshot, batch_size)
+    if parent_store is not None and snapshot["parents"]:
+        parent_store.add(snapshot["parents"])
+    if dedup_index is not None and snapshot["dedup_ids"]:
+        dedup_index.add_signatures(snapshot["dedup_ids"], snapshot["dedup_signatures"], snapshot["dedup_keys"])
+    if not snapshot["parents"] and snapshot["ids"]:
+        print("⚠️ Snapshot has no parent documents - retrieval will return raw chunks")
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or import a knowledge base snapshot")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Write the knowledge base to a snapshot file")
+    export_parser.add_argument("path")
+    export_parser.add_argument("--dtype", choices=["float32", "float16"], default="float32")
+
+    import_parser = subparsers.add_parser("import", help="Load a snapshot into an empty knowledge base")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--batch-size", type=int, default=None)
+    import_parser.add_argument("--force", action="store_true", help="Import even if the store is not empty")
+    import_parser.add_argument("--verify-model", action="store_true",
+                               help="Load the embedding model and compare its fingerprint")
+    args = parser.parse_args()
+
+    store = create_vector_store(read_only=False)
+    parent_store = ParentDocumentStore()
+    dedup_index = NearDuplicateIndex()
+
+    if args.command == "export":
+        from sentence_transformers import SentenceTransformer
+        fingerprint = model_fingerprint(SentenceTransformer(EMBEDDING_MODEL_NAME))
+        print(f"📦 Exporting {store.count()} documents to {args.path}...")
+        start = time.perf_counter()
+        manifest = export_snapshot(store, args.path, fingerprint, dtype=args.dtype,
+                                   parent_store=parent_store, dedup_index=dedup_index)
+        size_mb = os.path.getsize(args.path) / 1e6
+        print(f"✓ Exported {manifest['count']} documents and {manifest['parents']} parent documents "
+              f"({size_mb:.1f} MB) in {time.perf_counter() - start:.1f}s")
+        return
+
+    refuse_if_served()
+    if store.count() and not args.force:
+        print(f"❌ Knowledge base already has {store.count()} documents (use --force to import anyway)")
+        return
+
+    if args.verify_model:
+        from sentence_transformers import SentenceTransformer
+        fingerprint = model_fingerprint(SentenceTransformer(EMBEDDING_MODEL_NAME))
+    else:
+        fingerprint = {"name": EMBEDDING_MODEL_NAME}
+
+    print(f"📥 Importing {args.path}...")
+    start = time.perf_counter()
+    try:
+        manifest = import_snapshot(args.path, store, args.batch_size, fingerprint,
+                                   parent_store=parent_store, dedup_index=dedup_index)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return
+    print(f"✓ Imported {manifest['count']} documents and {manifest.get('parents', 0)} parent documents "
+          f"in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+import os
+import gzip
+import json
+import time
+import uuid
+import argparse
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Iterator, Optional
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# orjson is several times faster for the read-heavy re-embed path; json works too
+try:
+    import orjson
+
+    def _dumps(record: Dict[str, Any]) -> str:
+        return orjson.dumps(record).decode("utf-8")
+
+    _loads = orjson.loads
+except ImportError:
+    _dumps = json.dumps
+    _loads = json.loads
+
+STAGING_ENABLED = os.getenv("STAGING_ENABLED", "true").lower() in ("1", "true", "yes")
+STAGING_DIR = os.getenv("STAGING_DIR", "./dead_staging")
+# Documents per shard before the writer starts a new one
+STAGING_SHARD_DOCUMENTS = int(os.getenv("STAGING_SHARD_DOCUMENTS", 5000))
+SHARD_SUFFIX = ".jsonl.gz"
+
+
+class StagingWriter:
+    """Append-only writer of gzip-compressed JSONL shards for one source
+
+    Each line is {"source", "fetched_at", "fetch": {...}, "document": {...}}.
+    Shards are written as `.part` files and renamed when complete, so readers
+    never see a half-written shard, and existing shards are never modified.
+    """
+
+    def __init__(self, source: str, staging_dir: str = STAGING_DIR, shard_documents: int = STAGING_SHARD_DOCUMENTS):
+        self.source = source
+        self.directory = os.path.join(staging_dir, source)
+        self.shard_documents = shard_documents
+        self.shards = []
+        self.documents = 0
+        self._file = None
+        self._path = None
+        self._count = 0
+        # Unique per writer, so writers in the same second never collide
+        self._prefix = f"{time.strftime('%Y%m%dT%H%M%S')}_{os.getpid()}_{uuid.uuid4().hex[:8]}"
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{self._prefix}_{len(self.shards):04d}{SHARD_SUFFIX}"
+        self._path = os.path.join(self.directory, name)
+        self._file = gzip.open(f"{self._path}.part", "wt", encoding="utf-8")
+        self._count = 0
+
+    def _finish(self):
+        if self._file is None:
+            return
+        self._file.close()
+        os.replace(f"{self._path}.part", self._path)
+        self.shards.append(self._path)
+        self._file = None
+
+    def write(self, documents: List[Dict[str, Any]], **fetch) -> int:
+        """Append documents with fetch metadata (url, api, query...); returns how many were written"""
+        fetched_at = int(time.time())
+        for doc in documents:
+            if self._file is None:
+                self._open()
+            self._file.write(_dumps({"source": self.source, "fetched_at": fetched_at, "fetch": fetch, "document": doc}) + "\n")
+            self._count += 1
+            self.documents += 1
+            if self._count >= self.shard_documents:
+                self._finish()
+        return len(documents)
+
+    def close(self):
+        self._finish()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def stage_documents(source: str, documents: List[Dict[str, Any]], staging_dir: str = STAGING_DIR, **fetch) -> List[str]:
+    """Write one fetch's documents to new shards; returns the shard paths"""
+    if not documents:
+        return []
+    with StagingWriter(source, staging_dir) as writer:
+        writer.write(documents, **fetch)
+    return writer.shards
+
+
+def stage_fetched(source: str, documents: List[Dict[str, Any]], **fetch) -> List[Dict[str, Any]]:
+    """Keep a raw copy of a scraper's fetch when staging is on; returns the documents either way
+
+    A staging failure is reported and otherwise ignored - it must not lose the fetch.
+    """
+    if STAGING_ENABLED and documents:
+        try:
+            stage_documents(source, documents, **fetch)
+        except Exception as e:
+            print(f"⚠️ Could not stage {source} documents: {e}")
+    return documents
+
+
+@contextmanager
+def retry_from_staging_hint():
+    """Wrap the write of freshly scraped documents: if it fails, say how to retry without re-scraping"""
+    try:
+        yield
+    except Exception:
+        if STAGING_ENABLED:
+            print("💾 The fetched documents are staged; run `python staging.py ingest` to retry without re-scraping")
+        raise
+
+
+def list_shards(staging_dir: str = STAGING_DIR, sources: Optional[List[str]] = None) -> List[str]:
+    """Complete shards, oldest first within each source"""
+    if not os.path.isdir(staging_dir):
+        return []
+    shards = []
+    for source in sorted(sources or os.listdir(staging_dir)):
+        directory = os.path.join(staging_dir, source)
+        if os.path.isdir(directory):
+            shards.extend(os.path.join(directory, name) for name in sorted(os.listdir(directory))
+                          if name.endswith(SHARD_SUFFIX))
+    return shards
+
+
+def read_shard(path: str) -> List[Dict[str, Any]]:
+    with gzip.open(path, "rb") as f:
+        return [_loads(line) for line in f if line.strip()]
+
+
+def iter_staged_documents(staging_dir: str = STAGING_DIR, sources: Optional[List[str]] = None,
+                          since: Optional[float] = None, readers: int = 4) -> Iterator[Dict[str, Any]]:
+    """Stream staged documents in shard order, tagged with their source
+
+    Up to `readers` shards are decompressed and parsed at once (zlib releases
+    the GIL); documents still come out in order.
+    """
+    shards = deque(list_shards(staging_dir, sources))
+    with ThreadPoolExecutor(max_workers=max(1, readers)) as pool:
+        # At most `readers` shards in memory ahead of the consumer
+        pending = deque(pool.submit(read_shard, shards.popleft()) for _ in range(min(readers, len(shards))))
+        while pending:
+            records = pending.popleft().result()
+            if shards:
+                pending.append(pool.submit(read_shard, shards.popleft()))
+            for record in records:
+                if since and record["fetched_at"] < since:
+                    continue
+                doc = dict(record["document"])
+                doc.setdefault("source", record["source"])
+                yield doc
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect staged documents or (re-)ingest them without re-scraping")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="Shards and document counts per source")
+    ingest_parser = subparsers.add_parser("ingest", help="Chunk, embed and write staged documents")
+    ingest_parser.add_argument("--sources", nargs="+", help="Only these sources (default: all)")
+    ingest_parser.add_argument("--since", type=float, help="Only documents fetched at or after this Unix time")
+    ingest_parser.add_argument("--workers", type=int, default=None, help="Embedding processes (default: cores / threads)")
+    ingest_parser.add_argument("--threads-per-worker", type=int, default=1)
+    ingest_parser.add_argument("--group-documents", type=int, default=STAGING_SHARD_DOCUMENTS,
+                               help="Documents per chunk/embed/write round")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        totals = {}
+        for path in list_shards():
+            source = os.path.basename(os.path.dirname(path))
+            count, size = totals.get(source, (0, 0))
+            totals[source] = (count + len(read_shard(path)), size + os.path.getsize(path))
+        for source, (count, size) in totals.items():
+            print(f"  {source}: {count} documents, {size / 1024 / 1024:.1f} MB compressed")
+        if not totals:
+            print(f"No staged documents in {STAGING_DIR}")
+        return
+
+    from bulk_embed import BulkEmbedder, bulk_ingest, open_local_writer
+
+    write_chunks, dedup_index = open_local_writer()
+    embedder = BulkEmbedder(args.workers, args.threads_per_worker)
+    print(f"🧠 Ingesting staged documents with {embedder.workers} embedding workers...")
+    start = time.perf_counter()
+    documents = chunks = 0
+    group = []
+
+    def flush():
+        nonlocal documents, chunks, group
+        if group:
+            report = bulk_ingest(group, write_chunks, embedder, dedup_index=dedup_index)
+            documents += report["documents"]
+            chunks += report["chunks"]
+            group = []
+
+    try:
+        for doc in iter_staged_documents(sources=args.sources, since=args.since):
+            group.append(doc)
+            if len(group) >= args.group_documents:
+                flush()
+        flush()
+    finally:
+        embedder.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"✓ Wrote {chunks} chunks from {documents} documents in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
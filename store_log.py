@@ -0,0 +1,230 @@
+import os
+import glob
+import json
+from typing import List, Dict, Any, Optional
+from filelock import FileLock, Timeout
+from dotenv import load_dotenv
+from index_config import KNOWLEDGE_DB_PATH
+
+# Load environment variables
+load_dotenv()
+
+# Fold a store's change log into its base file once the log holds this many records per item of state (and the minimum)
+STORE_COMPACT_RATIO = float(os.getenv("STORE_COMPACT_RATIO", 0.5))
+STORE_COMPACT_MIN_RECORDS = int(os.getenv("STORE_COMPACT_MIN_RECORDS", 1000))
+LOG_SUFFIX = ".log.jsonl"
+LOCK_SUFFIX = ".lock"
+SERVER_LOCK_PREFIX = "server-"
+
+
+def hold_server_lock(db_path: str = KNOWLEDGE_DB_PATH) -> FileLock:
+    """Mark the stores under `db_path` as open in this server process until it exits
+
+    Keep the returned lock referenced for the life of the process.
+    """
+    os.makedirs(db_path, exist_ok=True)
+    lock = FileLock(os.path.join(db_path, f"{SERVER_LOCK_PREFIX}{os.getpid()}{LOCK_SUFFIX}"))
+    lock.acquire()
+    return lock
+
+
+def serving_pids(db_path: str = KNOWLEDGE_DB_PATH) -> List[int]:
+    """Pids of the server processes that have the stores under `db_path` open; stale lock files are removed"""
+    pids = []
+    for path in glob.glob(os.path.join(db_path, f"{SERVER_LOCK_PREFIX}*{LOCK_SUFFIX}")):
+        lock = FileLock(path)
+        try:
+            lock.acquire(timeout=0)
+        except Timeout:
+            pids.append(int(os.path.basename(path)[len(SERVER_LOCK_PREFIX):-len(LOCK_SUFFIX)]))
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        lock.release()
+    return sorted(pids)
+
+
+def refuse_if_served(db_path: str = KNOWLEDGE_DB_PATH):
+    """Exit when a server has the stores open, before a CLI writes to them behind its back"""
+    pids = serving_pids(db_path)
+    if pids:
+        raise SystemExit(f"❌ {db_path} is open in a running server (pid {', '.join(map(str, pids))}). "
+                         f"Stop it first, or ingest through it with POST /knowledge/ingest")
+
+
+class LoggedStore:
+    """Base for stores kept in memory and persisted as a base file plus an append-only change log
+
+    A write appends its change records to `<file>.log.jsonl`, so it costs
+    the size of the batch, not of the store. Once the log outgrows
+    STORE_COMPACT_RATIO of the state (and STORE_COMPACT_MIN_RECORDS), the
+    state is written to a new base and the log starts over.
+
+    Every process with the store open shares it through a file lock: a write
+    first applies whatever other processes appended since it last looked, and
+    reads pick those changes up too, so one process never overwrites
+    another's. Records are operations ("add these", "delete those") that
+    `_apply` replays against the current state.
+
+    Subclasses set `_lock` and `label`, call `_open(path)`, and implement
+    `_reset`, `_read_base`, `_write_base`, `_apply` and `_size`.
+    """
+
+    label = "store"
+
+    def _open(self, path: Optional[str], persist: bool = True):
+        # path=None keeps the store in memory only; persist=False loads it but never writes it back
+        self.path = path
+        self.persist = persist and path is not None
+        self.log_path = f"{path}{LOG_SUFFIX}" if path else None
+        self._file_lock = FileLock(f"{path}{LOCK_SUFFIX}") if path else None
+        # (inode, bytes applied) of the log, and the base file's mtime, as last seen
+        self._log_file = None
+        self._base_mtime = None
+        self._log_records = 0
+        self._reset()
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with self._file_lock:
+                self._reload()
+
+    # Subclass hooks
+
+    def _reset(self):
+        raise NotImplementedError
+
+    def _read_base(self, path: str):
+        raise NotImplementedError
+
+    def _write_base(self, path: str):
+        raise NotImplementedError
+
+    def _apply(self, record: Dict[str, Any]):
+        raise NotImplementedError
+
+    def _size(self) -> int:
+        raise NotImplementedError
+
+    # Reading
+
+    def _stat_base(self) -> Optional[int]:
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _reload(self):
+        """Load the base and replay the whole log (caller holds the file lock)"""
+        self._reset()
+        self._log_file = None
+        self._log_records = 0
+        self._base_mtime = self._stat_base()
+        if self._base_mtime is not None:
+            try:
+                self._read_base(self.path)
+            except Exception as e:
+                print(f"⚠️ Could not read {self.label}: {e}")
+                self._reset()
+        if os.path.exists(self.log_path):
+            self._read_log(0)
+
+    def _read_log(self, offset: int):
+        """Apply the complete records after `offset`; a line cut short by a crashed writer is left alone"""
+        with open(self.log_path, "rb") as f:
+            inode = os.fstat(f.fileno()).st_ino
+            f.seek(offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                print(f"⚠️ Skipping an unreadable {self.label} log record")
+                continue
+            self._apply(record)
+            self._log_records += 1
+        self._log_file = (inode, offset + end)
+
+    def _changed(self) -> bool:
+        """Whether another process has written since we last looked (two stat calls)"""
+        if not self.persist:
+            return False
+        try:
+            stat = os.stat(self.log_path)
+        except FileNotFoundError:
+            return self._log_file is not None or self._stat_base() != self._base_mtime
+        return (self._log_file is None or stat.st_ino != self._log_file[0] or stat.st_size != self._log_file[1]
+                or self._stat_base() != self._base_mtime)
+
+    def _catch_up(self):
+        """Apply other processes' changes (caller holds the file lock)"""
+        try:
+            stat = os.stat(self.log_path)
+        except FileNotFoundError:
+            stat = None
+        if stat is None or self._log_file is None:
+            if stat is not None or self._log_file is not None or self._stat_base() != self._base_mtime:
+                self._reload()
+            return
+        inode, offset = self._log_file
+        # A new log or base means someone compacted
+        if stat.st_ino != inode or stat.st_size < offset or self._stat_base() != self._base_mtime:
+            self._reload()
+        elif stat.st_size > offset:
+            self._read_log(offset)
+
+    def refresh(self):
+        """Pick up changes written by other processes"""
+        if self._changed():
+            with self._lock, self._file_lock:
+                self._catch_up()
+
+    # Writing
+
+    def _commit(self, records: List[Dict[str, Any]]):
+        """Apply change records and append them to the log (caller holds `_lock`)"""
+        if not records:
+            return
+        if not self.persist:
+            for record in records:
+                self._apply(record)
+            return
+        with self._file_lock:
+            self._catch_up()
+            for record in records:
+                self._apply(record)
+            offset = self._log_file[1] if self._log_file else 0
+            with open(self.log_path, "ab") as f:
+                if f.tell() > offset:
+                    # The tail of a write that crashed before finishing its line
+                    f.truncate(offset)
+                f.write(b"".join(json.dumps(record).encode("utf-8") + b"\n" for record in records))
+                f.flush()
+                self._log_file = (os.fstat(f.fileno()).st_ino, f.tell())
+            self._log_records += len(records)
+            if self._log_records > max(STORE_COMPACT_MIN_RECORDS, STORE_COMPACT_RATIO * self._size()):
+                self._compact()
+
+    def _rewrite(self):
+        """Persist a state that was replaced wholesale (rebuilds) as the new base (caller holds `_lock`)"""
+        if not self.persist:
+            return
+        with self._file_lock:
+            self._compact()
+
+    def _compact(self):
+        """Write the state as a new base and start an empty log (caller holds the file lock)"""
+        extension = os.path.splitext(self.path)[1]
+        tmp_path = f"{self.path}.tmp-{os.getpid()}{extension}"
+        self._write_base(tmp_path)
+        os.replace(tmp_path, self.path)
+        tmp_log = f"{self.log_path}.tmp-{os.getpid()}"
+        open(tmp_log, "wb").close()
+        os.replace(tmp_log, self.log_path)
+        self._base_mtime = self._stat_base()
+        self._log_file = (os.stat(self.log_path).st_ino, 0)
+        self._log_records = 0
@@ -0,0 +1,118 @@
+import threading
+import time
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected, RateLimiter, TokenBucket
+
+
+@pytest.fixture
+def admission(monkeypatch):
+    monkeypatch.setenv("ADMISSION_MAX_CONCURRENT", "1")
+    monkeypatch.setenv("ADMISSION_MAX_QUEUE", "1")
+    monkeypatch.setenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "2")
+    monkeypatch.setenv("RATE_LIMIT_BURST", "2")
+    monkeypatch.setenv("RATE_LIMIT_SESSION_PER_MINUTE", "60")
+    monkeypatch.setenv("RATE_LIMIT_IP_PER_MINUTE", "60")
+    return AdmissionController()
+
+
+def wait_until(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_queued_request_runs_once_the_slot_is_released(admission):
+    order = []
+
+    def queued():
+        with admission.slot():
+            order.append("queued")
+
+    with admission.slot():
+        thread = threading.Thread(target=queued)
+        thread.start()
+        wait_until(lambda: admission.get_stats()["queue_depth"] == 1)
+        order.append("first")
+    thread.join(2)
+
+    assert order == ["first", "queued"]
+    stats = admission.get_stats()
+    assert stats["admitted"] == 2 and stats["queued"] == 1 and stats["in_flight"] == 0
+
+
+def test_request_is_shed_when_the_queue_is_full(admission):
+    def queued():
+        with admission.slot():
+            pass
+
+    with admission.slot():
+        thread = threading.Thread(target=queued)
+        thread.start()
+        wait_until(lambda: admission.get_stats()["queue_depth"] == 1)
+        with pytest.raises(AdmissionRejected) as rejected:
+            with admission.slot():
+                pass
+    thread.join(2)
+
+    assert rejected.value.status == 503 and rejected.value.reason == "queue_full"
+    assert rejected.value.retry_after >= 1
+    assert admission.get_stats()["rejected_queue_full"] == 1
+
+
+def test_request_is_shed_when_its_queue_deadline_passes(admission):
+    admission.queue_timeout = 0.05
+
+    with admission.slot():
+        with pytest.raises(AdmissionRejected) as rejected:
+            with admission.slot():
+                pass
+
+    assert rejected.value.status == 503 and rejected.value.reason == "queue_timeout"
+    stats = admission.get_stats()
+    assert stats["rejected_queue_timeout"] == 1 and stats["queue_depth"] == 0 and stats["in_flight"] == 0
+
+
+def test_slot_is_released_when_the_call_raises(admission):
+    with pytest.raises(RuntimeError):
+        with admission.slot():
+            raise RuntimeError("upstream down")
+
+    assert admission.get_stats()["in_flight"] == 0
+    with admission.slot():
+        pass
+
+
+def test_sessions_and_ips_are_rate_limited_separately(admission):
+    admission.check_rate_limits("s1", "10.0.0.1")
+    admission.check_rate_limits("s1", "10.0.0.1")
+    with pytest.raises(AdmissionRejected) as rejected:
+        admission.check_rate_limits("s1", "10.0.0.1")
+    assert rejected.value.status == 429 and rejected.value.reason == "rate_limit_session"
+
+    # The IP has a larger burst, so another session from it still gets through
+    admission.check_rate_limits("s2", "10.0.0.1")
+    assert admission.get_stats()["rejected_rate_limit_session"] == 1
+
+
+def test_token_bucket_refills_at_its_rate(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    bucket = TokenBucket(rate=1.0, capacity=1)
+
+    assert bucket.take() == 0.0
+    assert bucket.take() == pytest.approx(1.0)
+    now[0] += 0.5
+    assert bucket.take() == pytest.approx(0.5)
+    now[0] += 0.5
+    assert bucket.take() == 0.0
+
+
+def test_rate_limiter_keeps_only_the_most_recent_keys():
+    limiter = RateLimiter(per_minute=60, burst=1, max_keys=2)
+    for key in ("a", "b", "a", "c"):
+        limiter.take(key)
+
+    assert list(limiter.buckets) == ["a", "c"]
@@ -0,0 +1,90 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import batch_answer
+from batch_answer import BatchAnswerer, answered_ids
+from llm_client import LLMUnavailableError
+
+
+class FakeLLM:
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.usage_hook = None
+
+    def complete(self, messages, **kwargs):
+        question = messages[-1]["content"]
+        if any(word in question for word in self.fail):
+            raise LLMUnavailableError("circuit open")
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f"answer: {question}"))])
+
+
+class FakeChatbot:
+    def __init__(self, llm):
+        self.llm = llm
+        self.collection = self.parent_store = self.embedding_model = None
+        self.fact_store = SimpleNamespace(answer=lambda question: None)
+
+    def add_catalog_context(self, question, docs):
+        return docs
+
+
+@pytest.fixture
+def search(monkeypatch):
+    calls = []
+
+    def fake_search(collection, parent_store, embedding_model, queries, n_results=5):
+        calls.append(list(queries))
+        if any("broken" in query for query in queries):
+            raise RuntimeError("index unavailable")
+        return [[{"content": f"doc for {query}", "metadata": {}}] for query in queries]
+
+    monkeypatch.setattr(batch_answer, "search_batch", fake_search)
+    return calls
+
+
+def write_questions(path, questions):
+    path.write_text("".join(json.dumps({"id": str(i), "question": q}) + "\n" for i, q in enumerate(questions)))
+
+
+def read_results(path):
+    return {result["id"]: result for result in map(json.loads, path.read_text().splitlines())}
+
+
+def test_unavailable_llm_is_an_error_not_an_answer(tmp_path, search):
+    questions, output = tmp_path / "questions.jsonl", tmp_path / "answers.jsonl"
+    write_questions(questions, ["Who wrote Ripple?", "Who wrote Dark Star?"])
+
+    summary = BatchAnswerer(FakeChatbot(FakeLLM(fail=["Dark Star"]))).run(str(questions), str(output))
+
+    results = read_results(output)
+    assert results["0"]["answer"].startswith("answer:") and results["0"]["source"] == "rag"
+    assert "answer" not in results["1"] and "LLM unavailable" in results["1"]["error"]
+    assert summary["answered"] == 1 and summary["errors"] == 1
+    assert answered_ids(str(output)) == {"0"}
+
+
+def test_failed_retrieval_is_reported_and_skips_the_llm(tmp_path, search):
+    questions, output = tmp_path / "questions.jsonl", tmp_path / "answers.jsonl"
+    write_questions(questions, ["Who wrote Ripple?", "the broken one"])
+    llm = FakeLLM()
+    llm.complete = lambda **kwargs: pytest.fail("answered without context")
+
+    summary = BatchAnswerer(FakeChatbot(llm), batch_size=2).run(str(questions), str(output))
+
+    results = read_results(output)
+    assert all("retrieval failed: index unavailable" in result["error"] for result in results.values())
+    assert summary["errors"] == 2 and summary["answered"] == 0
+
+
+def test_resume_retries_only_the_errors(tmp_path, search):
+    questions, output = tmp_path / "questions.jsonl", tmp_path / "answers.jsonl"
+    write_questions(questions, ["Who wrote Ripple?", "Who wrote Dark Star?"])
+    BatchAnswerer(FakeChatbot(FakeLLM(fail=["Dark Star"]))).run(str(questions), str(output))
+
+    summary = BatchAnswerer(FakeChatbot(FakeLLM())).run(str(questions), str(output))
+
+    assert summary["skipped"] == 1 and summary["answered"] == 1
+    assert search[-1] == ["Who wrote Dark Star?"]
+    assert answered_ids(str(output)) == {"0", "1"}
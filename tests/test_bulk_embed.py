@@ -0,0 +1,32 @@
+import numpy as np
+
+import dedup
+from bulk_embed import bulk_ingest
+from dedup import NearDuplicateIndex
+
+ESSAY = "Dark Star debuted in 1967 and grew into the band's longest improvisation over the next few years of touring."
+
+
+class FakeEmbedder:
+    def encode_shards(self, texts):
+        yield np.ones((len(texts), 4), dtype=np.float32)
+
+    def report(self):
+        return {"workers": {}, "total_texts": 0}
+
+
+def test_calls_sharing_an_index_drop_documents_written_by_earlier_calls(tmp_path, monkeypatch):
+    monkeypatch.setattr(dedup, "DEDUP_ENABLED", True)
+    index = NearDuplicateIndex(str(tmp_path))
+    written = []
+
+    def write_chunks(parents, chunks, embeddings):
+        written.extend(parent["content"] for parent in parents)
+        index.add(parents)
+
+    first = bulk_ingest([{"content": ESSAY}], write_chunks, FakeEmbedder(), dedup_index=index)
+    second = bulk_ingest([{"content": ESSAY + " "}, {"content": "Cornell 1977 is the famous one."}],
+                         write_chunks, FakeEmbedder(), dedup_index=index)
+
+    assert first["documents"] == 1 and second["documents"] == 1
+    assert written == [ESSAY, "Cornell 1977 is the famous one."]
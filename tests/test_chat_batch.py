@@ -0,0 +1,120 @@
+import json
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("flask_cors")
+sentence_transformers = pytest.importorskip("sentence_transformers")
+
+from admission import AdmissionRejected
+
+
+class FakeModel:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def encode(self, texts, **kwargs):
+        return np.ones((len(texts), 8), dtype=np.float32)
+
+
+class FakeLLM:
+    def __init__(self):
+        self.questions = []
+
+    def complete(self, messages, **kwargs):
+        question = messages[-1]["content"]
+        self.questions.append(question)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f"answer: {question}"))])
+
+
+@pytest.fixture(scope="module")
+def app_module(tmp_path_factory):
+    patch = pytest.MonkeyPatch()
+    patch.chdir(tmp_path_factory.mktemp("api"))
+    patch.setenv("OPENAI_API_KEY", "test-key")
+    patch.setenv("VECTOR_STORE_BACKEND", "numpy")
+    patch.setattr(sentence_transformers, "SentenceTransformer", FakeModel)
+    sys.modules.pop("app", None)
+    import app
+    yield app
+    sys.modules.pop("app", None)
+    patch.undo()
+
+
+@pytest.fixture
+def api(app_module, monkeypatch):
+    chatbot = app_module.chatbot
+    llm = FakeLLM()
+    searches = []
+
+    def search_batch(queries, n_results=5, query_embeddings=None):
+        searches.append(list(queries))
+        return [[{"content": f"doc for {query}", "metadata": {}}] for query in queries]
+
+    monkeypatch.setattr(chatbot, "llm", llm)
+    monkeypatch.setattr(chatbot, "search_knowledge_batch", search_batch)
+    monkeypatch.setattr(chatbot.fact_store, "answer",
+                        lambda question: "American Beauty came out in 1970." if "American Beauty" in question else None)
+    return SimpleNamespace(client=app_module.app.test_client(), module=app_module, llm=llm, searches=searches)
+
+
+def test_results_come_back_in_input_order_with_one_search(api):
+    response = api.client.post("/chat/batch", json={"messages": [
+        "Who wrote Dark Star?", "When did American Beauty come out?", {"message": "Who played Cornell 1977?"}]})
+
+    assert response.status_code == 200
+    results = response.get_json()["results"]
+    assert [r["index"] for r in results] == [0, 1, 2]
+    assert [r["source"] for r in results] == ["rag", "fast_path", "rag"]
+    assert results[1]["response"] == "American Beauty came out in 1970."
+    assert results[0]["response"].startswith("answer: ") and "Dark Star" in results[0]["response"]
+    assert all("elapsed_ms" in r for r in results)
+    # Fast-path answers are neither searched nor sent to the LLM
+    assert api.searches == [["Who wrote Dark Star?", "Who played Cornell 1977?"]]
+    assert len(api.llm.questions) == 2
+
+
+def test_stream_writes_one_ndjson_line_per_result(api):
+    response = api.client.post("/chat/batch", json={"messages": ["Who wrote Ripple?", "Who wrote Box of Rain?"],
+                                                    "stream": True})
+
+    assert response.mimetype == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [line["index"] for line in lines] == [0, 1]
+    assert "Box of Rain" in lines[1]["response"]
+
+
+def test_session_items_extend_their_conversation(api):
+    api.client.post("/chat/batch", json={"messages": [{"message": "Who wrote Ripple?", "session_id": "batch-s1"}]})
+
+    history = api.module.conversations.get("batch-s1").history
+    assert [m.content for m in history][0] == "Who wrote Ripple?"
+
+
+def test_shed_item_is_an_error_and_the_rest_are_answered(api, monkeypatch):
+    chatbot = api.module.chatbot
+    generate = chatbot.generate_response
+
+    def generate_response(question, *args, **kwargs):
+        if "Ripple" in question:
+            raise AdmissionRejected(503, "queue_full", 2)
+        return generate(question, *args, **kwargs)
+
+    monkeypatch.setattr(chatbot, "generate_response", generate_response)
+    results = api.client.post("/chat/batch", json={"messages": ["Who wrote Ripple?", "Who wrote Dark Star?"]}).get_json()
+
+    assert results["results"][0]["reason"] == "queue_full" and results["results"][0]["retry_after"] == 2
+    assert "response" in results["results"][1]
+
+
+@pytest.mark.parametrize("body", [{}, {"messages": []}, {"messages": ["ok", ""]}, {"messages": [{"text": "x"}]}])
+def test_malformed_batches_are_rejected(api, body):
+    assert api.client.post("/chat/batch", json=body).status_code == 400
+
+
+def test_batches_over_the_limit_are_rejected(api, monkeypatch):
+    monkeypatch.setattr(api.module, "CHAT_BATCH_MAX_MESSAGES", 2)
+    assert api.client.post("/chat/batch", json={"messages": ["a", "b", "c"]}).status_code == 400
@@ -0,0 +1,117 @@
+import json
+import os
+
+import pytest
+
+import store_log
+from chunking import (ParentDocumentStore, chunk_documents, expand_to_parents, parent_id_for, sentence_windows,
+                      split_sentences)
+
+ESSAY = ("Dark Star debuted in 1967. The band stretched it for half an hour. Hunter wrote the words. "
+         "Garcia sang them. St. Louis heard a long one in 1969. Then it went quiet for years.")
+
+
+def test_sentences_do_not_split_on_initials_or_abbreviations():
+    assert split_sentences("J. Garcia played St. Louis. Then Dr. Feelgood? No!") == [
+        "J. Garcia played St. Louis.", "Then Dr. Feelgood?", "No!"]
+
+
+def test_windows_overlap_and_cover_every_sentence():
+    assert sentence_windows(list("abcdefg"), window=3, overlap=1) == [(0, 3), (2, 5), (4, 7)]
+    assert sentence_windows(list("ab"), window=3, overlap=1) == [(0, 2)]
+
+
+def test_chunks_point_back_to_one_parent_per_distinct_text():
+    parents, chunks = chunk_documents([{"content": ESSAY, "title": "Dark Star"}, {"content": ESSAY}],
+                                      window=3, overlap=1)
+
+    assert len(parents) == 1 and parents[0]["id"] == parent_id_for(ESSAY)
+    assert [c["id"] for c in chunks] == [f"{parents[0]['id']}#{i}" for i in range(len(chunks))]
+    assert all(c["parent_id"] == parents[0]["id"] and c["title"] == "Dark Star" for c in chunks)
+    assert chunks[0]["content"].startswith("Dark Star debuted") and chunks[1]["sentence_start"] == 2
+
+
+@pytest.fixture
+def store_with_essay(tmp_path):
+    store = ParentDocumentStore(str(tmp_path))
+    parents, chunks = chunk_documents([{"content": ESSAY, "title": "Dark Star"}], window=2, overlap=0)
+    store.add(parents)
+    hits = [{"content": c["content"], "metadata": {k: v for k, v in c.items() if k != "content"}, "distance": 0.1 * i}
+            for i, c in enumerate(chunks)]
+    return store, hits
+
+
+def test_parent_that_fits_is_returned_whole(store_with_essay):
+    store, hits = store_with_essay
+
+    results = expand_to_parents(hits, store, n_results=5, budget=1000)
+
+    assert len(results) == 1
+    assert results[0]["content"] == ESSAY and results[0]["distance"] == 0.0
+
+
+def test_parent_over_budget_returns_only_matched_windows(store_with_essay):
+    store, hits = store_with_essay
+
+    results = expand_to_parents([hits[2], hits[0]], store, n_results=5, budget=150)
+
+    assert len(ESSAY) > 150
+    assert results[0]["content"] == ("Dark Star debuted in 1967. The band stretched it for half an hour. ... "
+                                     "St. Louis heard a long one in 1969. Then it went quiet for years.")
+
+
+def test_chunks_without_a_known_parent_pass_through(tmp_path):
+    hits = [{"content": "orphan chunk", "metadata": {"parent_id": "doc_missing"}, "distance": 0.2}]
+    assert expand_to_parents(hits, ParentDocumentStore(str(tmp_path)))[0]["content"] == "orphan chunk"
+
+
+def test_writes_append_to_the_log_instead_of_rewriting_the_base(tmp_path, monkeypatch):
+    monkeypatch.setattr(store_log, "STORE_COMPACT_MIN_RECORDS", 1000)
+    store = ParentDocumentStore(str(tmp_path))
+    for i in range(5):
+        store.add([{"id": f"doc{i}", "content": f"text {i}", "metadata": {}}])
+    store.add([{"id": "doc0", "content": "text 0", "metadata": {}}])
+    store.delete(["doc1"])
+
+    assert not os.path.exists(tmp_path / "parent_documents.json")
+    assert len((tmp_path / "parent_documents.json.log.jsonl").read_text().splitlines()) == 6
+    reopened = ParentDocumentStore(str(tmp_path))
+    assert sorted(reopened.parents) == ["doc0", "doc2", "doc3", "doc4"]
+
+
+def test_log_is_compacted_into_the_base(tmp_path, monkeypatch):
+    monkeypatch.setattr(store_log, "STORE_COMPACT_MIN_RECORDS", 3)
+    store = ParentDocumentStore(str(tmp_path))
+    for i in range(4):
+        store.add([{"id": f"doc{i}", "content": f"text {i}", "metadata": {}}])
+
+    assert sorted(json.loads((tmp_path / "parent_documents.json").read_text())) == [f"doc{i}" for i in range(4)]
+    assert (tmp_path / "parent_documents.json.log.jsonl").read_text() == ""
+    assert len(ParentDocumentStore(str(tmp_path)).parents) == 4
+
+
+def test_writers_in_two_processes_keep_each_others_documents(tmp_path, monkeypatch):
+    monkeypatch.setattr(store_log, "STORE_COMPACT_MIN_RECORDS", 3)
+    server, cli = ParentDocumentStore(str(tmp_path)), ParentDocumentStore(str(tmp_path))
+
+    cli.add([{"id": "cli0", "content": "from the cli", "metadata": {}}])
+    assert server.get("cli0")["content"] == "from the cli"
+    for i in range(4):
+        server.add([{"id": f"server{i}", "content": f"text {i}", "metadata": {}}])
+    cli.add([{"id": "cli1", "content": "after a compaction", "metadata": {}}])
+
+    for store in (server, cli, ParentDocumentStore(str(tmp_path))):
+        store.refresh()
+        assert sorted(store.parents) == ["cli0", "cli1", "server0", "server1", "server2", "server3"]
+
+
+def test_a_line_cut_short_by_a_crash_is_dropped(tmp_path):
+    store = ParentDocumentStore(str(tmp_path))
+    store.add([{"id": "doc0", "content": "kept", "metadata": {}}])
+    with open(tmp_path / "parent_documents.json.log.jsonl", "a") as f:
+        f.write('{"id": "doc1", "cont')
+
+    reopened = ParentDocumentStore(str(tmp_path))
+    assert sorted(reopened.parents) == ["doc0"]
+    reopened.add([{"id": "doc2", "content": "after the crash", "metadata": {}}])
+    assert sorted(ParentDocumentStore(str(tmp_path)).parents) == ["doc0", "doc2"]
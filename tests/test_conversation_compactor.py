@@ -0,0 +1,115 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from admission import AdmissionController
+from conversation_compactor import ConversationCompactor
+from session_store import SessionStore
+
+
+class FakeLLM:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = []
+
+    def complete(self, messages, **kwargs):
+        self.calls.append(messages)
+        if self.fail:
+            raise RuntimeError("upstream down")
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=" They talked about Cornell. "))])
+
+
+@pytest.fixture
+def sessions():
+    store = SessionStore(max_messages=20)
+    for i in range(4):
+        store.append_turn("s1", f"question {i} " + "x" * 200, f"answer {i} " + "y" * 200)
+    return store
+
+
+def compactor_for(llm, sessions, admission=None):
+    compactor = ConversationCompactor(llm, sessions, sessions.lock, admission)
+    compactor.token_threshold = 100
+    compactor.keep_recent = 2
+    return compactor
+
+
+def test_older_turns_are_folded_into_the_summary(sessions):
+    compactor = compactor_for(FakeLLM(), sessions)
+
+    compactor.compact("s1")
+
+    session = sessions.get("s1")
+    assert session.summary == "They talked about Cornell."
+    assert [m.content[:10] for m in session.history] == ["question 3", "answer 3 y"]
+    assert compactor.get_stats()["messages_folded"] == 6
+
+
+def test_turns_arriving_during_summarization_are_kept(sessions):
+    llm = FakeLLM()
+    compactor = compactor_for(llm, sessions)
+    real_complete = llm.complete
+
+    def complete(**kwargs):
+        sessions.append_turn("s1", "late question", "late answer")
+        return real_complete(**kwargs)
+
+    llm.complete = complete
+    compactor.compact("s1")
+
+    assert [m.content for m in sessions.get("s1").history][-2:] == ["late question", "late answer"]
+
+
+def test_failed_summary_falls_back_to_what_the_user_asked(sessions):
+    compactor = compactor_for(FakeLLM(fail=True), sessions)
+
+    compactor.compact("s1")
+
+    assert sessions.get("s1").summary.startswith("Earlier the user asked about: question 0")
+    assert compactor.get_stats()["fallback_summaries"] == 1
+
+
+def test_scheduling_is_skipped_below_the_threshold_and_deduplicated(sessions):
+    compactor = compactor_for(FakeLLM(), sessions)
+    sessions.append_turn("short", "hi", "hello")
+
+    compactor.maybe_schedule("short")
+    compactor.maybe_schedule("s1")
+    compactor.maybe_schedule("s1")
+
+    assert compactor.queue.qsize() == 1 and compactor.get_stats()["scheduled"] == 1
+
+
+def test_summaries_wait_for_queued_requests(sessions, monkeypatch):
+    monkeypatch.setenv("ADMISSION_MAX_CONCURRENT", "1")
+    admission = AdmissionController()
+    order = []
+    llm = FakeLLM()
+    real_complete = llm.complete
+
+    def complete(**kwargs):
+        order.append("summary")
+        return real_complete(**kwargs)
+
+    llm.complete = complete
+    compactor = compactor_for(llm, sessions, admission)
+
+    def user_request():
+        with admission.slot():
+            order.append("user")
+
+    with admission.slot():
+        summarizer = threading.Thread(target=compactor.compact, args=("s1",))
+        summarizer.start()
+        time.sleep(0.05)
+        user = threading.Thread(target=user_request)
+        user.start()
+        time.sleep(0.05)
+        assert order == []
+    user.join(2)
+    summarizer.join(2)
+
+    assert order == ["user", "summary"]
+    assert admission.get_stats()["background"] == 1
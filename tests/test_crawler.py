@@ -0,0 +1,210 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from crawler import CrawlFrontier, Crawler, extract_page
+
+SONG_TEXT = ("Dark Star was first recorded as a single in 1968 and became the band's great improvisational "
+             "vehicle, stretching past half an hour on some nights and wandering far from its two short verses. "
+             "Hunter's lyric was written on the way home from a show in 1967, before the music was finished. ")
+
+
+def page(title, body="", links=()):
+    anchors = "".join(f'<a href="{link}">{link}</a>' for link in links)
+    return (f"<html><head><title>{title}</title><script>var tracking = 1;</script></head><body>"
+            f"<nav>Home | Songs | Shows</nav><article><h1>{title}</h1><p>{body}</p></article>{anchors}"
+            f"<footer>Copyright the fixture site</footer></body></html>")
+
+
+class FixtureSite:
+    """A local site whose handler records when each request started and how many overlapped"""
+
+    def __init__(self, pages, robots="", latency=0.0):
+        self.pages = pages
+        self.robots = robots
+        self.latency = latency
+        self.requests = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/robots.txt":
+                    return self.reply(200, "text/plain", site.robots)
+                with site.lock:
+                    site.requests.append((self.path, time.monotonic()))
+                    site.active += 1
+                    site.max_active = max(site.max_active, site.active)
+                try:
+                    time.sleep(site.latency)
+                    if self.path not in site.pages:
+                        return self.reply(404, "text/plain", "not found")
+                    content_type, body = site.pages[self.path]
+                    self.reply(200, content_type, body)
+                finally:
+                    with site.lock:
+                        site.active -= 1
+
+            def reply(self, status, content_type, body):
+                data = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def fetched(self):
+        return [path for path, _ in self.requests]
+
+    def gaps(self):
+        starts = sorted(start for _, start in self.requests)
+        return [b - a for a, b in zip(starts, starts[1:])]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def serve():
+    sites = []
+
+    def start(pages, robots="", latency=0.0):
+        site = FixtureSite(pages, robots, latency)
+        sites.append(site)
+        return site
+
+    yield start
+    for site in sites:
+        site.close()
+
+
+def songs_site(count):
+    """An index page linking to `count` song pages"""
+    links = [f"/songs/song{i}.html" for i in range(count)]
+    pages = {"/songs/": ("text/html", page("Songs", links=links))}
+    for i, link in enumerate(links):
+        pages[link] = ("text/html", page(f"Song {i}", SONG_TEXT))
+    return pages
+
+
+def site_config(site, name="fixture", **overrides):
+    config = {"name": name, "seeds": [f"{site.url}/songs/"], "follow": f"^{site.url}/",
+              "extract": f"^{site.url}/songs/song[0-9]+\\.html$", "category": "songs", "type": "song_info",
+              "max_depth": 2, "delay": 0.0, "concurrency": 4}
+    config.update(overrides)
+    return config
+
+
+def crawl(sites, frontier=None, max_pages=100, workers=8):
+    crawler = Crawler(sites, frontier if frontier is not None else CrawlFrontier(db_path=None),
+                      workers=workers, stage=False)
+    return crawler, list(crawler.crawl(max_pages))
+
+
+def test_robots_disallow_is_never_fetched(serve):
+    pages = songs_site(2)
+    pages["/songs/"] = ("text/html", page("Songs", links=["/songs/song0.html", "/songs/song1.html",
+                                                           "/private/song9.html"]))
+    pages["/private/song9.html"] = ("text/html", page("Secret", SONG_TEXT))
+    site = serve(pages, robots="User-agent: *\nDisallow: /private/\n")
+
+    crawler, docs = crawl([site_config(site, extract=f"^{site.url}/.*song[0-9]+\\.html$")])
+
+    assert sorted(doc["title"] for doc in docs) == ["Song 0", "Song 1"]
+    assert "/private/song9.html" not in site.fetched()
+    assert crawler.stats["robots_blocked"] == 1
+
+
+def test_robots_crawl_delay_wins_over_a_shorter_site_delay(serve):
+    # The stdlib parser only reads whole seconds
+    site = serve(songs_site(2), robots="User-agent: *\nCrawl-delay: 1\n")
+
+    crawl([site_config(site, delay=0.05)])
+
+    assert len(site.requests) == 3
+    assert min(site.gaps()) >= 0.95
+
+
+def test_site_delay_spaces_requests_to_one_host(serve):
+    site = serve(songs_site(3))
+
+    crawl([site_config(site, delay=0.2)])
+
+    assert len(site.requests) == 4
+    assert min(site.gaps()) >= 0.18
+
+
+def test_concurrency_is_limited_per_host(serve):
+    slow = serve(songs_site(6), latency=0.15)
+    other = serve(songs_site(6), latency=0.15)
+
+    crawler, docs = crawl([site_config(slow, "slow", concurrency=2), site_config(other, "other", concurrency=3)])
+
+    assert len(docs) == 12
+    assert slow.max_active == 2
+    assert other.max_active == 3
+
+
+def test_interrupted_crawl_resumes_from_the_frontier(serve, tmp_path):
+    site = serve(songs_site(5))
+    config = site_config(site, concurrency=1)
+
+    _, first = crawl([config], CrawlFrontier(db_path=str(tmp_path)), max_pages=3, workers=1)
+    resumed = CrawlFrontier(db_path=str(tmp_path))
+    assert len(resumed) == 3
+    _, second = crawl([config], resumed, workers=1)
+
+    song_pages = [path for path in site.fetched() if path != "/songs/"]
+    assert len(song_pages) == len(set(song_pages)) == 5
+    assert len(first) + len(second) == 5
+
+
+def test_only_extract_pages_with_enough_text_become_documents(serve):
+    pages = songs_site(1)
+    pages["/songs/"] = ("text/html", page("Songs", SONG_TEXT, links=["/songs/song0.html", "/songs/song1.html",
+                                                                     "/songs/notes.html", "/songs/song2.html"]))
+    pages["/songs/song1.html"] = ("text/html", page("Stub", "Too short."))
+    pages["/songs/notes.html"] = ("text/html", page("Notes", SONG_TEXT))
+    pages["/songs/song2.html"] = ("application/pdf", "%PDF-1.4")
+    site = serve(pages)
+
+    crawler, docs = crawl([site_config(site)])
+
+    assert [doc["url"] for doc in docs] == [f"{site.url}/songs/song0.html"]
+    assert crawler.stats["skipped"] == 4
+
+
+def test_extracted_text_drops_boilerplate_and_keeps_the_title():
+    site = {"name": "fixture", "category": "songs", "type": "song_info"}
+    html = page("Dark Star", SONG_TEXT, links=["/songs/st-stephen.html", "#top"])
+
+    doc, links = extract_page(html, "http://example.test/songs/dark-star.html", site, extract=True)
+
+    assert doc["content"].startswith("Dark Star Dark Star was first recorded")
+    for boilerplate in ("Home | Songs", "Copyright", "tracking"):
+        assert boilerplate not in doc["content"]
+    assert doc["title"] == "Dark Star" and doc["source"] == "crawl"
+    assert links == ["http://example.test/songs/st-stephen.html", "http://example.test/songs/dark-star.html"]
+
+
+def test_content_selector_picks_the_main_text():
+    site = {"name": "fixture", "content_selector": "div.lyrics"}
+    html = (f"<html><body><h1>Ripple</h1><div class='sidebar'>{SONG_TEXT}</div>"
+            f"<div class='lyrics'>If my words did glow with the gold of sunshine. {SONG_TEXT}</div></body></html>")
+
+    doc, _ = extract_page(html, "http://example.test/songs/ripple.html", site, extract=True)
+
+    assert doc["content"] == f"Ripple. If my words did glow with the gold of sunshine. {SONG_TEXT.strip()}"
@@ -0,0 +1,151 @@
+import numpy as np
+
+import store_log
+from dedup import NearDuplicateIndex, _key_string, dedupe_documents, merge_reports, minhash
+
+
+def album(title, year, source="musicbrainz"):
+    return {"content": f"{title} is a Grateful Dead album released in {year}. "
+                       f"This is part of their official discography.",
+            "category": "albums", "album": title, "year": year, "type": "album_info", "source": source}
+
+
+ESSAY = ("Cornell 1977 is widely considered one of the finest performances the band ever gave, "
+         "with a Scarlet Begonias into Fire on the Mountain that tapers still trade and argue about.")
+
+
+def test_templated_album_records_do_not_merge():
+    documents = [album("American Beauty", "1970"), album("Workingman's Dead", "1970"),
+                 album("Aoxomoxoa", "1969"), album("Blues for Allah", "1975")]
+    kept, report = dedupe_documents(documents)
+
+    assert sorted(doc["album"] for doc in kept) == ["American Beauty", "Aoxomoxoa", "Blues for Allah",
+                                                    "Workingman's Dead"]
+    assert report["collapsed_in_batch"] == 0
+    assert all("duplicate_sources" not in doc for doc in kept)
+
+
+def test_the_same_album_from_two_sources_merges():
+    kept, _ = dedupe_documents([album("American Beauty", "1970"), album("American Beauty", "1970", "curated")])
+
+    assert len(kept) == 1
+    assert kept[0]["duplicate_count"] == 1
+    assert kept[0]["duplicate_sources"] in ("curated:American Beauty", "musicbrainz:American Beauty")
+
+
+def parent(doc_id, doc):
+    return {"id": doc_id, "content": doc["content"], "metadata": {k: v for k, v in doc.items() if k != "content"}}
+
+
+def tape(date, lineage):
+    return {"content": f"Grateful Dead live at Barton Hall on {date}. {lineage} recording, complete show.",
+            "type": "archive_show", "date": date, "source": "archive.org"}
+
+
+def test_stored_records_only_block_copies_of_the_same_record(tmp_path):
+    index = NearDuplicateIndex(db_path=str(tmp_path))
+    index.add([parent("doc_ab", album("American Beauty", "1970"))])
+
+    kept, report = dedupe_documents([album("American Beauty", "1970"), album("Workingman's Dead", "1970")], index)
+
+    assert [doc["album"] for doc in kept] == ["Workingman's Dead"]
+    assert report["already_indexed"] == 1
+
+
+def test_a_later_batch_catches_the_same_album_from_another_source(tmp_path):
+    index = NearDuplicateIndex(db_path=str(tmp_path))
+    first, _ = dedupe_documents([album("American Beauty", "1970")], index)
+    index.add([parent("doc_ab", first[0])])
+
+    kept, report = dedupe_documents([album("American Beauty", "1970", "curated"), album("Aoxomoxoa", "1969")],
+                                    NearDuplicateIndex(db_path=str(tmp_path)))
+
+    assert [doc["album"] for doc in kept] == ["Aoxomoxoa"]
+    assert report["already_indexed"] == 1
+
+
+def test_a_tape_of_an_indexed_show_is_dropped(tmp_path):
+    index = NearDuplicateIndex(db_path=str(tmp_path))
+    index.add([parent("doc_sbd", tape("1977-05-08", "Soundboard"))])
+
+    kept, report = dedupe_documents([tape("1977-05-08", "Audience matrix from two sources, remastered"),
+                                     tape("1977-05-09", "Soundboard")], index)
+
+    assert [doc["date"] for doc in kept] == ["1977-05-09"]
+    assert report["already_indexed"] == 1
+
+
+def test_the_callers_threshold_is_left_alone(tmp_path):
+    index = NearDuplicateIndex(db_path=str(tmp_path), threshold=0.9)
+
+    dedupe_documents([album("American Beauty", "1970")], index, threshold=0.5)
+
+    assert index.threshold == 0.9
+
+
+def test_signatures_are_logged_and_shared_between_processes(tmp_path, monkeypatch):
+    monkeypatch.setattr(store_log, "STORE_COMPACT_MIN_RECORDS", 1000)
+    server, cli = NearDuplicateIndex(db_path=str(tmp_path)), NearDuplicateIndex(db_path=str(tmp_path))
+    server.add([parent("doc_ab", album("American Beauty", "1970"))])
+    cli.add([parent("doc_wd", album("Workingman's Dead", "1970"))])
+    server.remove(["doc_ab"])
+
+    assert not (tmp_path / "minhash_index.npz").exists()
+    for index in (server, cli, NearDuplicateIndex(db_path=str(tmp_path))):
+        ids, signatures, keys = index.entries()
+        assert ids == ["doc_wd"] and signatures.shape == (1, 128)
+        assert keys == [_key_string(album("Workingman's Dead", "1970"))]
+
+
+def test_compaction_keeps_only_live_signatures(tmp_path, monkeypatch):
+    monkeypatch.setattr(store_log, "STORE_COMPACT_MIN_RECORDS", 2)
+    index = NearDuplicateIndex(db_path=str(tmp_path))
+    for i in range(3):
+        index.add([{"id": f"doc{i}", "content": f"{ESSAY} Take {i}."}])
+    index.remove(["doc1"])
+
+    reopened = NearDuplicateIndex(db_path=str(tmp_path))
+    assert reopened.entries()[0] == ["doc0", "doc2"]
+    assert reopened.find(minhash(f"{ESSAY} Take 0.")) in ("doc0", "doc2")
+
+
+def test_clear_forgets_every_signature(tmp_path):
+    index = NearDuplicateIndex(db_path=str(tmp_path))
+    index.add([{"id": "doc0", "content": ESSAY}])
+
+    index.clear()
+
+    assert len(index) == 0 and len(NearDuplicateIndex(db_path=str(tmp_path))) == 0
+    assert index.find(minhash(ESSAY)) is None
+
+
+def test_an_index_opened_without_persist_never_writes(tmp_path):
+    NearDuplicateIndex(db_path=str(tmp_path)).add([{"id": "doc0", "content": ESSAY}])
+    before = sorted((p.name, p.stat().st_size) for p in tmp_path.iterdir())
+
+    index = NearDuplicateIndex(db_path=str(tmp_path), persist=False)
+    index.add_signatures(["doc1"], np.array([minhash(ESSAY + " Again.")]))
+
+    assert len(index) == 2
+    assert sorted((p.name, p.stat().st_size) for p in tmp_path.iterdir()) == before
+    assert len(NearDuplicateIndex(db_path=str(tmp_path))) == 1
+
+
+def test_near_duplicate_prose_records_the_dropped_copy():
+    kept, report = dedupe_documents([
+        {"content": ESSAY, "category": "shows", "type": "show_review", "source": "curated"},
+        {"content": ESSAY + " Truly.", "category": "shows", "type": "show_review", "source": "curated"},
+    ])
+
+    assert len(kept) == 1 and report["collapsed_in_batch"] == 1
+    assert kept[0]["duplicate_sources"].startswith("curated:doc_")
+
+
+def test_merged_reports_compute_corpus_reduction_from_characters():
+    _, small = dedupe_documents([album("American Beauty", "1970"), album("American Beauty", "1970", "curated")])
+    _, large = dedupe_documents([{"content": ESSAY * 20, "type": "show_review"}])
+    merged = merge_reports(merge_reports({}, small), large)
+
+    assert merged["input_chars"] == small["input_chars"] + large["input_chars"]
+    assert merged["corpus_reduction"] == round(1 - merged["output_chars"] / merged["input_chars"], 4)
+    assert merged["corpus_reduction"] < small["corpus_reduction"] / 2
@@ -0,0 +1,48 @@
+import numpy as np
+
+from diversify import diversify_chunks, mmr_select
+
+QUERY = [1.0, 0.0, 0.0]
+# Two near-identical hits and a less relevant one pointing elsewhere
+CANDIDATES = [[0.9, 0.1, 0.0], [0.9, 0.11, 0.0], [0.6, 0.0, 0.8]]
+
+
+def chunk(parent_id, index):
+    return {"content": f"{parent_id} window {index}", "metadata": {"parent_id": parent_id, "chunk_index": index}}
+
+
+def test_lambda_one_is_plain_relevance_order():
+    assert mmr_select(QUERY, CANDIDATES, k=3, lambda_mult=1.0) == [0, 1, 2]
+
+
+def test_a_redundant_candidate_gives_way_to_a_different_one():
+    assert mmr_select(QUERY, CANDIDATES, k=2, lambda_mult=0.3) == [0, 2]
+
+
+def test_selection_is_capped_by_the_candidates():
+    assert mmr_select(QUERY, CANDIDATES, k=10, lambda_mult=0.7) == [0, 1, 2]
+    assert mmr_select(QUERY, np.zeros((0, 3)), k=3) == []
+
+
+def test_zero_vectors_do_not_break_the_scores():
+    picks = mmr_select([0.0, 0.0, 0.0], [[0.0, 0.0, 0.0], [1.0, 0.0, 0.0]], k=2)
+    assert sorted(picks) == [0, 1]
+
+
+def test_chunks_of_the_chosen_parents_come_first_and_nothing_is_dropped():
+    docs = [chunk("doc_a", 0), chunk("doc_b", 0), chunk("doc_a", 1), chunk("doc_c", 0)]
+    embeddings = [CANDIDATES[0], CANDIDATES[1], CANDIDATES[0], CANDIDATES[2]]
+
+    ordered = diversify_chunks(QUERY, docs, embeddings, n_results=2, lambda_mult=0.3)
+
+    assert [doc["content"] for doc in ordered] == ["doc_a window 0", "doc_a window 1", "doc_c window 0",
+                                                   "doc_b window 0"]
+
+
+def test_chunks_without_a_parent_stand_for_themselves():
+    docs = [{"content": "orphan", "metadata": {}}, {"content": "other orphan"}]
+
+    ordered = diversify_chunks(QUERY, docs, [CANDIDATES[0], CANDIDATES[2]], n_results=1)
+
+    assert sorted(doc["content"] for doc in ordered) == ["orphan", "other orphan"]
+    assert ordered[0]["content"] == "orphan"
@@ -0,0 +1,64 @@
+import store_log
+from facet_stats import FacetCounts, diff_counts, facet_values, scan_facets
+
+CORNELL = {"category": "shows", "type": "archive_show", "date": "1977-05-08"}
+ALBUM = {"category": "albums", "type": "album_info", "source": "musicbrainz", "year": 1970}
+
+
+class FakeCollection:
+    def __init__(self, metadatas):
+        self.metadatas = metadatas
+
+    def count(self):
+        return len(self.metadatas)
+
+    def get(self, limit, offset, include):
+        batch = self.metadatas[offset:offset + limit]
+        return {"ids": [f"chunk{offset + i}" for i in range(len(batch))], "metadatas": batch}
+
+
+def test_facet_values_fall_back_to_unknown():
+    assert facet_values(CORNELL) == {"category": "shows", "type": "archive_show", "source": "archive",
+                                     "year": "1977"}
+    assert facet_values({"content_type": "essay"}) == {"category": "unknown", "type": "unknown",
+                                                       "source": "unknown", "year": "unknown"}
+
+
+def test_counts_follow_writes_and_deletes_across_reopens(tmp_path):
+    facets = FacetCounts(str(tmp_path))
+    assert not facets.loaded
+    facets.add([CORNELL, ALBUM, dict(CORNELL, date="1977-05-09")])
+    facets.remove([CORNELL])
+
+    reopened = FacetCounts(str(tmp_path)).to_dict()
+    assert reopened["documents"] == 2
+    assert reopened["facets"]["year"] == {"1977": 1, "1970": 1}
+    assert reopened["facets"]["source"] == {"archive": 1, "musicbrainz": 1}
+
+
+def test_writers_in_two_processes_keep_each_others_counts(tmp_path, monkeypatch):
+    monkeypatch.setattr(store_log, "STORE_COMPACT_MIN_RECORDS", 2)
+    server, cli = FacetCounts(str(tmp_path)), FacetCounts(str(tmp_path))
+
+    server.add([CORNELL])
+    cli.add([ALBUM])
+    server.add([dict(CORNELL, date="1977-05-09")])
+    cli.remove([ALBUM])
+
+    assert server.to_dict() == cli.to_dict() == FacetCounts(str(tmp_path)).to_dict()
+    assert server.to_dict()["documents"] == 2
+
+
+def test_full_scan_counts_each_parent_once_and_replaces_drifted_counts(tmp_path):
+    chunks = [dict(CORNELL, parent_id="p1"), dict(CORNELL, parent_id="p1"), dict(ALBUM, parent_id="p2")]
+    actual = scan_facets(FakeCollection(chunks), batch_size=2)
+    stored = FacetCounts(str(tmp_path))
+    stored.add([CORNELL])
+
+    assert actual.documents == 2
+    assert diff_counts(stored, actual) == [
+        "documents: stored 1, actual 2", "category=albums: stored 0, actual 1", "type=album_info: stored 0, actual 1",
+        "source=musicbrainz: stored 0, actual 1", "year=1970: stored 0, actual 1"]
+    stored.replace(actual)
+    assert (tmp_path / "facets.json.log.jsonl").read_text() == ""
+    assert diff_counts(FacetCounts(str(tmp_path)), actual) == []
@@ -0,0 +1,125 @@
+import pytest
+
+from fact_store import FactStore
+
+
+def show(date, venue, city, archive_id=None):
+    return {"category": "shows", "type": "archive_show", "date": date, "venue": venue, "city": city,
+            "archive_id": archive_id}
+
+
+@pytest.fixture
+def facts(tmp_path):
+    store = FactStore(str(tmp_path))
+    store.add_documents([
+        {"category": "albums", "type": "album_info", "album": "American Beauty", "year": 1970},
+        show("1977-05-08T00:00:00Z", "Barton Hall", "Ithaca, NY", "gd77-05-08.sbd.hicks.4982.sbeok.shnf"),
+        show("1974-02-24T00:00:00Z", "Winterland", "San Francisco, CA"),
+        show("1977-03-18T00:00:00Z", "Winterland", "San Francisco, CA"),
+        show("1977-03-19T00:00:00Z", "Winterland", "San Francisco, CA"),
+        show("1978-12-31T00:00:00Z", "Winterland", "San Francisco, CA"),
+    ])
+    return store
+
+
+def test_release_year(facts):
+    assert facts.answer("When did American Beauty come out?") == "American Beauty came out in 1970."
+
+
+def test_venue_on_a_date(facts):
+    assert facts.answer("Where did they play on 5/8/77?") == "On 1977-05-08 the Dead played Barton Hall in Ithaca, NY."
+    assert facts.answer("What venue was the May 8, 1977 show at?").startswith("On 1977-05-08")
+
+
+def test_archive_id_on_a_date(facts):
+    assert "gd77-05-08" in facts.answer("What's the archive.org identifier for 1977-05-08?")
+
+
+@pytest.mark.parametrize("question", [
+    "What songs did they play on 5/8/77?",
+    "What was the encore they played on May 8, 1977?",
+    "What did they open with on 5/8/77?",
+    "Which song closed the second set on 1977-05-08?",
+    "What did they play on 5/8/77?",
+])
+def test_setlist_questions_fall_through_to_rag(facts, question):
+    assert facts.answer(question) is None
+
+
+def test_every_show_at_a_venue(facts):
+    answer = facts.answer("When did they play Winterland?")
+    assert answer.startswith("I have 4 shows at Winterland on record")
+
+
+def test_year_qualifier_filters_venue_dates(facts):
+    answer = facts.answer("How many times did they play Winterland in 1977?")
+    assert answer == "I have 2 shows at Winterland in 1977 on record: 1977-03-18, 1977-03-19."
+
+
+def test_year_range_filters_venue_dates(facts):
+    answer = facts.answer("When did they play Winterland between 1974 and 1977?")
+    assert answer.startswith("I have 3 shows at Winterland from 1974 to 1977 on record")
+
+
+@pytest.mark.parametrize("question", [
+    "When did they play Winterland in 1980?",           # nothing on record: let retrieval decide
+    "When did they play Winterland before 1977?",       # relative qualifiers aren't parsed
+    "When did they first play Winterland?",
+    "When did they play Winterland in the 70s?",
+    "How many times did they play Dark Star at Winterland?",
+])
+def test_qualified_venue_questions_fall_through(facts, question):
+    assert facts.answer(question) is None
+
+
+def test_removing_a_document_keeps_facts_other_documents_carry(tmp_path):
+    store = FactStore(str(tmp_path))
+    barton_hall = show("1977-05-08T00:00:00Z", "Barton Hall", "Ithaca, NY")
+    album = {"category": "albums", "type": "album_info", "album": "American Beauty", "year": 1970}
+    store.add_documents([barton_hall, dict(barton_hall), album])
+
+    store.remove_documents([barton_hall])
+    assert FactStore(str(tmp_path)).answer("Where did they play on 5/8/77?")
+    store.remove_documents([album, barton_hall])
+    assert store.answer("Where did they play on 5/8/77?") is None
+    assert store.answer("When did American Beauty come out?") is None
+    assert FactStore(str(tmp_path)).facts == []
+
+
+def test_longest_name_wins_and_ambiguous_names_fall_through(tmp_path):
+    store = FactStore(str(tmp_path))
+    store.add_documents([
+        {"category": "albums", "album": "Live/Dead", "year": 1969},
+        {"category": "albums", "album": "Dead Set", "year": 1981},
+        {"category": "albums", "album": "Reckoning", "year": 1981},
+        {"category": "albums", "album": "Reckoning Live", "year": 2004},
+        {"category": "albums", "album": "Without a Net", "year": 1990},
+        {"category": "albums", "album": "Built to Last", "year": 1989},
+    ])
+
+    assert store.answer("When did Reckoning Live come out?") == "Reckoning Live came out in 2004."
+    assert store.answer("When was Dead Set released? Dead Set, I mean") == "Dead Set came out in 1981."
+    # Two names of the same length: no single answer
+    assert store.answer("When did Without a Net and Built to Last come out?") is None
+
+
+def test_name_lookup_does_not_scan_every_name(tmp_path, monkeypatch):
+    store = FactStore(str(tmp_path))
+    store.add_documents([{"category": "albums", "album": f"Album Number {i}", "year": 1970} for i in range(2000)])
+    store.add_documents([{"category": "albums", "album": "Terrapin Station", "year": 1977}])
+
+    class NoScan(dict):
+        def __iter__(self):
+            raise AssertionError("scanned every name")
+
+    monkeypatch.setattr(store.album_names, "names", NoScan(store.album_names.names))
+    assert store.answer("When did Terrapin Station come out?") == "Terrapin Station came out in 1977."
+
+
+def test_facts_written_by_another_process_are_answered(tmp_path):
+    server, cli = FactStore(str(tmp_path)), FactStore(str(tmp_path))
+    cli.add_documents([{"category": "albums", "album": "Blues for Allah", "year": 1975}])
+
+    assert server.answer("When did Blues for Allah come out?") == "Blues for Allah came out in 1975."
+    assert server.get_stats()["facts"] == 1
+    assert FactStore(str(tmp_path)).get_stats()["facts"] == 1
@@ -0,0 +1,68 @@
+from types import SimpleNamespace
+
+import pytest
+
+import dead_data_scraper
+from chunking import ParentDocumentStore, parent_id_for
+from dead_data_scraper import GratefulDeadDataScraper
+from incremental_refresh import WatermarkStore, fetch_new_archive_shows
+
+CORNELL = {"identifier": "gd77-05-08", "title": "Grateful Dead Live at Barton Hall on 1977-05-08",
+           "date": "1977-05-08", "addeddate": "2023-05-01T12:30:00Z"}
+VENETA = {"identifier": "gd72-08-27", "title": "Grateful Dead Live at Old Renaissance Faire Grounds on 1972-08-27",
+          "date": "1972-08-27", "addeddate": "2023-05-02T08:00:00Z"}
+
+
+@pytest.fixture(autouse=True)
+def in_tmp_path(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+
+
+class FakeArchive:
+    def __init__(self, docs):
+        self.docs = docs
+        self.headers = {}
+        self.queries = []
+
+    def get(self, url, params=None, **kwargs):
+        self.queries.append(params["q"])
+        return SimpleNamespace(raise_for_status=lambda: None, json=lambda: {"response": {"docs": self.docs}})
+
+
+def fake_archive(monkeypatch, docs):
+    archive = FakeArchive(docs)
+    monkeypatch.setattr(dead_data_scraper.requests, "Session", lambda: archive)
+    return archive
+
+
+def test_range_query_uses_the_day_of_the_watermark(monkeypatch):
+    archive = fake_archive(monkeypatch, [CORNELL, VENETA])
+
+    shows, newest = GratefulDeadDataScraper().scrape_archive_since("2023-05-01T12:30:00Z")
+
+    assert archive.queries == ["collection:GratefulDead AND mediatype:etree AND addeddate:[2023-05-01 TO null]"]
+    assert len(shows) == 2 and newest == "2023-05-02T08:00:00Z"
+
+
+def test_items_exactly_at_the_watermark_are_skipped(monkeypatch, tmp_path):
+    fake_archive(monkeypatch, [CORNELL, VENETA])
+    already_ingested = GratefulDeadDataScraper().parse_archive_show(CORNELL)
+    ParentDocumentStore(str(tmp_path)).add([{"id": parent_id_for(already_ingested["content"]),
+                                             "content": already_ingested["content"], "metadata": {}}])
+    WatermarkStore(str(tmp_path)).advance("GratefulDead", "addeddate", CORNELL["addeddate"])
+
+    shows, watermark = fetch_new_archive_shows(str(tmp_path))
+
+    assert [show["archive_id"] for show in shows] == ["gd72-08-27"]
+    assert watermark["since"] == CORNELL["addeddate"] and watermark["value"] == VENETA["addeddate"]
+
+
+def test_watermark_only_moves_forward_and_persists(tmp_path):
+    marks = WatermarkStore(str(tmp_path))
+    marks.advance("GratefulDead", "addeddate", "2023-05-02T08:00:00Z")
+    marks.advance("GratefulDead", "addeddate", "2023-05-01T12:30:00Z")
+    marks.advance("GratefulDead", "addeddate", None)
+
+    assert WatermarkStore(str(tmp_path)).get("GratefulDead", "addeddate") == "2023-05-02T08:00:00Z"
+    marks.reset("GratefulDead", "addeddate")
+    assert WatermarkStore(str(tmp_path)).get("GratefulDead", "addeddate") is None
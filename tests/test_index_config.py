@@ -0,0 +1,106 @@
+import json
+
+import chromadb
+import numpy as np
+import pytest
+
+import index_config
+from index_config import (COLLECTION_NAME, collection_metadata, exact_neighbors, get_hnsw_config, read_collection,
+                          rebuild_collection, recommend_config, recover_interrupted_rebuild, tune_hnsw,
+                          write_collection)
+
+
+@pytest.fixture(autouse=True)
+def no_hnsw_env(monkeypatch):
+    for env_var in index_config.HNSW_ENV_VARS.values():
+        monkeypatch.delenv(env_var, raising=False)
+
+
+def dataset(n=60, dim=8, seed=0):
+    embeddings = np.random.RandomState(seed).randn(n, dim).astype(np.float32)
+    return {"ids": [f"doc{i}" for i in range(n)], "documents": [f"text {i}" for i in range(n)],
+            "metadatas": [{"n": i} for i in range(n)], "embeddings": embeddings}
+
+
+def live_collection(client, data, config=None):
+    collection = client.create_collection(name=COLLECTION_NAME, metadata=collection_metadata(config))
+    write_collection(collection, data)
+    return collection
+
+
+def test_tuned_values_apply_unless_the_environment_overrides_them(tmp_path, monkeypatch):
+    (tmp_path / index_config.TUNED_CONFIG_FILE).write_text(json.dumps({"hnsw:M": 32, "hnsw:search_ef": 64}))
+    assert get_hnsw_config(str(tmp_path))["hnsw:M"] == 32
+
+    monkeypatch.setenv("HNSW_M", "8")
+    config = get_hnsw_config(str(tmp_path))
+    assert config["hnsw:M"] == 8 and config["hnsw:search_ef"] == 64
+
+
+def test_exact_neighbors_matches_brute_force_l2():
+    data = dataset()
+    queries = data["embeddings"][:5]
+    top = exact_neighbors(data["embeddings"], queries, 3, "l2")
+    for q, row in enumerate(top):
+        distances = np.linalg.norm(data["embeddings"] - queries[q], axis=1)
+        assert set(row.tolist()) == set(np.argsort(distances)[:3].tolist())
+
+
+def test_tuning_measures_recall_and_recommends_the_fastest_passing_setting(tmp_path, monkeypatch):
+    monkeypatch.setattr(index_config, "KNOWLEDGE_DB_PATH", str(tmp_path))
+    data = dataset()
+    results = tune_hnsw(data, data["embeddings"][:10], "l2", k=3, m_values=[8], construction_efs=[64],
+                        search_efs=[10, 64])
+
+    assert len(results) == 2
+    assert all(0.0 <= r["recall"] <= 1.0 for r in results)
+    assert max(r["recall"] for r in results) == 1.0
+    best = recommend_config(results, 1.0)
+    assert best["recall"] == 1.0
+    assert recommend_config([dict(r, recall=0.5) for r in results], 0.9) is None
+
+
+def test_rebuild_swaps_in_new_settings_and_keeps_the_data(tmp_path):
+    client = chromadb.PersistentClient(path=str(tmp_path))
+    data = dataset()
+    live_collection(client, data)
+
+    rebuild_collection(client, read_collection(client.get_collection(COLLECTION_NAME)),
+                       dict(get_hnsw_config(str(tmp_path)), **{"hnsw:M": 8}), db_path=str(tmp_path))
+
+    rebuilt = client.get_collection(COLLECTION_NAME)
+    assert rebuilt.count() == len(data["ids"])
+    assert rebuilt.metadata["hnsw:M"] == 8
+    assert json.loads((tmp_path / index_config.TUNED_CONFIG_FILE).read_text())["hnsw:M"] == 8
+    names = {getattr(c, "name", c) for c in client.list_collections()}
+    assert names == {COLLECTION_NAME}
+
+
+def test_failed_swap_leaves_the_old_collection_live(tmp_path, monkeypatch):
+    client = chromadb.PersistentClient(path=str(tmp_path))
+    data = dataset()
+    live_collection(client, data)
+
+    real_modify = chromadb.Collection.modify
+
+    def modify(self, name=None, **kwargs):
+        if self.name == f"{COLLECTION_NAME}_rebuild":
+            raise RuntimeError("disk full")
+        return real_modify(self, name=name, **kwargs)
+
+    monkeypatch.setattr(chromadb.Collection, "modify", modify)
+    with pytest.raises(RuntimeError):
+        rebuild_collection(client, data, get_hnsw_config(str(tmp_path)), db_path=str(tmp_path))
+
+    assert client.get_collection(COLLECTION_NAME).count() == len(data["ids"])
+
+
+def test_interrupted_rebuild_is_recovered(tmp_path):
+    client = chromadb.PersistentClient(path=str(tmp_path))
+    data = dataset()
+    # What a crash between the two renames leaves behind
+    live_collection(client, data).modify(name=f"{COLLECTION_NAME}_previous")
+
+    assert recover_interrupted_rebuild(client)
+    assert client.get_collection(COLLECTION_NAME).count() == len(data["ids"])
+    assert not recover_interrupted_rebuild(client)
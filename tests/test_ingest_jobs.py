@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+import dedup
+import ingest_jobs
+from ingest_jobs import run_worker
+
+DOCUMENTS = [
+    {"content": f"Show number {i} was played at venue {i}. The second set opened with song {i}. "
+                f"The encore was song {i + 100}.", "date": f"1977-05-{i + 1:02d}"}
+    for i in range(12)
+]
+
+
+class FakeModel:
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, batch_size=32):
+        self.calls.append(len(texts))
+        return np.array([[float(hash(t) % 1000), 1.0] for t in texts], dtype=np.float32)
+
+
+class FakeBulkEmbedder(FakeModel):
+    shard_size = 7
+
+    def encode_shards(self, texts, batch_size=32):
+        self.calls.append(len(texts))
+        for start in range(0, len(texts), self.shard_size):
+            yield FakeModel.encode(self, texts[start:start + self.shard_size])
+
+
+@pytest.fixture
+def harvest(monkeypatch):
+    monkeypatch.setattr(dedup, "DEDUP_ENABLED", False)
+    monkeypatch.setattr(ingest_jobs, "harvest_source", lambda source, emit=None: list(DOCUMENTS))
+
+
+def run(model, batch_size):
+    events = []
+    run_worker(["archive"], batch_size, events.append, model=model)
+    return [e for e in events if e["event"] == "batch"], [e for e in events if e["event"] == "chunked"][0]
+
+
+def test_bulk_embedder_gets_the_whole_chunk_list_in_one_pass(harvest):
+    model = FakeBulkEmbedder()
+    batches, chunked = run(model, batch_size=5)
+
+    assert model.calls[0] == chunked["chunks"]
+    assert [len(b["chunks"]) for b in batches][:-1] == [5] * (len(batches) - 1)
+    assert sum(len(b["chunks"]) for b in batches) == chunked["chunks"]
+    for batch in batches:
+        assert len(batch["embeddings"]) == len(batch["chunks"])
+        expected = FakeModel().encode([c["content"] for c in batch["chunks"]])
+        assert np.array_equal(batch["embeddings"], expected)
+
+
+def test_plain_model_is_called_per_write_batch(harvest):
+    model = FakeModel()
+    batches, chunked = run(model, batch_size=5)
+
+    assert max(model.calls) <= 5
+    assert sum(len(b["chunks"]) for b in batches) == chunked["chunks"]
+    parents = [p["id"] for b in batches for p in b["parents"]]
+    assert len(parents) == len(set(parents)) == chunked["documents"]
+
+
+def test_streamed_groups_are_deduped_against_earlier_groups_of_the_job(monkeypatch, tmp_path):
+    # Relative KNOWLEDGE_DB_PATH: nothing on disk, and the job must not write the index itself
+    monkeypatch.chdir(tmp_path)
+    groups = [DOCUMENTS[:3], DOCUMENTS[2:5]]
+    monkeypatch.setattr(ingest_jobs, "stream_source", lambda source: iter(groups))
+
+    events = []
+    run_worker(["crawl"], 5, events.append, model=FakeModel())
+
+    reports = [e for e in events if e["event"] == "deduplicated"]
+    assert reports[-1]["already_indexed"] == 1
+    assert reports[-1]["output_documents"] == 5
+    assert not list(tmp_path.rglob("*.npz"))
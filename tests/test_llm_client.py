@@ -0,0 +1,248 @@
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from llm_client import CircuitBreaker, CircuitOpenError, LLMUnavailableError, ResilientLLMClient
+
+
+def completion(content="Scarlet > Fire"):
+    return {
+        "id": "chatcmpl-test",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": "gpt-3.5-turbo",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 12, "completion_tokens": 3, "total_tokens": 15,
+                  "prompt_tokens_details": {"cached_tokens": 8}},
+    }
+
+
+class FakeOpenAI:
+    """Local chat-completions server that plays back a script of (status, delay) per request"""
+
+    def __init__(self):
+        self.script = []
+        self.default = (200, 0.0)
+        self.requests = 0
+        self.lock = threading.Lock()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                with fake.lock:
+                    fake.requests += 1
+                    status, delay = fake.script.pop(0) if fake.script else fake.default
+                time.sleep(delay)
+                body = json.dumps(completion() if status == 200 else {"error": {"message": "nope", "type": "x"}})
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body.encode("utf-8"))
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client gave up (timeout or lost hedge race)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}/v1"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def fake():
+    server = FakeOpenAI()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def make_client(fake, monkeypatch):
+    def make(**env):
+        settings = {"LLM_TIMEOUT_SECONDS": 2, "LLM_DEADLINE_SECONDS": 5, "LLM_MAX_RETRIES": 2,
+                    "LLM_BACKOFF_BASE_SECONDS": 0.01, "LLM_HEDGE": "false", "LLM_BREAKER_FAILURES": 5,
+                    "LLM_BREAKER_RESET_SECONDS": 30}
+        settings.update(env)
+        for key, value in settings.items():
+            monkeypatch.setenv(key, str(value))
+        return ResilientLLMClient("test-key", base_url=fake.base_url)
+    return make
+
+
+MESSAGES = [{"role": "user", "content": "What did they open with at Cornell?"}]
+
+
+def test_retries_server_errors_then_succeeds(fake, make_client):
+    fake.script = [(500, 0), (503, 0)]
+    client = make_client()
+    response = client.complete(MESSAGES)
+    assert response.choices[0].message.content == "Scarlet > Fire"
+    assert fake.requests == 3
+    stats = client.get_stats()
+    assert stats["retries"] == 2
+    assert stats["prompt_tokens"] == 12 and stats["cached_prompt_tokens"] == 8
+    assert stats["breaker_state"] == "closed"
+
+
+def test_gives_up_after_max_retries(fake, make_client):
+    fake.default = (500, 0)
+    client = make_client(LLM_MAX_RETRIES=1)
+    with pytest.raises(LLMUnavailableError):
+        client.complete(MESSAGES)
+    assert fake.requests == 2
+    assert client.get_stats()["failures"] == 1
+
+
+def test_bad_request_is_not_retried(fake, make_client):
+    import openai
+    fake.script = [(400, 0)]
+    client = make_client()
+    with pytest.raises(openai.BadRequestError):
+        client.complete(MESSAGES)
+    assert fake.requests == 1
+
+
+def test_deadline_caps_slow_upstream(fake, make_client):
+    fake.default = (200, 1.5)
+    client = make_client(LLM_TIMEOUT_SECONDS=5, LLM_DEADLINE_SECONDS=0.5)
+    start = time.monotonic()
+    with pytest.raises(LLMUnavailableError):
+        client.complete(MESSAGES)
+    assert time.monotonic() - start < 1.5
+
+
+def test_unhedged_calls_stay_on_the_calling_thread(fake, make_client):
+    client = make_client()
+
+    def no_executor(*args, **kwargs):
+        raise AssertionError("unhedged calls should not go through the executor")
+
+    client.executor.submit = no_executor
+    assert client.complete(MESSAGES).choices[0].message.content == "Scarlet > Fire"
+
+
+def test_hedged_request_wins_over_a_slow_one(fake, make_client):
+    fake.script = [(200, 1.5), (200, 0)]
+    client = make_client(LLM_HEDGE="true", LLM_TIMEOUT_SECONDS=3, LLM_HEDGE_MIN_DELAY_SECONDS=0.2)
+    # No latency history yet, so the hedge fires after max(min delay, timeout / 2)
+    client.timeout = 0.4
+    start = time.monotonic()
+    client.complete(MESSAGES)
+    assert time.monotonic() - start < 1.0
+    stats = client.get_stats()
+    assert stats["hedges"] == 1 and stats["hedge_wins"] == 1
+
+
+def test_fast_response_is_not_hedged(fake, make_client):
+    client = make_client(LLM_HEDGE="true", LLM_HEDGE_MIN_DELAY_SECONDS=0.5)
+    client.complete(MESSAGES)
+    assert fake.requests == 1
+    assert client.get_stats()["hedges"] == 0
+
+
+def test_breaker_opens_short_circuits_and_recovers(fake, make_client):
+    fake.default = (500, 0)
+    client = make_client(LLM_MAX_RETRIES=0, LLM_BREAKER_FAILURES=2, LLM_BREAKER_RESET_SECONDS=0.3)
+    for _ in range(2):
+        with pytest.raises(LLMUnavailableError):
+            client.complete(MESSAGES)
+    assert client.breaker.state == "open"
+
+    with pytest.raises(CircuitOpenError):
+        client.complete(MESSAGES)
+    assert fake.requests == 2
+
+    time.sleep(0.35)
+    assert client.breaker.state == "half_open"
+    fake.default = (200, 0)
+    client.complete(MESSAGES)
+    assert client.breaker.state == "closed"
+
+
+def test_failed_probe_reopens_the_breaker(fake, make_client):
+    fake.default = (500, 0)
+    client = make_client(LLM_MAX_RETRIES=2, LLM_BREAKER_FAILURES=1, LLM_BREAKER_RESET_SECONDS=0.2)
+    with pytest.raises(LLMUnavailableError):
+        client.complete(MESSAGES)
+    # The first failure opened the breaker, so the retries were skipped
+    assert fake.requests == 1
+
+    time.sleep(0.25)
+    with pytest.raises(LLMUnavailableError):
+        client.complete(MESSAGES)
+    assert fake.requests == 2
+    assert client.breaker.state == "open"
+
+
+def test_half_open_lets_a_single_probe_through(fake, make_client):
+    client = make_client(LLM_MAX_RETRIES=0, LLM_BREAKER_FAILURES=1, LLM_BREAKER_RESET_SECONDS=0.1)
+    fake.script = [(500, 0)]
+    with pytest.raises(LLMUnavailableError):
+        client.complete(MESSAGES)
+    time.sleep(0.15)
+
+    # The probe is slow; everything arriving meanwhile is short-circuited
+    fake.default = (200, 0.5)
+    probe = threading.Thread(target=client.complete, args=(MESSAGES,))
+    probe.start()
+    time.sleep(0.1)
+    for _ in range(3):
+        with pytest.raises(CircuitOpenError):
+            client.complete(MESSAGES)
+    probe.join()
+    assert fake.requests == 2
+    assert client.breaker.state == "closed"
+    client.complete(MESSAGES)
+
+
+def test_breaker_probe_is_released_by_an_inconclusive_error():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.allow_request()
+    other = []
+    thread = threading.Thread(target=lambda: other.append(breaker.allow_request()))
+    thread.start()
+    thread.join()
+    assert other == [False]
+    breaker.release_probe()
+    thread = threading.Thread(target=lambda: other.append(breaker.allow_request()))
+    thread.start()
+    thread.join()
+    assert other == [False, True]
+
+
+def test_usage_hook_sees_each_call_and_stats_add_up(fake, make_client):
+    client = make_client()
+    records = []
+    client.usage_hook = records.append
+
+    client.complete(MESSAGES)
+    client.complete(MESSAGES)
+
+    assert records == [{"prompt_tokens": 12, "cached_prompt_tokens": 8, "completion_tokens": 3}] * 2
+    stats = client.get_stats()
+    assert stats["uncached_prompt_tokens"] == 8 and stats["prompt_cache_hit_rate"] == round(16 / 24, 4)
+
+
+def test_failed_calls_do_not_reach_the_usage_hook(fake, make_client):
+    fake.default = (500, 0)
+    client = make_client(LLM_MAX_RETRIES=0)
+    records = []
+    client.usage_hook = records.append
+
+    with pytest.raises(LLMUnavailableError):
+        client.complete(MESSAGES)
+
+    assert records == [] and client.get_stats()["prompt_tokens"] == 0
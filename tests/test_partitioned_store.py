@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from partitioned_store import PartitionedStore, merge_hits, route_query
+
+PARTITIONS = ["albums", "band_members", "musical_style", "shows", "songs", "statistics"]
+
+
+@pytest.mark.parametrize("question, route", [
+    ("Who produced American Beauty?", None),
+    ("Tell me about the Wall of Sound", None),
+    ("Who played keyboards on Europe 72?", ["shows", "band_members"]),
+    ("What was the most played song?", ["shows", "songs"]),
+    ("Which album was released in 1970?", ["shows", "albums"]),
+])
+def test_catch_all_words_do_not_route(question, route):
+    assert route_query(question, PARTITIONS) == route
+
+
+def unit(*values):
+    vector = np.zeros(8, dtype=np.float32)
+    vector[:len(values)] = values
+    return vector / np.linalg.norm(vector)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = PartitionedStore("numpy", db_path=str(tmp_path))
+    rows = [
+        ("show-1", unit(0, 1, 0.2), "shows", "Europe '72 tour, Lyceum Theatre"),
+        ("show-2", unit(0, 1, 0.1), "shows", "Europe '72 tour, Tivoli Gardens"),
+        ("show-3", unit(0, 1), "shows", "Europe '72 tour, Wembley"),
+        ("member-1", unit(1, 0.3), "band_members", "Keith Godchaux played piano on the Europe '72 tour"),
+        ("album-1", unit(0.2, 0, 1), "albums", "Europe '72 is a live triple album"),
+    ]
+    store.add(ids=[r[0] for r in rows], embeddings=[r[1].tolist() for r in rows], documents=[r[3] for r in rows],
+              metadatas=[{"category": r[2]} for r in rows])
+    return store
+
+
+def test_unrouted_partitions_still_compete(store):
+    # Closest to the band member document, but routed to shows only
+    results = store.query([unit(1, 0.35).tolist()], n_results=3, preferred=["shows"])
+
+    assert results["ids"][0][0] == "member-1"
+    assert len(results["ids"][0]) == 3
+
+
+def test_weak_route_falls_back_to_every_partition(store):
+    results = store.query([unit(0.1, 0, 1).tolist()], n_results=2, preferred=["shows"])
+
+    assert results["ids"][0][0] == "album-1"
+
+
+def test_merge_caps_unrouted_partitions_together():
+    hits = [("a", 0.9, {}), ("b", 0.8, {}), ("r", 0.5, {}), ("r", 0.4, {}), ("a", 0.3, {})]
+
+    merged = merge_hits(hits, 3, max_share=1.0, unrouted={"a", "b"}, unrouted_quota=1)
+
+    assert [(name, similarity) for name, similarity, _ in merged] == [("a", 0.9), ("r", 0.5), ("r", 0.4)]
+
+
+def test_queries_reuse_partition_counts_until_a_write(store, monkeypatch):
+    calls = []
+    for name, partition in store.partitions.items():
+        count = partition.count
+        monkeypatch.setattr(partition, "count", lambda name=name, count=count: calls.append(name) or count())
+
+    for _ in range(3):
+        store.query([unit(0, 1).tolist()], n_results=2)
+    assert sorted(calls) == ["albums", "band_members", "shows"]
+
+    store.add(ids=["show-4"], embeddings=[unit(0, 1, 0.3).tolist()], documents=["Europe '72 tour, Olympia"],
+              metadatas=[{"category": "shows"}])
+    results = store.query([unit(0, 1, 0.3).tolist()], n_results=1)
+    assert results["ids"][0] == ["show-4"]
+    assert sorted(calls) == ["albums", "band_members", "shows", "shows"]
+    assert store.counts()["shows"] == 4
@@ -0,0 +1,28 @@
+from prompts import SYSTEM_PROMPT, build_messages
+
+DOCS = [{"content": "Cornell 1977 opened with New Minglewood Blues."}, {"content": "It was at Barton Hall."}]
+HISTORY = [{"role": "user" if i % 2 == 0 else "assistant", "content": f"turn {i}"} for i in range(10)]
+
+
+def test_messages_run_from_most_to_least_shareable():
+    messages = build_messages("Who played?", DOCS, HISTORY, conversation_summary="They asked about 1977.")
+
+    assert messages[0] == {"role": "system", "content": SYSTEM_PROMPT}
+    assert messages[1]["role"] == "system"
+    assert messages[1]["content"] == ("Context information:\nCornell 1977 opened with New Minglewood Blues.\n\n"
+                                      "It was at Barton Hall.\n\nSummary of earlier conversation:\n"
+                                      "They asked about 1977.")
+    assert [m["content"] for m in messages[2:-1]] == [f"turn {i}" for i in range(4, 10)]
+    assert messages[-1] == {"role": "user", "content": "Who played?"}
+
+
+def test_the_prefix_does_not_change_as_a_session_grows():
+    first = build_messages("Who played?", DOCS, HISTORY[:2])
+    later = build_messages("And the encore?", DOCS, HISTORY[:4])
+
+    assert later[:len(first) - 1] == first[:-1]
+
+
+def test_the_system_prompt_is_the_same_for_every_question():
+    assert build_messages("a", [])[0] == build_messages("b", DOCS, HISTORY, "summary")[0]
+    assert build_messages("a", [])[1]["content"] == "Context information:\n"
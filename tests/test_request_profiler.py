@@ -0,0 +1,33 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from request_profiler import StackSampler, propagate
+
+
+def busy_in_pool_thread(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+    return threading.get_ident()
+
+
+def test_pool_work_for_a_profiled_request_is_sampled():
+    sampler = StackSampler(threading.get_ident(), 0.002)
+    sampler.start()
+    try:
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            workers = list(executor.map(propagate(busy_in_pool_thread), [0.2, 0.2]))
+    finally:
+        stacks = sampler.stop()
+
+    assert any(stack.endswith("test_request_profiler.py:busy_in_pool_thread") for stack in stacks)
+    assert not sampler.threads
+    # Back to unprofiled: nothing to propagate once the request is done
+    assert propagate(busy_in_pool_thread) is busy_in_pool_thread
+    assert threading.get_ident() not in workers
+
+
+def test_unprofiled_work_is_left_alone():
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        assert executor.submit(propagate(busy_in_pool_thread), 0).result()
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from retrieval_session import SessionRetriever, looks_like_follow_up
+
+
+@pytest.mark.parametrize("message", [
+    "Who wrote it?",
+    "When did they first play it?",
+    "Tell me more",
+    "And why?",
+    "Was that a good show?",
+    "Did he sing on it?",
+])
+def test_follow_ups(message):
+    assert looks_like_follow_up(message)
+
+
+@pytest.mark.parametrize("message", [
+    "What about Europe '72?",
+    "Why did Pigpen leave the band?",
+    "So who was Keith Godchaux?",
+    "And Brent Mydland?",
+    "Pigpen?",
+    "What about the second set?",
+    "Did they play it in 1977?",
+    "Who played keyboards on it after Pigpen died?",
+])
+def test_new_questions(message):
+    assert not looks_like_follow_up(message)
+
+
+class FakeChatbot:
+    def __init__(self, vectors):
+        self.vectors = vectors
+        self.searches = []
+
+        class Model:
+            def encode(inner, texts):
+                return [self.vectors[texts[0]]]
+
+        self.embedding_model = Model()
+
+    def search_knowledge(self, query, n_results, embedding):
+        self.searches.append(query)
+        return [{"content": f"{query} #{i}"} for i in range(n_results)]
+
+
+def test_opener_without_a_new_name_goes_through_the_similarity_check():
+    chatbot = FakeChatbot({
+        "Tell me about Cornell 1977": np.array([1.0, 0.0]),
+        "And the second set?": np.array([0.95, 0.3]),
+        "What about the Wall of Sound?": np.array([0.0, 1.0]),
+    })
+    retriever = SessionRetriever(chatbot)
+    state = {}
+    first = retriever.retrieve("Tell me about Cornell 1977", state)
+    assert retriever.retrieve("And the second set?", state) == first
+    assert retriever.stats["similarity_reuse"] == 1
+
+    docs = retriever.retrieve("What about the Wall of Sound?", state)
+    assert chatbot.searches[-1] == "What about the Wall of Sound?"
+    assert docs != first
+    assert retriever.stats["heuristic_reuse"] == 0
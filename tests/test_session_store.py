@@ -0,0 +1,75 @@
+import time
+
+import pytest
+
+from session_store import MESSAGE_OVERHEAD, SESSION_OVERHEAD, Message, SessionStore
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    return now
+
+
+def turn_bytes(question, answer):
+    return len(question) + len(answer) + 2 * MESSAGE_OVERHEAD
+
+
+def test_history_is_a_ring_buffer(clock):
+    store = SessionStore(max_messages=4)
+    for i in range(3):
+        store.append_turn("s1", f"question {i}", f"answer {i}")
+
+    assert [m.content for m in store.get("s1").history] == ["question 1", "answer 1", "question 2", "answer 2"]
+    assert store.total_bytes == SESSION_OVERHEAD + 2 * turn_bytes("question 0", "answer 0")
+
+
+def test_least_recently_used_sessions_go_first_past_the_budget(clock):
+    budget = SESSION_OVERHEAD + turn_bytes("q", "a")
+    store = SessionStore(budget_bytes=2 * budget)
+    store.append_turn("s1", "q", "a")
+    store.append_turn("s2", "q", "a")
+    store.get_or_create("s1")
+
+    store.append_turn("s3", "q", "a")
+
+    assert "s2" not in store and "s1" in store and "s3" in store
+    assert store.get_stats()["evicted"] == 1 and store.total_bytes == 2 * budget
+
+
+def test_the_session_being_written_is_never_evicted(clock):
+    store = SessionStore(budget_bytes=10)
+
+    session = store.append_turn("s1", "a long question " * 10, "a long answer " * 10)
+
+    assert "s1" in store and len(session.history) == 2
+
+
+def test_idle_sessions_expire_when_touched_or_when_others_are(clock):
+    store = SessionStore(ttl_seconds=60)
+    store.append_turn("s1", "q", "a")
+    store.append_turn("s2", "q", "a")
+    clock[0] += 30
+    store.get_or_create("s2")
+    clock[0] += 31
+
+    # s1 has been idle past the TTL and is dropped by unrelated activity
+    store.get_or_create("s3")
+    assert "s1" not in store and "s2" in store
+
+    clock[0] += 61
+    assert len(store.get_or_create("s2").history) == 0
+    assert store.get_stats()["expired"] == 3 and len(store) == 1
+    assert store.total_bytes == SESSION_OVERHEAD
+
+
+def test_rewrite_and_discard_keep_the_byte_count(clock):
+    store = SessionStore()
+    session = store.append_turn("s1", "question", "answer")
+
+    store.rewrite(session, [Message("user", "question", 1000)], "summary")
+
+    assert store.total_bytes == SESSION_OVERHEAD + len("summary") + len("question") + MESSAGE_OVERHEAD
+    assert store.discard("s1") and not store.discard("s1")
+    assert store.total_bytes == 0 and store.get_stats()["sessions"] == 0
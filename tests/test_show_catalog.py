@@ -0,0 +1,63 @@
+import store_log
+from show_catalog import ShowCatalog
+
+
+def show(date, venue, city, type_="archive_show"):
+    return {"category": "shows", "type": type_, "date": date, "venue": venue, "city": city}
+
+
+def test_a_date_stays_until_its_last_document_is_removed(tmp_path):
+    catalog = ShowCatalog(str(tmp_path))
+    tape = show("1977-05-08", "Barton Hall", "Ithaca, NY")
+    setlist = show("1977-05-08", "Barton Hall", "Ithaca, NY", "setlist_data")
+    catalog.add_documents([tape, setlist, show("1977-05-09", "Buffalo Memorial Auditorium", "Buffalo, NY")])
+    assert catalog.count_shows("1977-05-01", "1977-05-31") == 2
+
+    catalog.remove_documents([tape])
+    assert catalog.count_shows("1977-05-01", "1977-05-31") == 2
+    catalog.remove_documents([setlist])
+    assert catalog.count_shows("1977-05-01", "1977-05-31") == 1
+
+    reloaded = ShowCatalog(str(tmp_path))
+    assert reloaded.shows_between() == [{"date": "1977-05-09", "venue": "Buffalo Memorial Auditorium",
+                                         "city": "Buffalo, NY"}]
+    assert reloaded.shows_at_venue("Barton Hall") == []
+
+
+def test_writes_are_logged_and_merged_into_the_columns_by_the_next_query(tmp_path, monkeypatch):
+    monkeypatch.setattr(store_log, "STORE_COMPACT_MIN_RECORDS", 1000)
+    catalog = ShowCatalog(str(tmp_path))
+    catalog.add_documents([show("1977-05-08", "", "Ithaca, NY", "setlist_data")])
+    catalog.add_documents([show("1972-08-27", "Old Renaissance Faire Grounds", "Veneta, OR")])
+    catalog.add_documents([show("1977-05-08", "Barton Hall", "")])
+
+    assert not (tmp_path / "show_catalog.npz").exists()
+    assert len(catalog._pending) == 2
+    assert catalog.shows_between() == [
+        {"date": "1972-08-27", "venue": "Old Renaissance Faire Grounds", "city": "Veneta, OR"},
+        {"date": "1977-05-08", "venue": "Barton Hall", "city": "Ithaca, NY"},
+    ]
+    assert not catalog._pending
+    assert ShowCatalog(str(tmp_path)).shows_at_venue("barton") == [
+        {"date": "1977-05-08", "venue": "Barton Hall", "city": "Ithaca, NY"}]
+
+
+def test_compacted_catalog_keeps_pending_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(store_log, "STORE_COMPACT_MIN_RECORDS", 2)
+    catalog = ShowCatalog(str(tmp_path))
+    for day in range(1, 5):
+        catalog.add_documents([show(f"1977-05-0{day}", "Winterland", "San Francisco, CA")])
+
+    assert (tmp_path / "show_catalog.npz").exists()
+    assert ShowCatalog(str(tmp_path)).counts_by_year() == {1977: 4}
+
+
+def test_writers_in_two_processes_keep_each_others_shows(tmp_path):
+    server, cli = ShowCatalog(str(tmp_path)), ShowCatalog(str(tmp_path))
+
+    server.add_documents([show("1977-05-08", "Barton Hall", "Ithaca, NY")])
+    cli.add_documents([show("1972-08-27", "Old Renaissance Faire Grounds", "Veneta, OR")])
+    server.remove_documents([show("1977-05-08", "Barton Hall", "Ithaca, NY")])
+
+    for catalog in (server, cli):
+        assert [row["date"] for row in catalog.shows_between()] == ["1972-08-27"]
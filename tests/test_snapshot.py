@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from chunking import ParentDocumentStore
+from dedup import NearDuplicateIndex, minhash
+from snapshot import check_fingerprint, export_snapshot, import_snapshot, model_fingerprint
+from vector_store import NumpyFlatStore
+
+
+class FakeModel:
+    def __init__(self, dim=16, seed=0):
+        self.dim = dim
+        self.seed = seed
+
+    def encode(self, texts):
+        return np.random.RandomState(self.seed).randn(len(texts), self.dim).astype(np.float32)
+
+
+def knowledge_base(path):
+    store = NumpyFlatStore(str(path / "flat_index"), dtype="float32")
+    embeddings = np.random.RandomState(1).randn(4, 16).astype(np.float32)
+    store.add(ids=[f"doc_a#{i}" for i in range(4)], embeddings=embeddings.tolist(),
+              documents=[f"chunk {i}" for i in range(4)],
+              metadatas=[{"parent_id": "doc_a", "chunk_index": i, "source": "test"} for i in range(4)])
+    parents = ParentDocumentStore(str(path))
+    parents.add([{"id": "doc_a", "content": "Cornell 1977 is the famous one.", "metadata": {"source": "test"}}])
+    dedup = NearDuplicateIndex(str(path))
+    dedup.add([{"id": "doc_a", "content": "Cornell 1977 is the famous one.",
+                "metadata": {"type": "archive_show", "date": "1977-05-08"}}])
+    return store, parents, dedup
+
+
+def test_round_trip_restores_vectors_parents_and_signatures(tmp_path):
+    store, parents, dedup = knowledge_base(tmp_path / "source")
+    fingerprint = model_fingerprint(FakeModel())
+    snapshot_path = str(tmp_path / "kb.snapshot")
+
+    manifest = export_snapshot(store, snapshot_path, fingerprint, parent_store=parents, dedup_index=dedup)
+    assert manifest["count"] == 4 and manifest["parents"] == 1 and manifest["dedup_signatures"] == 1
+
+    target = tmp_path / "target"
+    new_store = NumpyFlatStore(str(target / "flat_index"), dtype="float32")
+    new_parents, new_dedup = ParentDocumentStore(str(target)), NearDuplicateIndex(str(target))
+    import_snapshot(snapshot_path, new_store, fingerprint=model_fingerprint(FakeModel()),
+                    parent_store=new_parents, dedup_index=new_dedup)
+
+    original, restored = store.get(include=["embeddings", "metadatas"]), new_store.get(include=["embeddings",
+                                                                                               "metadatas"])
+    assert restored["ids"] == original["ids"]
+    assert restored["metadatas"] == original["metadatas"]
+    assert np.allclose(restored["embeddings"], original["embeddings"], atol=1e-6)
+    assert new_parents.get("doc_a")["content"] == "Cornell 1977 is the famous one."
+    assert new_dedup.find(minhash("Cornell 1977 is the famous one.")) == "doc_a"
+    assert new_dedup.entries()[2] == dedup.entries()[2] and new_dedup.has_key(dedup.entries()[2][0])
+
+
+def test_import_refuses_a_snapshot_from_another_model(tmp_path):
+    store, parents, dedup = knowledge_base(tmp_path / "source")
+    snapshot_path = str(tmp_path / "kb.snapshot")
+    export_snapshot(store, snapshot_path, model_fingerprint(FakeModel()), parent_store=parents)
+
+    other = model_fingerprint(FakeModel(seed=7))
+    new_store = NumpyFlatStore(str(tmp_path / "target"), dtype="float32")
+    with pytest.raises(ValueError, match="different embedding model"):
+        import_snapshot(snapshot_path, new_store, fingerprint=other)
+    assert new_store.count() == 0
+
+    problems = check_fingerprint({"model": model_fingerprint(FakeModel())}, model_fingerprint(FakeModel(dim=8)))
+    assert any(problem.startswith("dim") for problem in problems)
+
+
+def test_tampered_snapshot_fails_the_checksum(tmp_path):
+    store, _, _ = knowledge_base(tmp_path / "source")
+    snapshot_path = str(tmp_path / "kb.snapshot")
+    export_snapshot(store, snapshot_path, model_fingerprint(FakeModel()))
+    with np.load(snapshot_path) as archive:
+        arrays = {name: archive[name] for name in archive.files}
+    arrays["embeddings"] = arrays["embeddings"] + 1
+    with open(snapshot_path, "wb") as f:
+        np.savez_compressed(f, **arrays)
+
+    with pytest.raises(ValueError, match="Checksum mismatch"):
+        import_snapshot(snapshot_path, NumpyFlatStore(str(tmp_path / "target"), dtype="float32"))
@@ -0,0 +1,31 @@
+import pytest
+
+import staging
+from staging import iter_staged_documents, retry_from_staging_hint, stage_fetched
+
+ALBUMS = [{"content": "American Beauty is a Grateful Dead album released in 1970.", "album": "American Beauty"}]
+
+
+def test_fetched_documents_are_staged_and_returned(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+
+    assert stage_fetched("musicbrainz", ALBUMS, url="https://musicbrainz.org/ws/2/release") is ALBUMS
+    assert [doc["album"] for doc in iter_staged_documents()] == ["American Beauty"]
+
+
+def test_a_staging_failure_does_not_lose_the_fetch(monkeypatch, capsys):
+    def broken(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(staging, "stage_documents", broken)
+
+    assert stage_fetched("musicbrainz", ALBUMS) is ALBUMS
+    assert "Could not stage musicbrainz documents: disk full" in capsys.readouterr().out
+
+
+def test_failed_write_points_at_the_staged_copy(capsys):
+    with pytest.raises(RuntimeError):
+        with retry_from_staging_hint():
+            raise RuntimeError("embedding failed")
+
+    assert "python staging.py ingest" in capsys.readouterr().out
@@ -0,0 +1,33 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+from store_log import hold_server_lock, refuse_if_served, serving_pids
+
+
+def test_cli_writers_refuse_while_a_server_holds_the_stores(tmp_path):
+    lock = hold_server_lock(str(tmp_path))
+
+    assert serving_pids(str(tmp_path)) == [os.getpid()]
+    with pytest.raises(SystemExit, match="POST /knowledge/ingest"):
+        refuse_if_served(str(tmp_path))
+
+    lock.release()
+    refuse_if_served(str(tmp_path))
+
+
+def test_lock_left_by_a_dead_server_is_cleaned_up(tmp_path):
+    script = textwrap.dedent(f"""
+        import os
+        from store_log import hold_server_lock
+        hold_server_lock({str(tmp_path)!r})
+        os._exit(0)
+    """)
+    subprocess.run([sys.executable, "-c", script], check=True, cwd=os.path.dirname(os.path.dirname(__file__)))
+
+    assert len(list(tmp_path.glob("server-*.lock"))) == 1
+    assert serving_pids(str(tmp_path)) == []
+    assert list(tmp_path.glob("server-*.lock")) == []
@@ -0,0 +1,110 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from vector_store import FLAT_INDEX_VERSION, NumpyFlatStore
+
+
+def vectors(n, dim=32, seed=0):
+    rows = np.random.RandomState(seed).randn(n, dim).astype(np.float32)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+def add(store, start, embeddings):
+    ids = [f"doc{i}" for i in range(start, start + len(embeddings))]
+    store.add(ids=ids, embeddings=embeddings.tolist(), documents=ids, metadatas=[{"n": i} for i in range(len(ids))])
+
+
+def stored(store):
+    return np.asarray(store.get(include=["embeddings"])["embeddings"], dtype=np.float32)
+
+
+def test_compressed_index_keeps_exact_vectors_without_rescoring(tmp_path):
+    store = NumpyFlatStore(str(tmp_path / "index"), dtype="int8", reduce="pca:8", rescore=0, pca_min_rows=50)
+    original = vectors(100)
+    add(store, 0, original)
+    add(store, 100, vectors(10, seed=1))
+    store.compact()
+
+    assert os.path.exists(tmp_path / "index" / "full.npy")
+    assert store._state["projection"] is not None
+    assert np.allclose(stored(store)[:100], original, atol=1e-6)
+
+
+def test_pca_waits_for_enough_rows(tmp_path):
+    store = NumpyFlatStore(str(tmp_path / "index"), dtype="float32", reduce="pca:8", pca_min_rows=50)
+    add(store, 0, vectors(20))
+    assert store._state["projection"] is None
+    assert store._state["embeddings"].shape == (20, 32)
+
+    add(store, 20, vectors(40, seed=1))
+    store.compact()
+    assert store._state["projection"] is not None
+    assert store._state["embeddings"].shape == (60, 8)
+
+
+def test_where_supports_chroma_comparison_operators(tmp_path):
+    store = NumpyFlatStore(str(tmp_path / "index"), dtype="float32")
+    add(store, 0, vectors(6))
+
+    def ids(where):
+        return sorted(store.get(where=where)["ids"])
+
+    assert ids({"n": {"$ne": 2}}) == ["doc0", "doc1", "doc3", "doc4", "doc5"]
+    assert ids({"n": {"$gte": 4}}) == ["doc4", "doc5"]
+    assert ids({"$and": [{"n": {"$gt": 0}}, {"n": {"$lt": 3}}]}) == ["doc1", "doc2"]
+    assert ids({"n": {"$nin": [0, 1, 2]}}) == ["doc3", "doc4", "doc5"]
+    assert ids({"missing": {"$ne": 1}}) == []
+
+
+def test_unknown_where_operator_is_a_clear_error(tmp_path):
+    store = NumpyFlatStore(str(tmp_path / "index"), dtype="float32")
+    add(store, 0, vectors(3))
+
+    with pytest.raises(ValueError, match=r"\$regex"):
+        store.query(vectors(1).tolist(), where={"n": {"$regex": "1"}})
+
+
+def test_newer_on_disk_format_is_rejected(tmp_path):
+    store = NumpyFlatStore(str(tmp_path / "index"), dtype="float32")
+    add(store, 0, vectors(3))
+    manifest_path = tmp_path / "index" / "manifest.json"
+    manifest = json.loads(manifest_path.read_text())
+    manifest_path.write_text(json.dumps(dict(manifest, version=FLAT_INDEX_VERSION + 1)))
+
+    with pytest.raises(ValueError, match="format version"):
+        NumpyFlatStore(str(tmp_path / "index"), dtype="float32")
+
+
+def test_older_on_disk_format_is_upgraded_by_writers_only(tmp_path):
+    store = NumpyFlatStore(str(tmp_path / "index"), dtype="float32")
+    add(store, 0, vectors(3))
+    manifest_path = tmp_path / "index" / "manifest.json"
+    manifest = json.loads(manifest_path.read_text())
+    # Format 1 had no base id or segments
+    old = {key: value for key, value in manifest.items() if key not in ("base_id", "segments", "deleted_rows")}
+    manifest_path.write_text(json.dumps(dict(old, version=1)))
+
+    reader = NumpyFlatStore(str(tmp_path / "index"), dtype="float32", read_only=True)
+    assert reader.count() == 3
+    assert json.loads(manifest_path.read_text())["version"] == 1
+
+    writer = NumpyFlatStore(str(tmp_path / "index"), dtype="float32")
+    assert json.loads(manifest_path.read_text())["version"] == FLAT_INDEX_VERSION
+    assert sorted(writer.get()["ids"]) == ["doc0", "doc1", "doc2"]
+
+
+def test_writers_in_two_processes_keep_each_others_rows(tmp_path):
+    first = NumpyFlatStore(str(tmp_path / "flat"), compact_min_rows=2)
+    second = NumpyFlatStore(str(tmp_path / "flat"), compact_min_rows=2)
+
+    add(first, 0, vectors(3))
+    add(second, 3, vectors(3, seed=1))
+    first.delete(["doc1"])
+    add(first, 6, vectors(2, seed=2))
+
+    expected = sorted(f"doc{i}" for i in range(8) if i != 1)
+    for store in (first, second, NumpyFlatStore(str(tmp_path / "flat"), read_only=True)):
+        assert sorted(store.get()["ids"]) == expected
@@ -0,0 +1,871 @@
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import uuid
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+import chromadb
+from filelock import FileLock
+from dotenv import load_dotenv
+from index_config import (KNOWLEDGE_DB_PATH, COLLECTION_NAME, collection_metadata, read_collection, write_collection,
+                          exact_neighbors, load_query_embeddings)
+
+# Load environment variables
+load_dotenv()
+
+FLAT_INDEX_DIR = "flat_index"
+PARTITION_DIR = "flat_partitions"
+SEGMENT_DIR = "segments"
+FLAT_INDEX_VERSION = 3
+# Compact segments and deleted rows into a new base once they exceed this share of it (and the minimum)
+FLAT_INDEX_COMPACT_RATIO = float(os.getenv("FLAT_INDEX_COMPACT_RATIO", 0.25))
+FLAT_INDEX_COMPACT_MIN_ROWS = int(os.getenv("FLAT_INDEX_COMPACT_MIN_ROWS", 2000))
+# PCA is only fitted on at least this many rows (and more rows than dimensions); smaller bases stay unreduced
+FLAT_INDEX_PCA_MIN_ROWS = int(os.getenv("FLAT_INDEX_PCA_MIN_ROWS", 1000))
+DEFAULT_INCLUDE = ["documents", "metadatas", "distances"]
+# Metadata comparisons `where` filters support, as in Chroma
+WHERE_OPERATORS = {
+    "$eq": lambda value, operand: value == operand,
+    "$ne": lambda value, operand: value != operand,
+    "$gt": lambda value, operand: value > operand,
+    "$gte": lambda value, operand: value >= operand,
+    "$lt": lambda value, operand: value < operand,
+    "$lte": lambda value, operand: value <= operand,
+    "$in": lambda value, operand: value in operand,
+    "$nin": lambda value, operand: value not in operand,
+}
+
+
+# PACKED STRING COLUMNS
+
+def pack_strings(values: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Pack strings into one UTF-8 byte array plus row offsets"""
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    if encoded:
+        offsets[1:] = np.cumsum(np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded)))
+    data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return data, offsets
+
+
+class StringColumn:
+    """Read-only view over a packed string column"""
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray):
+        self.data = data
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return self.data[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8")
+
+    def to_list(self) -> List[str]:
+        raw = self.data.tobytes()
+        offsets = self.offsets.tolist()
+        return [raw[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(self))]
+
+
+def parse_reduce(spec: Optional[str]) -> Optional[Tuple[str, int]]:
+    """'pca:128' or 'truncate:192' -> (kind, dim); empty -> None"""
+    if not spec:
+        return None
+    kind, _, dim = spec.partition(":")
+    if kind not in ("pca", "truncate") or not dim.isdigit():
+        raise ValueError(f"Invalid dimension reduction {spec!r} (use pca:<dim> or truncate:<dim>)")
+    return kind, int(dim)
+
+
+def _load_array(path: str, mmap: bool = True) -> np.ndarray:
+    """Memory-map an .npy file, falling back to a normal load for empty arrays"""
+    try:
+        return np.load(path, mmap_mode="r" if mmap else None)
+    except ValueError:
+        return np.load(path)
+
+
+# BACKENDS
+
+class ChromaVectorStore:
+    """Vector store backed by a persistent Chroma collection"""
+
+    backend = "chroma"
+
+    def __init__(self, db_path: str = KNOWLEDGE_DB_PATH, name: str = COLLECTION_NAME):
+        self.client = chromadb.PersistentClient(path=db_path)
+        self.collection = self.client.get_or_create_collection(
+            name=name,
+            metadata=collection_metadata()
+        )
+
+    def add(self, ids, embeddings, documents=None, metadatas=None):
+        self.collection.add(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def query(self, query_embeddings, n_results: int = 5, where: Optional[Dict] = None,
+              include: Optional[List[str]] = None) -> Dict[str, Any]:
+        return self.collection.query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            where=where,
+            include=include or DEFAULT_INCLUDE
+        )
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=None) -> Dict[str, Any]:
+        return self.collection.get(ids=ids, where=where, limit=limit, offset=offset,
+                                   include=include or ["documents", "metadatas"])
+
+    def delete(self, ids):
+        self.collection.delete(ids=ids)
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def __getattr__(self, name):
+        # Anything else (modify, peek, ...) goes straight to the Chroma collection
+        return getattr(self.collection, name)
+
+
+class NumpyFlatStore:
+    """Exact in-process vector store over a memory-mapped embedding matrix
+
+    Embeddings live in `embeddings.npy` (float16 or float32, L2-normalized so a
+    dot product is cosine similarity); ids, documents and each metadata key are
+    packed string columns next to it. Everything is opened with mmap, so any
+    number of read-only processes share one copy through the page cache.
+    Distances are cosine distances (1 - similarity), smaller is closer.
+
+    That compacted base is only rewritten now and then. Each `add` appends a
+    small segment (float32 vectors plus a JSONL of ids, documents and
+    metadata) under `segments/`, and `delete` records tombstoned rows in the
+    manifest, so a write costs the size of the batch, not of the index. Once
+    segments and tombstones outgrow FLAT_INDEX_COMPACT_RATIO of the base (and
+    FLAT_INDEX_COMPACT_MIN_ROWS), everything is compacted into a new base.
+    Writers in different processes take turns through `<path>.lock` and
+    reload the manifest before writing, so none drops another's rows.
+
+    The search matrix can be compressed further: `reduce` projects vectors
+    onto their top PCA components (fitted on the corpus at each rewrite, once
+    it has `pca_min_rows` rows) or truncates them, and dtype int8 quantizes
+    each dimension with its own scale. Compressed indexes always keep a
+    float32 copy (`full.npy`, memory-mapped), so compaction and exports stay
+    lossless; searches read it for the top `rescore` x k candidates only, and
+    rescore=0 searches on the compressed vectors alone.
+    """
+
+    backend = "numpy"
+
+    def __init__(self, path: str, dtype: str = "float16", read_only: bool = False,
+                 block_size: int = 32768, reduce: Optional[str] = None, rescore: int = 4,
+                 compact_ratio: float = FLAT_INDEX_COMPACT_RATIO, compact_min_rows: int = FLAT_INDEX_COMPACT_MIN_ROWS,
+                 pca_min_rows: int = FLAT_INDEX_PCA_MIN_ROWS):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.reduce = parse_reduce(reduce)
+        self.rescore = rescore
+        self.read_only = read_only
+        self.block_size = block_size
+        self.compact_ratio = compact_ratio
+        self.compact_min_rows = compact_min_rows
+        self.pca_min_rows = pca_min_rows
+        self._lock = threading.Lock()
+        # Next to the directory, which a rewrite replaces
+        self._file_lock = FileLock(f"{path}.lock")
+        if not read_only:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._manifest_mtime = None
+        self._state = self._empty_state()
+        self._load()
+        self._upgrade()
+
+    # Storage
+
+    def _empty_state(self) -> Dict[str, Any]:
+        return {
+            "manifest": None,
+            "base_id": None,
+            "base_count": 0,
+            # Rows are numbered base first, then segments in order; deleted rows keep their number until compaction
+            "count": 0,
+            "live": 0,
+            "dim": None,
+            "embeddings": np.zeros((0, 0), dtype=self.dtype),
+            "projection": None,
+            "scale": None,
+            "full": None,
+            "ids": [],
+            "id_index": {},
+            "documents": StringColumn(np.zeros(0, np.uint8), np.zeros(1, np.int64)),
+            "metadata": {},
+            "decoded": {},
+            "segments": [],
+            "segment_vectors": [],
+            "delta_ids": [],
+            "delta_documents": [],
+            "delta_metadatas": [],
+            "delta_matrix": None,
+            "deleted": frozenset(),
+        }
+
+    def _manifest_path(self, path: Optional[str] = None) -> str:
+        return os.path.join(path or self.path, "manifest.json")
+
+    def _load(self):
+        """Load (or reload) the index from disk, reusing the base and segments already loaded"""
+        manifest_path = self._manifest_path()
+        if not os.path.exists(manifest_path):
+            return
+
+        mtime = os.stat(manifest_path).st_mtime_ns
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        version = manifest.get("version", 1)
+        if version > FLAT_INDEX_VERSION:
+            raise ValueError(f"Flat index at {self.path} has format version {version}, but this code reads up to "
+                             f"version {FLAT_INDEX_VERSION}; upgrade it or rebuild the index")
+
+        # Indexes written before segments existed have no base id; their write time identifies them
+        base_id = manifest.get("base_id") or str(manifest["updated_at"])
+        previous = self._state
+        state = dict(previous) if base_id == previous["base_id"] else self._load_base(manifest, base_id)
+
+        segments = manifest.get("segments", [])
+        if state["segments"] != segments[:len(state["segments"])]:
+            state = self._load_base(manifest, base_id)
+        if len(segments) > len(state["segments"]):
+            for name in segments[len(state["segments"]):]:
+                self._load_segment(state, name)
+            state["segments"] = list(segments)
+
+        deleted = frozenset(manifest.get("deleted_rows", []))
+        if deleted != state["deleted"]:
+            for row in deleted - state["deleted"]:
+                state["id_index"].pop(state["ids"][row], None)
+            state["deleted"] = deleted
+        state["live"] = state["count"] - len(deleted)
+        state["manifest"] = manifest
+        self._state = state
+        self._manifest_mtime = mtime
+
+    def _upgrade(self):
+        """Rewrite an index in an older format (1: no segments, 2: compressed without full.npy) as the current one
+
+        Older formats still load as they are, so read-only processes use them
+        until a writer has upgraded them.
+        """
+        manifest = self._state["manifest"]
+        if self.read_only or manifest is None or manifest.get("version", 1) == FLAT_INDEX_VERSION:
+            return
+        print(f"🔄 Upgrading flat index at {self.path} from format version {manifest.get('version', 1)} "
+              f"to {FLAT_INDEX_VERSION}...")
+        self.compact()
+
+    def _load_base(self, manifest: Dict[str, Any], base_id: str) -> Dict[str, Any]:
+        def column(name):
+            return StringColumn(
+                _load_array(os.path.join(self.path, f"{name}.data.npy")),
+                _load_array(os.path.join(self.path, f"{name}.offsets.npy"))
+            )
+
+        def optional(name):
+            path = os.path.join(self.path, name)
+            return _load_array(path) if os.path.exists(path) else None
+
+        ids = column("ids").to_list()
+        state = self._empty_state()
+        state.update({
+            "base_id": base_id,
+            "base_count": manifest["count"],
+            "count": manifest["count"],
+            "dim": manifest["dim"],
+            "embeddings": _load_array(os.path.join(self.path, "embeddings.npy")),
+            "projection": optional("projection.npy"),
+            "scale": optional("scale.npy"),
+            "full": optional("full.npy"),
+            "ids": ids,
+            "id_index": {doc_id: i for i, doc_id in enumerate(ids)},
+            "documents": column("documents"),
+            "metadata": {key: column(f"meta.{i}") for i, key in enumerate(manifest["metadata_keys"])},
+        })
+        return state
+
+    def _load_segment(self, state: Dict[str, Any], name: str):
+        """Append one segment's rows to a state that isn't published yet"""
+        vectors = np.load(os.path.join(self.path, SEGMENT_DIR, f"{name}.npy"))
+        with open(os.path.join(self.path, SEGMENT_DIR, f"{name}.jsonl"), encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f]
+        self._extend_state(state, [row["id"] for row in rows], vectors,
+                           [row["document"] for row in rows], [row["metadata"] for row in rows])
+
+    @staticmethod
+    def _extend_state(state: Dict[str, Any], ids: List[str], vectors: np.ndarray, documents: List[str],
+                      metadatas: List[Dict]):
+        # Lists are shared with older snapshots, which only read rows below their own count
+        for doc_id in ids:
+            state["id_index"][doc_id] = state["count"]
+            state["ids"].append(doc_id)
+            state["count"] += 1
+        state["segment_vectors"] = state["segment_vectors"] + [vectors]
+        state["delta_ids"].extend(ids)
+        state["delta_documents"].extend(documents)
+        state["delta_metadatas"].extend(metadatas)
+        state["delta_matrix"] = None
+
+    def _changed(self) -> bool:
+        """Whether another process has changed the index since it was loaded"""
+        try:
+            return os.stat(self._manifest_path()).st_mtime_ns != self._manifest_mtime
+        except FileNotFoundError:
+            return False
+
+    def _maybe_reload(self):
+        """Pick up a change made by another process"""
+        if self._changed():
+            with self._lock:
+                self._load()
+
+    def _write_manifest(self, manifest: Dict[str, Any]):
+        tmp_path = f"{self._manifest_path()}.tmp-{os.getpid()}"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self._manifest_path())
+        self._manifest_mtime = os.stat(self._manifest_path()).st_mtime_ns
+
+    def _write(self, ids: List[str], embeddings: np.ndarray, documents: List[str], metadatas: List[Dict]):
+        """Write a complete new base (dropping all segments and tombstones) and swap it in atomically"""
+        tmp_path = f"{self.path}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+
+        def save_column(name, values):
+            data, offsets = pack_strings(values)
+            np.save(os.path.join(tmp_path, f"{name}.data.npy"), data)
+            np.save(os.path.join(tmp_path, f"{name}.offsets.npy"), offsets)
+
+        search, projection, scale = self._compress(embeddings)
+        np.save(os.path.join(tmp_path, "embeddings.npy"), search)
+        if projection is not None:
+            np.save(os.path.join(tmp_path, "projection.npy"), projection)
+        if scale is not None:
+            np.save(os.path.join(tmp_path, "scale.npy"), scale)
+        compressed = projection is not None or scale is not None
+        if compressed:
+            np.save(os.path.join(tmp_path, "full.npy"), np.ascontiguousarray(embeddings, dtype=np.float32))
+        save_column("ids", ids)
+        save_column("documents", documents)
+
+        keys = sorted({key for metadata in metadatas for key in metadata})
+        for i, key in enumerate(keys):
+            save_column(f"meta.{i}", [json.dumps(m[key]) if key in m else "" for m in metadatas])
+
+        manifest = {
+            "version": FLAT_INDEX_VERSION,
+            "base_id": uuid.uuid4().hex,
+            "count": len(ids),
+            "dim": int(embeddings.shape[1]) if len(ids) else None,
+            "dtype": self.dtype.name,
+            "reduce": f"{self.reduce[0]}:{self.reduce[1]}" if self.reduce else None,
+            "search_dim": int(search.shape[1]) if len(ids) else None,
+            "rescore": compressed,
+            "metadata_keys": keys,
+            "segments": [],
+            "deleted_rows": [],
+            "updated_at": time.time(),
+        }
+        with open(self._manifest_path(tmp_path), "w") as f:
+            json.dump(manifest, f)
+
+        # Readers that already mapped the old files keep them until they reload
+        old_path = f"{self.path}.old-{os.getpid()}"
+        if os.path.exists(self.path):
+            os.rename(self.path, old_path)
+        os.rename(tmp_path, self.path)
+        shutil.rmtree(old_path, ignore_errors=True)
+        self._load()
+
+    def _append_segment(self, ids: List[str], vectors: np.ndarray, documents: List[str], metadatas: List[Dict]):
+        """Write new rows as one segment, then publish it in the manifest"""
+        state = self._state
+        name = f"{len(state['segments']):06d}-{uuid.uuid4().hex[:8]}"
+        directory = os.path.join(self.path, SEGMENT_DIR)
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, f"{name}.npy"), np.ascontiguousarray(vectors, dtype=np.float32))
+        with open(os.path.join(directory, f"{name}.jsonl"), "w", encoding="utf-8") as f:
+            for doc_id, document, metadata in zip(ids, documents, metadatas):
+                f.write(json.dumps({"id": doc_id, "document": document, "metadata": metadata}) + "\n")
+
+        manifest = dict(state["manifest"], segments=state["segments"] + [name], updated_at=time.time())
+        self._write_manifest(manifest)
+        state = dict(state, manifest=manifest, segments=manifest["segments"])
+        self._extend_state(state, ids, np.asarray(vectors, dtype=np.float32), documents, metadatas)
+        state["live"] = state["count"] - len(state["deleted"])
+        self._state = state
+
+    def _maybe_compact(self):
+        state = self._state
+        pending = state["count"] - state["base_count"] + len(state["deleted"])
+        if pending > max(self.compact_min_rows, self.compact_ratio * state["base_count"]):
+            self._compact()
+
+    def _compact(self):
+        ids, vectors, documents, metadatas = self._live_rows()
+        self._write(ids, vectors if len(ids) else np.zeros((0, self._state["dim"] or 0), dtype=np.float32),
+                    documents, metadatas)
+
+    def compact(self):
+        """Fold all segments and tombstones into a new base"""
+        if self.read_only:
+            raise PermissionError("Vector store was opened read-only")
+        with self._lock, self._file_lock:
+            if self._changed():
+                self._load()
+            self._compact()
+
+    def _compress(self, vectors: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray], Optional[np.ndarray]]:
+        """Search matrix for normalized float32 vectors, plus the projection and int8 scales it used"""
+        projection = None
+        search = vectors
+        kind, dim = self.reduce or (None, None)
+        # Components fitted on a handful of rows don't generalize to the vectors added after them
+        too_few_rows = kind == "pca" and len(vectors) < max(self.pca_min_rows, vectors.shape[1] + 1)
+        if kind and len(vectors) and dim < vectors.shape[1] and not too_few_rows:
+            if kind == "truncate":
+                projection = np.eye(vectors.shape[1], dim, dtype=np.float32)
+            else:
+                # Top principal directions of the corpus, via the small d x d covariance matrix
+                centered = vectors - vectors.mean(axis=0)
+                _, eigenvectors = np.linalg.eigh(centered.T @ centered)
+                projection = np.ascontiguousarray(eigenvectors[:, ::-1][:, :dim], dtype=np.float32)
+            search = self._normalize(vectors @ projection)
+
+        scale = None
+        if self.dtype == np.int8:
+            # Symmetric per-dimension scalar quantization
+            scale = (np.abs(search).max(axis=0) / 127.0).astype(np.float32) if len(search) else None
+            if scale is not None:
+                scale[scale == 0] = 1.0
+                search = np.clip(np.round(search / scale), -127, 127)
+        return np.ascontiguousarray(search, dtype=self.dtype), projection, scale
+
+    @staticmethod
+    def _delta_matrix(state: Dict[str, Any]) -> np.ndarray:
+        """Segment vectors (full precision) as one matrix, built once per state"""
+        if state["delta_matrix"] is None:
+            rows = state["count"] - state["base_count"]
+            if state["segment_vectors"]:
+                state["delta_matrix"] = np.vstack(state["segment_vectors"])[:rows]
+            else:
+                state["delta_matrix"] = np.zeros((0, state["dim"] or 0), dtype=np.float32)
+        return state["delta_matrix"]
+
+    def _base_vectors(self, rows) -> np.ndarray:
+        state = self._state
+        if state["full"] is not None:
+            return np.asarray(state["full"][rows], dtype=np.float32)
+        vectors = np.asarray(state["embeddings"][rows], dtype=np.float32)
+        if state["scale"] is not None:
+            vectors = vectors * state["scale"]
+        if state["projection"] is not None:
+            vectors = self._normalize(vectors @ state["projection"].T)
+        return vectors
+
+    def _vectors(self, rows) -> np.ndarray:
+        """Full-dimension float32 vectors for rows: stored exactly, or reconstructed from the search matrix"""
+        state = self._state
+        rows = np.arange(state["count"])[rows] if isinstance(rows, slice) else np.asarray(rows, dtype=np.int64)
+        vectors = np.empty((len(rows), state["dim"] or 0), dtype=np.float32)
+        in_base = rows < state["base_count"]
+        if in_base.any():
+            vectors[in_base] = self._base_vectors(rows[in_base])
+        if not in_base.all():
+            vectors[~in_base] = self._delta_matrix(state)[rows[~in_base] - state["base_count"]]
+        return vectors
+
+    def memory_report(self) -> Dict[str, Any]:
+        """Bytes of the search matrix (what stays hot in RAM) vs a plain float32 index"""
+        state = self._state
+        search_bytes = int(state["embeddings"].nbytes) + int(self._delta_matrix(state).nbytes)
+        for extra in ("projection", "scale"):
+            if state[extra] is not None:
+                search_bytes += int(state[extra].nbytes)
+        float32_bytes = int(state["count"] * (state["dim"] or 0) * 4)
+        return {
+            "search_bytes": search_bytes,
+            "rescore_bytes_on_disk": int(state["full"].nbytes) if state["full"] is not None else 0,
+            "float32_bytes": float32_bytes,
+            "saved": round(1 - search_bytes / float32_bytes, 4) if float32_bytes else 0.0,
+            "segment_rows": state["count"] - state["base_count"],
+            "deleted_rows": len(state["deleted"]),
+        }
+
+    def _document(self, row: int) -> str:
+        state = self._state
+        if row < state["base_count"]:
+            return state["documents"][row]
+        return state["delta_documents"][row - state["base_count"]]
+
+    def _row_metadata(self, row: int) -> Dict[str, Any]:
+        state = self._state
+        if row >= state["base_count"]:
+            return dict(state["delta_metadatas"][row - state["base_count"]] or {})
+        metadata = {}
+        for key, column in state["metadata"].items():
+            raw = column[row]
+            if raw:
+                metadata[key] = json.loads(raw)
+        return metadata
+
+    def _live_row_list(self) -> List[int]:
+        state = self._state
+        if not state["deleted"]:
+            return list(range(state["count"]))
+        return [r for r in range(state["count"]) if r not in state["deleted"]]
+
+    def _live_rows(self) -> Tuple[List[str], np.ndarray, List[str], List[Dict]]:
+        state = self._state
+        rows = self._live_row_list()
+        if not rows:
+            return [], np.zeros((0, 0), dtype=np.float32), [], []
+        documents = state["documents"].to_list() if state["base_count"] else []
+        return (
+            [state["ids"][r] for r in rows],
+            self._vectors(rows),
+            [documents[r] if r < state["base_count"] else self._document(r) for r in rows],
+            [self._row_metadata(r) for r in rows],
+        )
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    # Collection API
+
+    def add(self, ids, embeddings, documents=None, metadatas=None):
+        if self.read_only:
+            raise PermissionError("Vector store was opened read-only")
+
+        vectors = self._normalize(np.asarray(embeddings, dtype=np.float32))
+        documents = documents or [""] * len(ids)
+        metadatas = metadatas or [{}] * len(ids)
+
+        with self._lock, self._file_lock:
+            if self._changed():
+                self._load()
+            existing = self._state["id_index"]
+            # Like Chroma, ids that already exist are left untouched (and so is a repeat within the batch)
+            keep, seen = [], set()
+            for i, doc_id in enumerate(ids):
+                if doc_id not in existing and doc_id not in seen:
+                    keep.append(i)
+                    seen.add(doc_id)
+            if not keep:
+                return
+
+            new_ids = [ids[i] for i in keep]
+            new_documents = [documents[i] or "" for i in keep]
+            new_metadatas = [metadatas[i] or {} for i in keep]
+            if self._state["live"] == 0:
+                # Nothing worth keeping: the batch becomes the new base
+                self._write(new_ids, vectors[keep], new_documents, new_metadatas)
+                return
+            self._append_segment(new_ids, vectors[keep], new_documents, new_metadatas)
+            self._maybe_compact()
+
+    def delete(self, ids):
+        if self.read_only:
+            raise PermissionError("Vector store was opened read-only")
+
+        with self._lock, self._file_lock:
+            if self._changed():
+                self._load()
+            state = self._state
+            drop = {state["id_index"][doc_id] for doc_id in ids if doc_id in state["id_index"]}
+            if not drop:
+                return
+            deleted = state["deleted"] | drop
+            manifest = dict(state["manifest"], deleted_rows=sorted(deleted), updated_at=time.time())
+            self._write_manifest(manifest)
+            for row in drop:
+                state["id_index"].pop(state["ids"][row], None)
+            self._state = dict(state, manifest=manifest, deleted=deleted, live=state["count"] - len(deleted))
+            self._maybe_compact()
+
+    def count(self) -> int:
+        self._maybe_reload()
+        return self._state["live"]
+
+    def _metadata_values(self, key: str) -> List[Any]:
+        """Decoded values of one metadata column (base values cached per loaded base)"""
+        state = self._state
+        if key not in state["decoded"]:
+            column = state["metadata"].get(key)
+            if column is None:
+                values = [None] * state["base_count"]
+            else:
+                values = [json.loads(raw) if raw else None for raw in column.to_list()]
+            state["decoded"][key] = values
+        delta = state["delta_metadatas"][:state["count"] - state["base_count"]]
+        return state["decoded"][key] + [(metadata or {}).get(key) for metadata in delta]
+
+    def _where_mask(self, where: Optional[Dict]) -> Optional[np.ndarray]:
+        """Row mask for a Chroma-style metadata filter ($eq/$ne/$gt/$gte/$lt/$lte/$in/$nin, $and/$or)
+
+        As in Chroma, a row without the key matches no condition on it.
+        """
+        if not where:
+            return None
+        if "$and" in where:
+            masks = [self._where_mask(clause) for clause in where["$and"]]
+            return np.logical_and.reduce(masks)
+        if "$or" in where:
+            masks = [self._where_mask(clause) for clause in where["$or"]]
+            return np.logical_or.reduce(masks)
+
+        mask = np.ones(self._state["count"], dtype=bool)
+        for key, condition in where.items():
+            if key.startswith("$"):
+                raise ValueError(f"Unsupported where operator: {key}")
+            values = self._metadata_values(key)
+            for operator, operand in (condition.items() if isinstance(condition, dict) else [("$eq", condition)]):
+                if operator not in WHERE_OPERATORS:
+                    raise ValueError(f"Unsupported where operator for {key!r}: {operator}")
+                if operator in ("$in", "$nin"):
+                    operand = set(operand)
+                test = WHERE_OPERATORS[operator]
+                mask &= np.fromiter((v is not None and test(v, operand) for v in values), dtype=bool,
+                                    count=len(values))
+        return mask
+
+    def _allowed_mask(self, where: Optional[Dict]) -> Optional[np.ndarray]:
+        """Rows that are live and match `where`, or None for every row"""
+        mask = self._where_mask(where)
+        state = self._state
+        if state["deleted"]:
+            if mask is None:
+                mask = np.ones(state["count"], dtype=bool)
+            mask[list(state["deleted"])] = False
+        return mask
+
+    def _scores(self, queries: np.ndarray) -> np.ndarray:
+        """Cosine similarity of every stored vector to every query, block by block"""
+        state = self._state
+        embeddings = state["embeddings"]
+        base_count = state["base_count"]
+        scores = np.empty((queries.shape[0], state["count"]), dtype=np.float32)
+        # Segments are small and kept at full precision
+        if state["count"] > base_count:
+            scores[:, base_count:] = queries @ self._delta_matrix(state).T
+        # Bring the queries into the compressed space instead of decompressing the index
+        if state["projection"] is not None:
+            queries = self._normalize(queries @ state["projection"])
+        if state["scale"] is not None:
+            queries = queries * state["scale"]
+        queries_t = queries.T.copy()
+
+        # float16/int8 have no BLAS path, so upcast one block at a time
+        for start in range(0, base_count, self.block_size):
+            block = np.asarray(embeddings[start:start + self.block_size], dtype=np.float32)
+            scores[:, start:start + block.shape[0]] = (block @ queries_t).T
+        return scores
+
+    def query(self, query_embeddings, n_results: int = 5, where: Optional[Dict] = None,
+              include: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Exact top-k search for one or many query vectors"""
+        self._maybe_reload()
+        include = include or DEFAULT_INCLUDE
+        state = self._state
+        queries = self._normalize(np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32)))
+
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": [], "embeddings": []}
+        if state["live"] == 0:
+            for _ in range(queries.shape[0]):
+                for key in results:
+                    results[key].append([])
+            return self._trim(results, include)
+
+        scores = self._scores(queries)
+        mask = self._allowed_mask(where)
+        if mask is not None:
+            scores[:, ~mask] = -np.inf
+            available = int(mask.sum())
+        else:
+            available = state["count"]
+
+        k = min(n_results, available)
+        rescoring = state["full"] is not None and self.rescore > 0
+        # With a full-precision copy, shortlist more on the compressed scores and rescore those exactly
+        shortlist = min(k * self.rescore, available) if rescoring else k
+        if shortlist <= 0:
+            top = np.zeros((queries.shape[0], 0), dtype=np.int64)
+        elif shortlist < available:
+            top = np.argpartition(-scores, shortlist - 1, axis=1)[:, :shortlist]
+        else:
+            candidates = np.flatnonzero(mask) if mask is not None else np.arange(state["count"])
+            top = np.tile(candidates, (queries.shape[0], 1))
+
+        for q, rows in enumerate(top):
+            if rescoring and len(rows):
+                rows = np.sort(rows)
+                scores[q, rows] = self._vectors(rows) @ queries[q]
+            rows = rows[np.argsort(-scores[q, rows])][:k]
+            results["ids"].append([state["ids"][r] for r in rows])
+            results["distances"].append((1.0 - scores[q, rows]).tolist())
+            if "documents" in include:
+                results["documents"].append([self._document(r) for r in rows])
+            if "metadatas" in include:
+                results["metadatas"].append([self._row_metadata(r) for r in rows])
+            if "embeddings" in include:
+                results["embeddings"].append(self._vectors(rows))
+
+        return self._trim(results, include)
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=None) -> Dict[str, Any]:
+        self._maybe_reload()
+        include = include or ["documents", "metadatas"]
+        state = self._state
+
+        if ids is not None:
+            rows = [state["id_index"][doc_id] for doc_id in ids if doc_id in state["id_index"]]
+        else:
+            rows = self._live_row_list()
+        mask = self._where_mask(where)
+        if mask is not None:
+            rows = [r for r in rows if mask[r]]
+        start = offset or 0
+        rows = rows[start:start + limit] if limit is not None else rows[start:]
+
+        results = {
+            "ids": [state["ids"][r] for r in rows],
+            "documents": [self._document(r) for r in rows] if "documents" in include else None,
+            "metadatas": [self._row_metadata(r) for r in rows] if "metadatas" in include else None,
+            "embeddings": self._vectors(rows) if "embeddings" in include else None,
+        }
+        return results
+
+    @staticmethod
+    def _trim(results: Dict[str, Any], include: List[str]) -> Dict[str, Any]:
+        for key in ("documents", "metadatas", "distances", "embeddings"):
+            if key not in include:
+                results[key] = None
+        return results
+
+
+def open_backend(backend: str, db_path: str = KNOWLEDGE_DB_PATH, read_only: bool = False,
+                 partition: Optional[str] = None):
+    """One unpartitioned store; `partition` opens that partition's own collection or flat index"""
+    if backend == "numpy":
+        path = os.path.join(db_path, FLAT_INDEX_DIR if partition is None else os.path.join(PARTITION_DIR, partition))
+        return NumpyFlatStore(
+            path,
+            dtype=os.getenv("FLAT_INDEX_DTYPE", "float16"),
+            read_only=read_only,
+            reduce=os.getenv("FLAT_INDEX_REDUCE") or None,
+            rescore=int(os.getenv("FLAT_INDEX_RESCORE", 4))
+        )
+    if backend == "chroma":
+        return ChromaVectorStore(db_path, COLLECTION_NAME if partition is None else f"{COLLECTION_NAME}__{partition}")
+    raise ValueError(f"Unknown vector store backend: {backend}")
+
+
+def create_vector_store(backend: Optional[str] = None, db_path: str = KNOWLEDGE_DB_PATH,
+                        read_only: Optional[bool] = None, partitioned: Optional[bool] = None):
+    """Open the configured vector store backend (VECTOR_STORE_BACKEND=chroma|numpy)
+
+    With VECTOR_STORE_PARTITIONED=true the backend holds one index per
+    category, searched together through a PartitionedStore.
+    """
+    backend = backend or os.getenv("VECTOR_STORE_BACKEND", "chroma")
+    if read_only is None:
+        read_only = os.getenv("VECTOR_STORE_READ_ONLY", "").lower() in ("1", "true", "yes")
+    if partitioned is None:
+        partitioned = os.getenv("VECTOR_STORE_PARTITIONED", "").lower() in ("1", "true", "yes")
+
+    if partitioned:
+        from partitioned_store import PartitionedStore
+        return PartitionedStore(backend, db_path, read_only)
+    return open_backend(backend, db_path, read_only)
+
+
+def copy_store(source, destination, batch_size: int = 5000) -> int:
+    """Copy every document and embedding from one store to another"""
+    data = read_collection(source, batch_size)
+    write_collection(destination, data, batch_size)
+    return len(data["ids"])
+
+
+COMPRESSION_CONFIGS = ["float32", "float16", "int8", "float16+pca:192", "int8+pca:192", "int8+pca:128",
+                       "int8+pca:64", "float16+truncate:192"]
+
+
+def compression_report(data: Dict[str, Any], queries: np.ndarray, configs: List[str] = COMPRESSION_CONFIGS,
+                       k: int = 5, rescore: int = 4) -> List[Dict[str, Any]]:
+    """Memory saved vs recall@k (against exact float32 search) for each `dtype[+reduce]` config"""
+    truth = exact_neighbors(data["embeddings"], queries, k, "cosine")
+    truth_ids = [{data["ids"][row] for row in rows} for rows in truth]
+    only_vectors = {"ids": data["ids"], "embeddings": data["embeddings"]}
+
+    results = []
+    for config in configs:
+        dtype, _, reduce = config.partition("+")
+        with tempfile.TemporaryDirectory(prefix="flat_index_eval_") as tmp:
+            store = NumpyFlatStore(tmp, dtype=dtype, reduce=reduce or None, rescore=rescore)
+            write_collection(store, only_vectors, batch_size=len(data["ids"]))
+
+            def recall():
+                found = store.query(queries, n_results=k, include=["distances"])["ids"]
+                return round(float(np.mean([len(set(ids) & expected) / len(expected)
+                                            for ids, expected in zip(found, truth_ids)])), 4)
+
+            row = {"config": config, **store.memory_report()}
+            row["recall_rescored"] = recall() if store._state["full"] is not None else None
+            store.rescore = 0
+            row["recall"] = recall()
+            results.append(row)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Copy the knowledge base between vector store backends")
+    parser.add_argument("--from", dest="source", choices=["chroma", "numpy"], default="chroma")
+    parser.add_argument("--to", dest="destination", choices=["chroma", "numpy"], default="numpy")
+    parser.add_argument("--compression-report", action="store_true",
+                        help="Measure memory saved vs recall lost for flat-index compression settings on --from")
+    parser.add_argument("--configs", nargs="+", default=COMPRESSION_CONFIGS, help="dtype[+pca:<dim>|+truncate:<dim>]")
+    parser.add_argument("--questions-file", help="Eval questions, one per line (default: sampled stored vectors)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.compression_report:
+        data = read_collection(create_vector_store(args.source, read_only=True))
+        if not data["ids"]:
+            print("❌ The knowledge base is empty")
+            return
+        queries = load_query_embeddings(data, args.questions_file, args.queries)
+        print(f"📏 {len(data['ids'])} vectors, {len(queries)} queries, recall@{args.k} vs exact float32 search")
+        print(f"{'config':<22}{'search MB':>10}{'saved':>8}{'recall':>9}{'rescored':>10}")
+        for row in compression_report(data, queries, args.configs, args.k):
+            rescored = f"{row['recall_rescored']:.3f}" if row["recall_rescored"] is not None else "-"
+            print(f"{row['config']:<22}{row['search_bytes'] / 1e6:>10.1f}{row['saved']:>8.0%}"
+                  f"{row['recall']:>9.3f}{rescored:>10}")
+        return
+
+    if args.source == args.destination:
+        print("❌ Source and destination backends are the same")
+        return
+
+    source = create_vector_store(args.source, read_only=True)
+    destination = create_vector_store(args.destination, read_only=False)
+    print(f"📦 Copying {source.count()} documents from {args.source} to {args.destination}...")
+    copied = copy_store(source, destination)
+    print(f"✓ Copied {copied} documents")
+
+
+if __name__ == "__main__":
+    main()